@@ -6,32 +6,62 @@ Count occurrences of specific words in the Bible text.
 
 import re
 import os
+from collections import Counter
 
-def count_words(filename, target_words):
+# \w+ matches word characters (letters, digits, underscores)
+WORD_PATTERN = re.compile(r'\w+')
+
+# Characters of text read per chunk
+CHUNK_SIZE = 1 << 20
+
+def read_chunks(file, chunk_size=CHUNK_SIZE):
     """
-    Count occurrences of specific words in a text file.
+    Read a text file in large chunks that end on a line break.
+
+    Ending on a line break means no word is split between chunks.
+    """
+    carry = ''
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        cut = chunk.rfind('\n') + 1
+        if cut == 0:
+            carry += chunk
+            continue
+        yield carry + chunk[:cut]
+        carry = chunk[cut:]
+
+    if carry:
+        yield carry
+
+def count_terms(filename, target_words, frequencies=False):
+    """
+    Count target words, the total word count and optionally every word's
+    frequency, in a single pass over a text file.
+
+    Every word is counted with Counter.update, so the cost per word does
+    not depend on how many target words there are.
 
     Args:
         filename (str): Path to the text file
         target_words (list): List of words to count (will be converted to lowercase)
+        frequencies (bool): Also return the frequency of every word
 
     Returns:
-        dict: Dictionary with word counts
+        dict: 'counts' (target word counts), 'total_words', and
+        'frequencies' (a Counter, or None if not requested)
     """
-    # Initialize counters
-    word_counts = {word.lower(): 0 for word in target_words}
+    all_counts = Counter()
+    total_words = 0
 
     try:
         with open(filename, 'r', encoding='utf-8') as file:
-            for line in file:
-                # Convert line to lowercase and extract words using regex
-                # \w+ matches word characters (letters, digits, underscores)
-                words = re.findall(r'\w+', line.lower())
-
-                # Count target words
-                for word in words:
-                    if word in word_counts:
-                        word_counts[word] += 1
+            for chunk in read_chunks(file):
+                # Convert to lowercase and extract words using regex
+                words = WORD_PATTERN.findall(chunk.lower())
+                total_words += len(words)
+                all_counts.update(words)
 
     except FileNotFoundError:
         print(f"Error: File '{filename}' not found.")
@@ -40,7 +70,32 @@ def count_words(filename, target_words):
         print(f"Error reading file: {e}")
         return None
 
-    return word_counts
+    word_counts = {}
+    for word in target_words:
+        word = word.lower()
+        word_counts[word] = all_counts.get(word, 0)
+
+    return {
+        'counts': word_counts,
+        'total_words': total_words,
+        'frequencies': all_counts if frequencies else None
+    }
+
+def count_words(filename, target_words):
+    """
+    Count occurrences of specific words in a text file.
+
+    Args:
+        filename (str): Path to the text file
+        target_words (list): List of words to count (will be converted to lowercase)
+
+    Returns:
+        dict: Dictionary with word counts
+    """
+    result = count_terms(filename, target_words)
+    if result is None:
+        return None
+    return result['counts']
 
 def main():
     """Main function to run the word counting task."""
@@ -60,29 +115,22 @@ def main():
     print(f"Target words: {target_words}")
     print()
 
-    # Count the words
-    results = count_words(filename, target_words)
+    # Count the words and the total in one pass over the file
+    counted = count_terms(filename, target_words)
+
+    if counted:
+        results = counted['counts']
+        total_words = counted['total_words']
 
-    if results:
         print("Results:")
         print("-" * 20)
         for word, count in results.items():
             print(f"'{word}': {count:,} occurrences")
 
-        # Calculate total words processed
-        try:
-            with open(filename, 'r', encoding='utf-8') as file:
-                total_words = 0
-                for line in file:
-                    words = re.findall(r'\w+', line.lower())
-                    total_words += len(words)
-
+        if total_words:
             print(f"\nTotal words in text: {total_words:,}")
             print(f"Target words found: {sum(results.values()):,}")
             print(f"Percentage of target words: {sum(results.values())/total_words*100:.2f}%")
 
-        except Exception as e:
-            print(f"Error calculating statistics: {e}")
-
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -5,9 +5,19 @@ Processes Bible, Quran, and Wikipedia abstracts for text laws analysis.
 """
 
 import re
+import sys
 import math
+import heapq
 from collections import Counter
 import os
+from lab1_corpus import find_collection
+from lab1_external import ExternalCounter, analyze_counts_file
+from lab1_growth import (VocabularyGrowthTracker, checkpoints_upto, explicit_checkpoints,
+                         fit_heaps_law, growth_from_positions, log_checkpoints)
+from lab1_parallel import can_shard, process_shards
+from lab1_sketches import HyperLogLog, SpaceSaving, zipf_head
+from lab1_tokenizer import first_lines, read_collection_bytes
+from lab1_tokens import TokenStream
 
 # Simple stop words list
 STOP_WORDS = {
@@ -18,6 +28,20 @@ STOP_WORDS = {
     'their', 'them', 'have', 'had', 'been', 'being', 'do', 'does', 'did'
 }
 
+# Number of preprocessed tokens saved as a sample of each collection
+SAMPLE_SIZE = 10000
+
+# Counters kept by the streaming mode's Space-Saving sketch
+SKETCH_CAPACITY = 10000
+# log2 of the streaming mode's HyperLogLog registers (4 KB, about 1.6% error)
+SKETCH_PRECISION = 12
+
+# Term table memory limit of the external mode
+EXTERNAL_MEMORY_LIMIT = 64 << 20
+
+# Token counts at which vocabulary growth is reported
+GROWTH_REPORT_POINTS = [1000, 5000, 10000, 50000, 100000]
+
 def simple_stem(word):
     """Simple stemming - remove common suffixes."""
     word = word.lower()
@@ -39,66 +63,136 @@ def simple_stem(word):
 
     return word
 
+def stop_and_stem(words):
+    """Remove stop words and short words from lowercased words and stem the rest."""
+    tokens = []
+
+    for word in words:
+        if word not in STOP_WORDS and len(word) > 2:
+            stemmed = simple_stem(word)
+            tokens.append(stemmed)
+
+    return tokens
+
+def tokenize_text(text):
+    """Tokenize, stop and stem a chunk of text."""
+    # Tokenize: extract word characters only
+    words = re.findall(r'\w+', text.lower())
+
+    # Remove stop words and stem
+    return stop_and_stem(words)
+
+def iter_chunk_tokens(chunks, tokenizer, max_lines=None):
+    """Yield (tokens, lines) for each byte chunk, stopping after max_lines lines.
+
+    Tokens are those tokenize_text gives for the same lines.
+    """
+    line_count = 0
+    for chunk in chunks:
+        lines = chunk.count(b'\n') + (not chunk.endswith(b'\n'))
+        if max_lines and line_count + lines >= max_lines:
+            chunk = first_lines(chunk, max_lines - line_count)
+            yield stop_and_stem(tokenizer.tokenize(chunk)), max_lines - line_count
+            return
+        line_count += lines
+        yield stop_and_stem(tokenizer.tokenize(chunk)), lines
+
 def preprocess_text(filename, max_lines=None):
-    """Preprocess text file efficiently."""
+    """Preprocess text file efficiently (plain, gzip, bz2 or xz).
+
+    Returns the tokens as a TokenStream of interned term ids.
+    """
     print(f"Processing {filename}...")
 
-    tokens = []
-    line_count = 0
+    def tokenize_chunks(chunks, tokenizer):
+        stream = TokenStream()
+        line_count = 0
 
-    try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            for line in f:
-                if max_lines and line_count >= max_lines:
-                    break
+        for tokens, lines in iter_chunk_tokens(chunks, tokenizer, max_lines):
+            stream.extend(tokens)
+            if (line_count + lines) // 10000 > line_count // 10000:
+                print(f"  Processed {line_count + lines:,} lines, {len(stream):,} tokens")
+            line_count += lines
 
-                # Tokenize: extract word characters only
-                words = re.findall(r'\w+', line.lower())
+        return stream, line_count
 
-                # Remove stop words and stem
-                for word in words:
-                    if word not in STOP_WORDS and len(word) > 2:
-                        stemmed = simple_stem(word)
-                        tokens.append(stemmed)
+    # Memory-mapped and tokenized as bytes; retries as Latin-1 if the file
+    # is not valid UTF-8
+    stream, line_count = read_collection_bytes(filename, tokenize_chunks)
 
-                line_count += 1
+    print(f"  Final: {len(stream):,} tokens from {line_count:,} lines")
+    return stream
 
-                if line_count % 10000 == 0:
-                    print(f"  Processed {line_count:,} lines, {len(tokens):,} tokens")
+def preprocess_sharded(filename, max_lines=None, workers=None):
+    """Preprocess a plain text file on several cores.
 
-    except UnicodeDecodeError:
-        # Try different encoding
-        with open(filename, 'r', encoding='latin1') as f:
-            for line in f:
-                if max_lines and line_count >= max_lines:
-                    break
+    Returns the merged shard statistics (see lab1_parallel.process_shards)
+    and the first SAMPLE_SIZE tokens, instead of the full token list.
+    """
+    print(f"Processing {filename} with {workers or os.cpu_count()} workers...")
 
-                words = re.findall(r'\w+', line.lower())
-                for word in words:
-                    if word not in STOP_WORDS and len(word) > 2:
-                        stemmed = simple_stem(word)
-                        tokens.append(stemmed)
+    sample_tokens = []
 
-                line_count += 1
+    def keep_sample(index, tokens):
+        if index == 0:
+            sample_tokens.clear()
+        sample_tokens.extend(tokens[:SAMPLE_SIZE - len(sample_tokens)])
 
-    print(f"  Final: {len(tokens):,} tokens from {line_count:,} lines")
-    return tokens
+    merged = process_shards(filename, stop_and_stem, track_growth=True,
+                            workers=workers, max_lines=max_lines,
+                            head_size=SAMPLE_SIZE, token_sink=keep_sample,
+                            tokenize_bytes=True)
+
+    print(f"  Final: {merged['total_tokens']:,} tokens from {merged['lines']:,} lines")
+    return merged, sample_tokens
+
+def print_zipf_ranks(frequencies):
+    """Compare the frequencies at ranks 1, 5, 10, 50 and 100 with Zipf's law."""
+    # Check Zipf's law for top terms
+    zipf_constant = frequencies[0] * 1  # rank 1 * frequency should be constant
+    print(f"Zipf constant (f1 * r1): {zipf_constant:,}")
+
+    for i in [0, 4, 9, 49, 99]:  # ranks 1, 5, 10, 50, 100
+        if i < len(frequencies):
+            rank = i + 1
+            freq = frequencies[i]
+            predicted = zipf_constant / rank
+            print(f"  Rank {rank:3d}: observed {freq:6,}, predicted {predicted:6.0f}, ratio {freq/predicted:.2f}")
+
+def print_benford(digit_counts):
+    """Compare the number of frequencies per first digit with Benford's law."""
+    total_freqs = sum(digit_counts.values())
+    print(f"First digit distribution (from {total_freqs:,} frequencies):")
 
-def analyze_collection(filename, name, max_lines=None):
+    for digit in range(1, 10):
+        observed = digit_counts.get(digit, 0)
+        observed_pct = observed / total_freqs * 100 if total_freqs > 0 else 0
+        benford_pct = math.log10(1 + 1/digit) * 100
+        print(f"  Digit {digit}: {observed:4d} ({observed_pct:5.1f}%) vs Benford {benford_pct:5.1f}%")
+
+def analyze_collection(filename, name, max_lines=None, workers=1):
     """Analyze a single text collection."""
     print(f"\n{'='*50}")
     print(f"ANALYZING: {name}")
     print(f"{'='*50}")
 
-    # Preprocess
-    tokens = preprocess_text(filename, max_lines)
-    if not tokens:
+    # Preprocess, in parallel shards if possible
+    if workers > 1 and can_shard(filename):
+        merged, sample_tokens = preprocess_sharded(filename, max_lines, workers)
+        stream = None
+        token_counts = merged['token_counts']
+        total_tokens = merged['total_tokens']
+    else:
+        stream = preprocess_text(filename, max_lines)
+        token_counts = stream.term_counts()
+        total_tokens = len(stream)
+        sample_tokens = stream.tokens(0, SAMPLE_SIZE)
+
+    if not total_tokens:
         print(f"No tokens found in {filename}")
         return None
 
     # Count frequencies
-    token_counts = Counter(tokens)
-    total_tokens = len(tokens)
     unique_tokens = len(token_counts)
 
     print(f"Total tokens: {total_tokens:,}")
@@ -113,55 +207,44 @@ def analyze_collection(filename, name, max_lines=None):
     # Zipf's Law Analysis
     print(f"\nZIPF'S LAW ANALYSIS:")
     frequencies = sorted(token_counts.values(), reverse=True)
-
-    # Check Zipf's law for top terms
-    zipf_constant = frequencies[0] * 1  # rank 1 * frequency should be constant
-    print(f"Zipf constant (f1 * r1): {zipf_constant:,}")
-
-    for i in [0, 4, 9, 49, 99]:  # ranks 1, 5, 10, 50, 100
-        if i < len(frequencies):
-            rank = i + 1
-            freq = frequencies[i]
-            predicted = zipf_constant / rank
-            print(f"  Rank {rank:3d}: observed {freq:6,}, predicted {predicted:6.0f}, ratio {freq/predicted:.2f}")
+    print_zipf_ranks(frequencies)
 
     # Benford's Law Analysis
     print(f"\nBENFORD'S LAW ANALYSIS:")
-    first_digits = [int(str(f)[0]) for f in frequencies if f > 0]
-    digit_counts = Counter(first_digits)
-
-    total_freqs = len(first_digits)
-    print(f"First digit distribution (from {total_freqs:,} frequencies):")
-
-    for digit in range(1, 10):
-        observed = digit_counts.get(digit, 0)
-        observed_pct = observed / total_freqs * 100 if total_freqs > 0 else 0
-        benford_pct = math.log10(1 + 1/digit) * 100
-        print(f"  Digit {digit}: {observed:4d} ({observed_pct:5.1f}%) vs Benford {benford_pct:5.1f}%")
+    print_benford(Counter(int(str(f)[0]) for f in frequencies if f > 0))
 
     # Vocabulary Growth (simple analysis)
     print(f"\nVOCABULARY GROWTH ANALYSIS:")
 
-    # Sample vocabulary growth at different points
-    sample_points = [1000, 5000, 10000, 50000, 100000, len(tokens)]
-    sample_points = [p for p in sample_points if p <= len(tokens)]
+    # Sample vocabulary growth at the reported points, plus log-spaced
+    # points for fitting Heap's law
+    report_points = GROWTH_REPORT_POINTS + [total_tokens]
+    fit_points = checkpoints_upto(log_checkpoints(), total_tokens)
+
+    if stream is None:
+        # Sharded runs record where each term first appeared instead
+        growth_data = growth_from_positions(merged['new_term_positions'], total_tokens,
+                                            sorted(set(report_points + fit_points)))
+    else:
+        # Distinct ids are distinct terms, so growth is tracked on the ids
+        tracker = VocabularyGrowthTracker(explicit_checkpoints(report_points + fit_points))
+        tracker.update(stream.ids)
+        growth_data = tracker.growth_data()
 
     print(f"Vocabulary growth pattern:")
-    unique_so_far = set()
 
-    for point in sample_points:
-        # Count unique tokens up to this point
-        unique_so_far.update(tokens[:point])
-        vocab_size = len(unique_so_far)
-        ratio = vocab_size / point
+    for point, vocab_size in growth_data:
+        if point in report_points:
+            ratio = vocab_size / point
+            print(f"  At {point:6,} tokens: {vocab_size:5,} unique ({ratio:.4f})")
 
-        print(f"  At {point:6,} tokens: {vocab_size:5,} unique ({ratio:.4f})")
+    heaps_k, heaps_b = fit_heaps_law(growth_data)
+    print(f"Heap's law fit: V = {heaps_k:.2f} * N^{heaps_b:.3f}")
 
     # Save preprocessed file
     output_file = f"{name.lower().replace(' ', '_')}_preprocessed.txt"
     with open(output_file, 'w', encoding='utf-8') as f:
         # Save sample of processed tokens (first 10000)
-        sample_tokens = tokens[:10000] if len(tokens) > 10000 else tokens
         f.write(' '.join(sample_tokens))
 
     print(f"Saved sample to {output_file}")
@@ -174,8 +257,217 @@ def analyze_collection(filename, name, max_lines=None):
         'top_terms': token_counts.most_common(10)
     }
 
+def analyze_collection_streaming(filename, name, max_lines=None, capacity=SKETCH_CAPACITY,
+                                 precision=SKETCH_PRECISION):
+    """Analyze a collection's top terms, Zipf head and growth in fixed memory.
+
+    Instead of counting every term, a Space-Saving sketch of capacity
+    counters estimates the most frequent ones, with bounds on each count,
+    and a HyperLogLog sketch of 2^precision bytes estimates the vocabulary
+    size as it grows (see lab1_sketches).
+    """
+    print(f"\n{'='*50}")
+    print(f"ANALYZING (STREAMING): {name}")
+    print(f"{'='*50}")
+
+    def stream_chunks(chunks, tokenizer):
+        # Starts afresh if the file is re-read as Latin-1
+        sketch = SpaceSaving(capacity)
+        # The total is unknown up front, so growth is sampled on an open-ended schedule
+        growth = VocabularyGrowthTracker(heapq.merge(GROWTH_REPORT_POINTS, log_checkpoints()),
+                                         HyperLogLog(precision))
+        sample_tokens = []
+        line_count = 0
+        for tokens, lines in iter_chunk_tokens(chunks, tokenizer, max_lines):
+            sketch.update(tokens)
+            growth.update(tokens)
+            if len(sample_tokens) < SAMPLE_SIZE:
+                sample_tokens.extend(tokens[:SAMPLE_SIZE - len(sample_tokens)])
+            line_count += lines
+        return sketch, growth, sample_tokens, line_count
+
+    sketch, growth, sample_tokens, line_count = read_collection_bytes(filename, stream_chunks)
+    total_tokens = sketch.total
+    print(f"  Final: {total_tokens:,} tokens from {line_count:,} lines")
+
+    if not total_tokens:
+        print(f"No tokens found in {filename}")
+        return None
+
+    unique_tokens = growth.vocabulary_size
+    print(f"Total tokens: {total_tokens:,}")
+    print(f"Unique tokens: ~{unique_tokens:,} "
+          f"(±{growth.vocabulary.relative_error:.1%}, {growth.vocabulary.size_bytes:,} bytes)")
+    print(f"Vocabulary ratio: {unique_tokens/total_tokens:.4f}")
+    print(f"Sketch: {len(sketch):,} of {capacity:,} counters, "
+          f"counts overestimate by at most {sketch.max_error:,.0f}")
+
+    print("\nTop 10 most frequent terms (estimated):")
+    top_terms = sketch.top(10)
+    for word, count, error, guaranteed in top_terms:
+        print(f"  {word}: {count:,} (-{error:,}){'' if guaranteed else ' ?'}")
+
+    print("\nZIPF'S LAW ANALYSIS (HEAD):")
+    frequencies, errors = sketch.rank_frequency(100)
+    zipf_constant = frequencies[0]
+    print(f"Zipf constant (f1 * r1): {zipf_constant:,}")
+
+    for i in [0, 4, 9, 49, 99]:
+        if i < len(frequencies):
+            rank = i + 1
+            freq = frequencies[i]
+            predicted = zipf_constant / rank
+            print(f"  Rank {rank:3d}: observed {freq:6,} (-{errors[i]:,}), "
+                  f"predicted {predicted:6.0f}, ratio {freq/predicted:.2f}")
+
+    head = zipf_head(sketch)
+    if head:
+        print(f"Zipf fit over {len(head['ranks']):,} reliable ranks: "
+              f"alpha = {head['alpha']:.3f}, k = {head['k']:.1f}")
+
+    print("\nVOCABULARY GROWTH ANALYSIS (ESTIMATED):")
+    growth_data = growth.growth_data()
+    for point, vocab_size in growth_data:
+        if point in GROWTH_REPORT_POINTS or point == total_tokens:
+            print(f"  At {point:6,} tokens: ~{vocab_size:5,} unique ({vocab_size / point:.4f})")
+
+    heaps_k, heaps_b = fit_heaps_law(growth_data)
+    print(f"Heap's law fit: V = {heaps_k:.2f} * N^{heaps_b:.3f}")
+
+    output_file = f"{name.lower().replace(' ', '_')}_preprocessed.txt"
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(' '.join(sample_tokens))
+
+    print(f"Saved sample to {output_file}")
+
+    return {
+        'name': name,
+        'total_tokens': total_tokens,
+        'unique_tokens': unique_tokens,
+        'sketch': sketch,
+        'growth_data': growth_data,
+        'top_terms': [(word, count) for word, count, _, _ in top_terms]
+    }
+
+def analyze_collection_external(filename, name, max_lines=None,
+                                memory_limit=EXTERNAL_MEMORY_LIMIT, precision=SKETCH_PRECISION):
+    """Analyze a collection with exact term counts aggregated out of core.
+
+    Counts are kept within memory_limit by spilling sorted runs to disk and
+    merged into NAME_counts.tsv, which the Zipf and Benford analyses read
+    as a stream (see lab1_external). Vocabulary growth is estimated by a
+    HyperLogLog sketch, as in the streaming mode.
+    """
+    print(f"\n{'='*50}")
+    print(f"ANALYZING (EXTERNAL): {name}")
+    print(f"{'='*50}")
+
+    base = name.lower().replace(' ', '_')
+    counts_file = f"{base}_counts.tsv"
+
+    def count_chunks(chunks, tokenizer):
+        # Starts afresh if the file is re-read as Latin-1
+        counter = ExternalCounter(memory_limit, os.path.dirname(os.path.abspath(counts_file)))
+        growth = VocabularyGrowthTracker(heapq.merge(GROWTH_REPORT_POINTS, log_checkpoints()),
+                                         HyperLogLog(precision))
+        sample_tokens = []
+        line_count = 0
+        try:
+            for tokens, lines in iter_chunk_tokens(chunks, tokenizer, max_lines):
+                counter.update(tokens)
+                growth.update(tokens)
+                if len(sample_tokens) < SAMPLE_SIZE:
+                    sample_tokens.extend(tokens[:SAMPLE_SIZE - len(sample_tokens)])
+                line_count += lines
+        except BaseException:
+            counter.close()
+            raise
+        return counter, growth, sample_tokens, line_count
+
+    counter, growth, sample_tokens, line_count = read_collection_bytes(filename, count_chunks)
+    print(f"  Final: {counter.tokens:,} tokens from {line_count:,} lines")
+    if not counter.tokens:
+        counter.close()
+        print(f"No tokens found in {filename}")
+        return None
+
+    counter.finish(counts_file)
+    if counter.runs:
+        print(f"  Spilled {len(counter.runs):,} run(s) of up to {memory_limit / (1 << 20):.3g} MB, "
+              f"merged in {counter.merge_passes} pass(es) into {counts_file}")
+    else:
+        print(f"  Counts fit in {memory_limit / (1 << 20):.3g} MB, written to {counts_file}")
+
+    # One pass over the sorted counts; only the top 100 terms and the
+    # frequencies of frequencies are kept
+    statistics = analyze_counts_file(counts_file, top=100)
+    total_tokens = statistics['total_tokens']
+    unique_tokens = statistics['terms']
+
+    print(f"Total tokens: {total_tokens:,}")
+    print(f"Unique tokens: {unique_tokens:,}")
+    print(f"Vocabulary ratio: {unique_tokens/total_tokens:.4f}")
+
+    print("\nTop 10 most frequent terms:")
+    top_terms = statistics['top_terms'][:10]
+    for word, count in top_terms:
+        print(f"  {word}: {count:,}")
+
+    print("\nZIPF'S LAW ANALYSIS:")
+    print_zipf_ranks([count for _, count in statistics['top_terms']])
+    zipf = statistics['zipf']
+    print(f"Zipf fit over all {zipf['ranks']:,} ranks: "
+          f"alpha = {zipf['alpha']:.3f}, k = {zipf['k']:.1f}")
+
+    print("\nBENFORD'S LAW ANALYSIS:")
+    print_benford(statistics['benford']['all_digits'])
+
+    print("\nVOCABULARY GROWTH ANALYSIS (ESTIMATED):")
+    growth_data = growth.growth_data()
+    for point, vocab_size in growth_data:
+        if point in GROWTH_REPORT_POINTS or point == total_tokens:
+            print(f"  At {point:6,} tokens: ~{vocab_size:5,} unique ({vocab_size / point:.4f})")
+
+    heaps_k, heaps_b = fit_heaps_law(growth_data)
+    print(f"Heap's law fit: V = {heaps_k:.2f} * N^{heaps_b:.3f}")
+
+    output_file = f"{base}_preprocessed.txt"
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(' '.join(sample_tokens))
+
+    print(f"Saved sample to {output_file}")
+
+    return {
+        'name': name,
+        'total_tokens': total_tokens,
+        'unique_tokens': unique_tokens,
+        'counts_file': counts_file,
+        'growth_data': growth_data,
+        'top_terms': top_terms
+    }
+
+def print_comparison(results):
+    """Print token and vocabulary totals of analyzed collections side by side."""
+    print(f"\n{'='*70}")
+    print("COMPARATIVE SUMMARY")
+    print(f"{'='*70}")
+
+    print(f"{'Collection':<20} {'Total Tokens':<15} {'Unique Tokens':<15} {'Vocab Ratio':<12}")
+    print("-" * 70)
+
+    for result in results:
+        ratio = result['unique_tokens'] / result['total_tokens']
+        print(f"{result['name']:<20} {result['total_tokens']:<15,} {result['unique_tokens']:<15,} {ratio:<12.4f}")
+
 def main():
-    """Main analysis function."""
+    """Main analysis function.
+
+    Pass --streaming to estimate the top terms in fixed memory instead of
+    counting the whole vocabulary, or --external to count it exactly with
+    the counts spilled to disk.
+    """
+    streaming = '--streaming' in sys.argv[1:]
+    external = '--external' in sys.argv[1:]
     collections = [
         ('pg10.txt', 'Bible', None),
         ('quran.txt', 'Quran', None),
@@ -185,8 +477,16 @@ def main():
     results = []
 
     for filename, name, max_lines in collections:
-        if os.path.exists(filename):
-            result = analyze_collection(filename, name, max_lines)
+        # Falls back to a compressed copy such as abstracts.wiki.txt.gz
+        path = find_collection(filename)
+        if path:
+            if streaming:
+                result = analyze_collection_streaming(path, name, max_lines)
+            elif external:
+                result = analyze_collection_external(path, name, max_lines)
+            else:
+                result = analyze_collection(path, name, max_lines,
+                                            workers=os.cpu_count() or 1)
             if result:
                 results.append(result)
         else:
@@ -194,16 +494,7 @@ def main():
 
     # Final comparison
     if results:
-        print(f"\n{'='*70}")
-        print("COMPARATIVE SUMMARY")
-        print(f"{'='*70}")
-
-        print(f"{'Collection':<20} {'Total Tokens':<15} {'Unique Tokens':<15} {'Vocab Ratio':<12}")
-        print("-" * 70)
-
-        for result in results:
-            ratio = result['unique_tokens'] / result['total_tokens']
-            print(f"{result['name']:<20} {result['total_tokens']:<15,} {result['unique_tokens']:<15,} {ratio:<12.4f}")
+        print_comparison(results)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,1048 @@
+#!/usr/bin/env python3
+"""
+Lab 1: Benchmarks and Equivalence Checks
+Verifies that optimized components match the reference implementations
+and measures their speed on the lab collections.
+
+The suite command times each text-processing hot path on quran.txt and
+on synthetic corpora 10x and 100x its size, reporting wall time,
+tokens/sec and peak traced memory per stage. Results are saved as JSON;
+compare flags stages that got slower or bigger than a baseline by more
+than a threshold (default 10%) and exits with status 1 if any did.
+
+Usage:
+    python lab1_benchmark.py verify [files...]
+    python lab1_benchmark.py bench [files...]
+    python lab1_benchmark.py compressed [files...]
+    python lab1_benchmark.py parallel [files...]
+    python lab1_benchmark.py queries [files...]
+    python lab1_benchmark.py ranked [files...]
+    python lab1_benchmark.py sketches [files...]
+    python lab1_benchmark.py tokenizer [files...]
+    python lab1_benchmark.py ngrams [files...]
+    python lab1_benchmark.py external [files...]
+    python lab1_benchmark.py startup
+    python lab1_benchmark.py suite [results.json] [scales, e.g. 1,10,100]
+    python lab1_benchmark.py compare baseline.json results.json [threshold]
+"""
+
+import io
+import os
+import re
+import sys
+import bz2
+import gzip
+import json
+import lzma
+import time
+import random
+import shutil
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+from collections import Counter
+
+from lab1_analysis import simple_stem, tokenize_text
+from lab1_cli import LIGHT_COMMANDS
+from lab1_corpus import read_collection
+from lab1_index import SPIMIIndexer, InvertedIndex
+from lab1_query import QueryEngine
+from lab1_ranking import RankedRetriever, SCORERS
+from lab1_parallel import process_shards
+from lab1_ngrams import count_ngrams
+from lab1_external import ExternalCounter, analyze_counts_file, count_collection, read_counts
+from lab1_growth import VocabularyGrowthTracker, checkpoints_upto, fit_heaps_law, log_checkpoints
+from lab1_sketches import HyperLogLog, SpaceSaving
+from lab1_termstats import TermStatistics
+from lab1_tokenizer import ByteTokenizer, iter_chunks, read_collection_bytes
+from lab1_preprocessing import (PorterStemmer, FastPorterStemmer, TextPreprocessor,
+                                analyze_benford_law, analyze_vocabulary_growth,
+                                analyze_zipf_law, count_tokens, iter_text_chunks)
+
+DEFAULT_COLLECTIONS = ['pg10.txt', 'quran.txt', 'abstracts.wiki.txt']
+
+# The suite's base corpus, bundled next to this script
+SUITE_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'quran.txt')
+SUITE_SCALES = [1, 10, 100]
+DEFAULT_THRESHOLD = 0.10
+# Slowdowns smaller than this are timer noise, whatever the ratio
+MIN_TIME_DIFFERENCE = 0.005
+# Fast stages are repeated until they have run for this long
+MIN_MEASURE_TIME = 0.2
+
+# Fixed query log covering every operator; terms are common to the collections
+DEFAULT_QUERIES = [
+    'god',
+    'heaven AND earth',
+    'heaven OR earth',
+    'heaven AND NOT earth',
+    'NOT god',
+    '"day of judgment"',
+    '"the king of"',
+    '#5(heaven, earth)',
+    '#10(people, world)',
+    '#10("heavens earth", lord)',
+    '(fire OR water) AND NOT earth',
+    'people AND (war OR peace) AND NOT king',
+    '"united states" OR "first world war"'
+]
+
+# Free-text queries mixing rare and very common terms
+DEFAULT_RANKED_QUERIES = [
+    'god',
+    'mercy of god',
+    'heaven and earth',
+    'the people of the book',
+    'fire water earth wind',
+    'king war peace people',
+    'history of the united states',
+    'first world war battle',
+    'university research science',
+    'lord god people day earth heaven'
+]
+
+# Size of the generated collection for the ranked benchmark, and queries
+# over its head (h*) and rare (r*) terms
+RANKED_CORPUS_DOCUMENTS = 60000
+SYNTHETIC_RANKED_QUERIES = [
+    'h1 h2',
+    'h1 h2 h3 h5',
+    'h1 r00ff',
+    'h2 h3 h7 r1234',
+    'h1 h2 h3 h4 h5 h6',
+    'h4 h20 h100',
+    'h1 h9 r0a0a r0b0b'
+]
+
+def load_vocabulary(filename):
+    """Return the set of distinct lowercase tokens in a text file."""
+    vocabulary = set()
+    with open(filename, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            vocabulary.update(re.findall(r'\w+', line.lower()))
+    return vocabulary
+
+def random_words(count, seed=0):
+    """Generate random words biased towards suffixes the stemmer rewrites."""
+    rng = random.Random(seed)
+    letters = 'aeiouybcdlmnrstvyzy'
+    suffixes = ['', 's', 'es', 'ies', 'sses', 'ed', 'eed', 'ing', 'ational',
+                'tional', 'izer', 'alli', 'entli', 'eli', 'ousli', 'ization',
+                'alism', 'iveness', 'biliti', 'icate', 'iciti', 'ful', 'ness',
+                'ement', 'ment', 'ance', 'ible', 'sion', 'tion', 'ou', 'ism',
+                'e', 'll', 'at', 'bl', 'iz']
+    words = []
+    for _ in range(count):
+        stem = ''.join(rng.choice(letters) for _ in range(rng.randint(0, 8)))
+        words.append(stem + rng.choice(suffixes))
+    return words
+
+def existing(filenames):
+    """Keep only the collections present on disk, reporting the others."""
+    found = []
+    for filename in filenames:
+        if os.path.exists(filename):
+            found.append(filename)
+        else:
+            print(f"Skipping {filename}: file not found")
+    return found
+
+def verify_stemmer(filenames):
+    """Check FastPorterStemmer against PorterStemmer on every vocabulary word.
+
+    Returns the number of mismatches found.
+    """
+    reference = PorterStemmer(cache_size=0)
+    fast = FastPorterStemmer(cache_size=0)
+
+    sources = [(filename, load_vocabulary(filename)) for filename in filenames]
+    sources.append(('synthetic words', set(random_words(200000))))
+
+    mismatches = 0
+    for name, vocabulary in sources:
+        failed = [word for word in sorted(vocabulary)
+                  if fast.stem(word) != reference.stem(word)]
+        mismatches += len(failed)
+        status = 'OK' if not failed else f'{len(failed):,} MISMATCHES'
+        print(f"{name}: {len(vocabulary):,} words checked, {status}")
+        for word in failed[:10]:
+            print(f"  {word!r}: expected {reference.stem(word)!r}, "
+                  f"got {fast.stem(word)!r}")
+
+    return mismatches
+
+def verify_streaming(filenames):
+    """Check that iter_tokens gives preprocess_text's tokens for files and for lines.
+
+    The lines are fed without their newlines, which must still separate
+    tokens. Returns the number of mismatching inputs.
+    """
+    preprocessor = TextPreprocessor()
+    sources = [('unterminated lines', ['running dogs', 'cats eat'], 'running dogs\ncats eat')]
+    for filename in filenames:
+        text = read_collection(filename, lambda f: f.read())
+        sources.append((filename, text.split('\n'), text))
+
+    mismatches = 0
+    for name, lines, text in sources:
+        expected = preprocessor.preprocess_text(text)
+        failed = [kind for kind, tokens in
+                  [('lines', list(preprocessor.iter_tokens(lines))),
+                   ('file', list(preprocessor.iter_tokens(io.StringIO(text))))]
+                  if tokens != expected]
+        mismatches += len(failed)
+        status = 'OK' if not failed else 'MISMATCH in ' + ', '.join(failed)
+        print(f"{name}: {len(expected):,} streamed tokens checked, {status}")
+    return mismatches
+
+def time_stemmer(stemmer, words, repeat=3):
+    """Best wall time of stemming every word, over several repeats."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for word in words:
+            stemmer.stem(word)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def benchmark_stemmer(filenames):
+    """Compare uncached reference and fast stemmers on each vocabulary."""
+    print(f"{'Collection':<24} {'Words':>9} {'Reference':>11} {'Fast':>9} {'Speedup':>8}")
+    print("-" * 65)
+
+    for filename in filenames:
+        words = sorted(load_vocabulary(filename))
+        reference_time = time_stemmer(PorterStemmer(cache_size=0), words)
+        fast_time = time_stemmer(FastPorterStemmer(cache_size=0), words)
+        print(f"{filename:<24} {len(words):>9,} {reference_time:>10.3f}s "
+              f"{fast_time:>8.3f}s {reference_time / fast_time:>7.2f}x")
+
+def compress_copies(filename, directory):
+    """Write gzip, bz2 and xz copies of filename into directory."""
+    copies = []
+    base = os.path.join(directory, os.path.basename(filename))
+    for ext, opener in [('.gz', gzip.open), ('.bz2', bz2.open), ('.xz', lzma.open)]:
+        with open(filename, 'rb') as src, opener(base + ext, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        copies.append(base + ext)
+    return copies
+
+def time_preprocessing(filename):
+    """Wall time and token counts of streaming a collection through the pipeline."""
+    preprocessor = TextPreprocessor()
+    start = time.perf_counter()
+    token_counts = read_collection(
+        filename, lambda f: count_tokens(preprocessor.iter_tokens(f)))
+    return time.perf_counter() - start, token_counts
+
+def benchmark_compressed(filenames):
+    """Compare end-to-end preprocessing of plain and compressed copies."""
+    print(f"{'Input':<28} {'Size':>12} {'Time':>9} {'Relative':>9}")
+    print("-" * 62)
+
+    with tempfile.TemporaryDirectory() as directory:
+        for filename in filenames:
+            plain_time, expected = time_preprocessing(filename)
+            print(f"{os.path.basename(filename):<28} {os.path.getsize(filename):>12,} "
+                  f"{plain_time:>8.3f}s {1:>8.2f}x")
+
+            for path in compress_copies(filename, directory):
+                elapsed, token_counts = time_preprocessing(path)
+                if token_counts != expected:
+                    print(f"  {path}: token counts differ from plain input")
+                print(f"{os.path.basename(path):<28} {os.path.getsize(path):>12,} "
+                      f"{elapsed:>8.3f}s {elapsed / plain_time:>8.2f}x")
+
+def benchmark_parallel(filenames):
+    """Time sharded preprocessing with increasing worker counts."""
+    max_workers = os.cpu_count() or 1
+    worker_counts = sorted({1, 2, 4, 8, max_workers} & set(range(1, max_workers + 1)))
+
+    print(f"{'Collection':<24} {'Workers':>8} {'Time':>9} {'Speedup':>8}")
+    print("-" * 53)
+
+    for filename in filenames:
+        preprocessor = TextPreprocessor()
+        serial_time = None
+        for workers in worker_counts:
+            start = time.perf_counter()
+            process_shards(filename, preprocessor.preprocess_text,
+                           growth_tokenizer=preprocessor.tokenize,
+                           track_growth=True, workers=workers)
+            elapsed = time.perf_counter() - start
+            serial_time = serial_time or elapsed
+            print(f"{os.path.basename(filename):<24} {workers:>8} "
+                  f"{elapsed:>8.3f}s {serial_time / elapsed:>7.2f}x")
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+# Proximity queries over terms and phrases: (first, second, distance)
+PROXIMITY_CHECKS = [
+    ('heaven', 'earth', 5),
+    ('heavens earth', 'lord', 10),
+    ('lord', 'heavens earth', 3),
+    ('day of resurrection', 'fire', 5),
+    ('united states', 'first world war', 50),
+    ('god', 'god', 0)
+]
+
+def phrase_starts(tokens, phrase):
+    """Positions where a phrase of terms starts in a token list."""
+    return [i for i in range(len(tokens) - len(phrase) + 1)
+            if tokens[i:i + len(phrase)] == phrase]
+
+def spans_within(first, second, first_length, second_length, distance):
+    """Reference check: do any two spans have closest positions at most distance apart?"""
+    for a in first:
+        for b in second:
+            gap = b - (a + first_length - 1) if a <= b else a - (b + second_length - 1)
+            if gap <= distance:
+                return True
+    return False
+
+def verify_queries(filenames, checks=PROXIMITY_CHECKS):
+    """Check #N proximity queries, with phrase operands, against a brute-force scan.
+
+    Returns the number of queries whose results differ.
+    """
+    failures = 0
+    with tempfile.TemporaryDirectory() as directory:
+        for filename in filenames:
+            preprocessor = TextPreprocessor()
+            prefix = os.path.join(directory, os.path.basename(filename))
+            SPIMIIndexer(preprocessor).build(filename, prefix)
+            terms_of = lambda text: preprocessor.preprocess_tokens(preprocessor.tokenize(text))
+            documents = read_collection(filename, lambda f: [terms_of(line) for line in f])
+
+            with InvertedIndex(prefix) as index:
+                engine = QueryEngine(index, preprocessor)
+                for first, second, distance in checks:
+                    query = f'#{distance}("{first}", "{second}")'
+                    first_terms, second_terms = terms_of(first), terms_of(second)
+                    expected = [doc_id for doc_id, tokens in enumerate(documents, 1)
+                                if spans_within(phrase_starts(tokens, first_terms),
+                                                phrase_starts(tokens, second_terms),
+                                                len(first_terms), len(second_terms), distance)]
+                    results = engine.search(query)
+                    ok = results == expected
+                    failures += not ok
+                    print(f"{os.path.basename(filename):<20} {query:<40} {len(results):>7,}  "
+                          f"{'OK' if ok else f'MISMATCH (expected {len(expected):,})'}")
+    print()
+    return failures
+
+def benchmark_queries(filenames, queries=DEFAULT_QUERIES, repeat=20):
+    """Index each collection and time the query log against it."""
+    with tempfile.TemporaryDirectory() as directory:
+        for filename in filenames:
+            preprocessor = TextPreprocessor()
+            prefix = os.path.join(directory, os.path.basename(filename))
+            stats = SPIMIIndexer(preprocessor).build(filename, prefix)
+            print(f"{filename}: {stats['documents']:,} documents indexed "
+                  f"in {stats['elapsed']:.2f}s")
+            print(f"{'Query':<40} {'Results':>9} {'Mean':>9} {'p50':>9} {'p95':>9}")
+            print("-" * 80)
+
+            all_times = []
+            with InvertedIndex(prefix) as index:
+                engine = QueryEngine(index, preprocessor)
+                for query in queries:
+                    times = []
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        results = engine.search(query)
+                        times.append(time.perf_counter() - start)
+                    times.sort()
+                    all_times.extend(times)
+                    print(f"{query:<40} {len(results):>9,} "
+                          f"{1000 * sum(times) / repeat:>7.2f}ms "
+                          f"{1000 * percentile(times, 0.5):>7.2f}ms "
+                          f"{1000 * percentile(times, 0.95):>7.2f}ms")
+
+            all_times.sort()
+            print(f"All queries: mean {1000 * sum(all_times) / len(all_times):.2f}ms, "
+                  f"p50 {1000 * percentile(all_times, 0.5):.2f}ms, "
+                  f"p95 {1000 * percentile(all_times, 0.95):.2f}ms, "
+                  f"max {1000 * all_times[-1]:.2f}ms")
+            print()
+
+def ranked_corpus(filename, documents, seed=0):
+    """Write documents of varied length over a Zipfian vocabulary.
+
+    Six in ten words come from a heavy-tailed head (h1, h2, ...), the rest
+    from 65,536 rare terms, so queries can mix common and rare terms.
+    """
+    rng = random.Random(seed)
+    with open(filename, 'w', encoding='ascii') as f:
+        for _ in range(documents):
+            length = int(rng.lognormvariate(3.5, 0.8)) + 1
+            f.write(' '.join(f'h{int(rng.paretovariate(0.6)):x}' if rng.random() < 0.6
+                             else f'r{rng.randrange(1 << 16):04x}'
+                             for _ in range(length)) + '\n')
+
+def time_ranked(filename, prefix, queries, k, repeat):
+    """Index a collection and compare exhaustive and pruned search of each query."""
+    preprocessor = TextPreprocessor()
+    stats = SPIMIIndexer(preprocessor).build(filename, prefix)
+    print(f"{filename}: {stats['documents']:,} documents, top {k}")
+    print(f"{'Query':<36} {'Scorer':>6} {'Exhaustive':>11} {'Pruned':>9} {'Speedup':>8}")
+    print("-" * 74)
+
+    with InvertedIndex(prefix) as index:
+        for name, scorer_class in SCORERS.items():
+            retriever = RankedRetriever(index, preprocessor, scorer_class(index))
+            totals = [0.0, 0.0]
+            for query in queries:
+                times = []
+                for pruned in (False, True):
+                    best = float('inf')
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        results = retriever.search(query, k, pruned=pruned)
+                        best = min(best, time.perf_counter() - start)
+                    times.append(best)
+                    if not pruned:
+                        expected = results
+                totals[0] += times[0]
+                totals[1] += times[1]
+
+                if [doc for doc, _ in results] != [doc for doc, _ in expected]:
+                    print(f"  {query!r}: pruned ranking differs from exhaustive")
+                print(f"{query:<36} {name:>6} {1000 * times[0]:>9.2f}ms "
+                      f"{1000 * times[1]:>7.2f}ms {times[0] / times[1]:>7.2f}x")
+            print(f"{'All queries':<36} {name:>6} {1000 * totals[0]:>9.2f}ms "
+                  f"{1000 * totals[1]:>7.2f}ms {totals[0] / totals[1]:>7.2f}x")
+    print()
+
+def benchmark_ranked(filenames, queries=DEFAULT_RANKED_QUERIES, k=10, repeat=5):
+    """Compare exhaustive and MaxScore-pruned top-k retrieval.
+
+    Besides the given collections, a generated one (see ranked_corpus) is
+    always measured: on short, uniform documents such as Quran verses the
+    score bounds are too loose for pruning to pay off.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        for filename in filenames:
+            prefix = os.path.join(directory, os.path.basename(filename))
+            time_ranked(filename, prefix, queries, k, repeat)
+
+        synthetic = os.path.join(directory, 'ranked.txt')
+        ranked_corpus(synthetic, RANKED_CORPUS_DOCUMENTS)
+        time_ranked(synthetic, synthetic, SYNTHETIC_RANKED_QUERIES, k, repeat)
+
+SKETCH_CAPACITIES = [100, 1000, 10000]
+SKETCH_PRECISIONS = [8, 10, 12, 14]
+
+def analysis_tokens(filename):
+    """The tokens lab1_analysis counts for a collection, as one list."""
+    def tokenize_lines(f):
+        tokens = []
+        for line in f:
+            tokens.extend(tokenize_text(line))
+        return tokens
+    return read_collection(filename, tokenize_lines)
+
+def benchmark_sketches(filenames, capacities=SKETCH_CAPACITIES, k=10, head=100):
+    """Compare Space-Saving estimates with exact Counter results.
+
+    Reports recall of the true top k and top head terms, the largest
+    overestimate among monitored head terms against its bound, and checks that every true count lies within the
+    reported bounds.
+    """
+    for filename in filenames:
+        tokens = analysis_tokens(filename)
+        start = time.perf_counter()
+        exact = Counter(tokens)
+        exact_time = time.perf_counter() - start
+        true_top = [term for term, _ in exact.most_common(k)]
+        true_head = [term for term, _ in exact.most_common(head)]
+
+        print(f"{filename}: {len(tokens):,} tokens, {len(exact):,} terms, "
+              f"Counter {exact_time:.3f}s")
+        print(f"{'Capacity':>9} {'Time':>9} {'Top ' + str(k):>7} {'Top ' + str(head):>8} "
+              f"{'Max err':>8} {'Bound':>8} {'Reliable':>9}")
+        print("-" * 66)
+
+        for capacity in capacities:
+            sketch = SpaceSaving(capacity)
+            start = time.perf_counter()
+            for batch_start in range(0, len(tokens), 65536):
+                sketch.update(tokens[batch_start:batch_start + 65536])
+            elapsed = time.perf_counter() - start
+
+            top = {term for term, _, _, _ in sketch.top(k)}
+            estimated_head = {term for term, _ in sketch.ranked()[:head]}
+            max_error = max((sketch.counts[term] - exact[term] for term in true_head
+                             if term in sketch), default=0)
+            for term, count in sketch.counts.items():
+                if not count - sketch.errors[term] <= exact[term] <= count:
+                    print(f"  {term!r}: true count {exact[term]} outside bounds")
+
+            print(f"{capacity:>9,} {elapsed:>8.3f}s "
+                  f"{len(top & set(true_top)) / len(true_top):>7.0%} "
+                  f"{len(estimated_head & set(true_head)) / len(true_head):>8.0%} "
+                  f"{max_error:>8,} {sketch.max_error:>8,.0f} {sketch.reliable_ranks():>9,}")
+        print()
+
+def benchmark_growth_sketches(filenames, precisions=SKETCH_PRECISIONS):
+    """Compare HyperLogLog vocabulary growth curves with exact ones.
+
+    Reports the largest and mean relative error of V over the log-spaced
+    checkpoints, and the Heap's law fit from each curve.
+    """
+    for filename in filenames:
+        tokens = analysis_tokens(filename)
+        points = checkpoints_upto(log_checkpoints(), len(tokens))
+
+        start = time.perf_counter()
+        exact = VocabularyGrowthTracker(iter(points))
+        exact.update(tokens)
+        exact_time = time.perf_counter() - start
+        expected = exact.growth_data()
+        exact_k, exact_b = fit_heaps_law(expected)
+
+        print(f"{filename}: {len(tokens):,} tokens, {exact.vocabulary_size:,} terms, "
+              f"exact {exact_time:.3f}s, V = {exact_k:.2f} * N^{exact_b:.3f}")
+        print(f"{'Precision':>9} {'Bytes':>7} {'Time':>8} {'Max err':>8} {'Mean err':>9} "
+              f"{'Final V':>9} {'k':>8} {'b':>6}")
+        print("-" * 72)
+
+        for precision in precisions:
+            start = time.perf_counter()
+            approximate = VocabularyGrowthTracker(iter(points), HyperLogLog(precision))
+            approximate.update(tokens)
+            elapsed = time.perf_counter() - start
+            estimated = approximate.growth_data()
+
+            errors = [abs(v - true_v) / true_v
+                      for (_, v), (_, true_v) in zip(estimated, expected)]
+            k, b = fit_heaps_law(estimated)
+            print(f"{precision:>9} {approximate.vocabulary.size_bytes:>7,} {elapsed:>7.3f}s "
+                  f"{max(errors):>8.2%} {sum(errors) / len(errors):>9.2%} "
+                  f"{estimated[-1][1]:>9,} {k:>8.2f} {b:>6.3f}")
+        print()
+
+def text_tokens(filename, by_line=False):
+    """A collection's tokens from TextPreprocessor.tokenize (a list per line if by_line)."""
+    preprocessor = TextPreprocessor()
+    def tokenize(f):
+        if by_line:
+            return [preprocessor.tokenize(line) for line in f]
+        tokens = []
+        for chunk in iter_text_chunks(f):
+            tokens.extend(preprocessor.tokenize(chunk))
+        return tokens
+    return read_collection(filename, tokenize)
+
+def byte_tokens(filename, by_line=False):
+    """A collection's tokens from ByteTokenizer (a list per line if by_line)."""
+    def tokenize(chunks, tokenizer):
+        tokens = []
+        for chunk in chunks:
+            if by_line:
+                tokens.extend(tokenizer.tokenize_lines(chunk))
+            else:
+                tokens.extend(tokenizer.tokenize(chunk))
+        return tokens
+    return read_collection_bytes(filename, tokenize)
+
+def time_tokenizer(filename, tokens_of, repeat=3):
+    """Best wall time of tokenizing a collection, over several repeats."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tokens_of(filename)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def verify_tokenizer(filenames):
+    """Check ByteTokenizer against TextPreprocessor.tokenize and time both.
+
+    Returns the number of collections whose tokens or lines differ.
+    """
+    print(f"{'Collection':<24} {'Tokens':>11} {'Text':>9} {'Bytes':>9} {'Speedup':>8}")
+    print("-" * 65)
+
+    mismatches = 0
+    for filename in filenames:
+        expected = text_tokens(filename)
+        tokens = byte_tokens(filename)
+        same_lines = text_tokens(filename, by_line=True) == byte_tokens(filename, by_line=True)
+        text_time = time_tokenizer(filename, text_tokens)
+        bytes_time = time_tokenizer(filename, byte_tokens)
+
+        print(f"{os.path.basename(filename):<24} {len(tokens):>11,} {text_time:>8.3f}s "
+              f"{bytes_time:>8.3f}s {text_time / bytes_time:>7.2f}x")
+        if tokens != expected:
+            mismatches += 1
+            first = next((i for i, pair in enumerate(zip(tokens, expected))
+                          if pair[0] != pair[1]), min(len(tokens), len(expected)))
+            print(f"  MISMATCH at token {first:,}: expected "
+                  f"{expected[first:first + 5]!r}, got {tokens[first:first + 5]!r}")
+        elif not same_lines:
+            mismatches += 1
+            print("  MISMATCH in tokens per line")
+    return mismatches
+
+NGRAM_SIZES = [2, 3]
+# Table memory limits for the pruned runs, in bytes
+NGRAM_MEMORY_LIMITS = [8 << 20, 1 << 20]
+
+def tuple_ngrams(filename, n):
+    """Counter of n-gram tuples of each line's preprocessed tokens, the reference counts."""
+    preprocessor = TextPreprocessor()
+    def count(f):
+        counts = Counter()
+        for line in f:
+            tokens = preprocessor.preprocess_tokens(preprocessor.tokenize(line))
+            counts.update(zip(*(tokens[i:] for i in range(n))))
+        return counts
+    return read_collection(filename, count)
+
+def traced(function, *args, **kwargs):
+    """Result, wall time and peak traced memory of a call."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def verify_ngrams(filenames, sizes=NGRAM_SIZES, limits=NGRAM_MEMORY_LIMITS):
+    """Check packed n-gram counts against a Counter of tuples and compare cost.
+
+    Runs with a large memory limit must be exact; runs pruned to fit a small
+    limit must keep every count within max_error of the truth. Times and
+    peaks are measured under tracemalloc, so both are inflated alike.
+    Returns the number of failed checks.
+    """
+    failures = 0
+    print(f"{'Collection':<20} {'n':>2} {'Limit':>7} {'Distinct':>10} {'Error':>6} "
+          f"{'Time':>8} {'Peak MB':>8}  Check")
+    print("-" * 78)
+
+    for filename in filenames:
+        name = os.path.basename(filename)
+        for n in sizes:
+            expected, elapsed, peak = traced(tuple_ngrams, filename, n)
+            print(f"{name:<20} {n:>2} {'tuples':>7} {len(expected):>10,} {0:>6} "
+                  f"{elapsed:>7.2f}s {peak / (1 << 20):>8.1f}")
+
+            for limit in [None] + limits:
+                kwargs = {} if limit is None else {'memory_limit': limit}
+                counter, elapsed, peak = traced(count_ngrams, filename, n, **kwargs)
+                statistics = counter.statistics()
+                counts = dict(zip(statistics.decode(statistics.keys), statistics.counts.tolist()))
+                if counter.max_error == 0:
+                    ok = counts == expected
+                else:
+                    ok = all(expected[ngram] - counter.max_error <= count <= expected[ngram]
+                             for ngram, count in counts.items())
+                failures += not ok
+                label = 'default' if limit is None else f'{limit >> 20}MB'
+                print(f"{name:<20} {n:>2} {label:>7} {len(statistics):>10,} "
+                      f"{counter.max_error:>6} {elapsed:>7.2f}s {peak / (1 << 20):>8.1f}  "
+                      f"{'OK' if ok else 'MISMATCH'}")
+    return failures
+
+# Term table limits of the out-of-core checks, in bytes
+EXTERNAL_MEMORY_LIMIT = 1 << 20
+COLLECTION_MEMORY_LIMIT = 256 << 10
+# Size of the synthetic corpus as a multiple of EXTERNAL_MEMORY_LIMIT
+EXTERNAL_SCALE = 16
+# Bytes tokenized per batch when feeding the counter
+EXTERNAL_CHUNK = 64 << 10
+
+def random_term_corpus(filename, size, seed=0):
+    """Write about size bytes of random terms, so the vocabulary keeps growing.
+
+    Half the words come from a heavy-tailed head, so a few terms are very
+    frequent; the rest are drawn from a million rare terms.
+    """
+    rng = random.Random(seed)
+    written = 0
+    with open(filename, 'w', encoding='ascii') as f:
+        while written < size:
+            line = ' '.join(f'h{int(rng.paretovariate(0.6)):x}' if rng.random() < 0.5
+                            else f'r{rng.randrange(1 << 20):05x}' for _ in range(60)) + '\n'
+            f.write(line)
+            written += len(line)
+
+def feed_counter(filename, counter=None):
+    """Tokenize a file in EXTERNAL_CHUNK batches, counting them if a counter is given."""
+    tokenizer = ByteTokenizer()
+    for chunk in iter_chunks(filename, EXTERNAL_CHUNK):
+        tokens = tokenizer.tokenize(chunk)
+        if counter is not None:
+            counter.update(tokens)
+    return counter
+
+def check_counts_file(filename, expected):
+    """Whether a counts file holds exactly the expected counts, sorted by term,
+    and its streamed Zipf and Benford analyses match the in-memory ones."""
+    pairs = list(read_counts(filename))
+    terms = [term for term, _ in pairs]
+    if terms != sorted(expected) or dict(pairs) != expected:
+        print("  MISMATCH in counts")
+        return False
+
+    statistics = analyze_counts_file(filename)
+    zipf = TermStatistics.from_counts(expected).zipf()
+    benford = analyze_benford_law(list(expected.values()))
+    checks = {
+        'total': statistics['total_tokens'] == sum(expected.values()),
+        'top terms': ([count for _, count in statistics['top_terms']]
+                      == [count for _, count in expected.most_common(10)]),
+        'zipf': (abs(statistics['zipf']['alpha'] - zipf['alpha']) < 1e-9
+                 and abs(statistics['zipf']['k'] / zipf['k'] - 1) < 1e-9),
+        'benford': (statistics['benford']['all_digits'] == benford['all_digits']
+                    and statistics['benford']['filtered_digits'] == benford['filtered_digits'])
+    }
+    for check, ok in checks.items():
+        if not ok:
+            print(f"  MISMATCH in {check}")
+    return all(checks.values())
+
+def verify_external(filenames, memory_limit=EXTERNAL_MEMORY_LIMIT, scale=EXTERNAL_SCALE):
+    """Check out-of-core term counts for exactness and for staying within the memory limit.
+
+    Each collection is counted through the preprocessing pipeline with a
+    small limit and compared with a Counter of its tokens. Then a synthetic
+    corpus scale times the limit is counted under tracemalloc: the counting
+    peak may exceed the limit only by what tokenizing one batch takes on
+    its own (measured separately), and the merge must stay within it.
+    Returns the number of failed checks.
+    """
+    failures = 0
+    with tempfile.TemporaryDirectory() as directory:
+        counts_file = os.path.join(directory, 'counts.tsv')
+
+        for filename in filenames:
+            preprocessor = TextPreprocessor()
+            expected = read_collection(filename, lambda f: Counter(preprocessor.iter_tokens(f)))
+            counter = count_collection(filename, counts_file, preprocessor,
+                                       COLLECTION_MEMORY_LIMIT)
+            ok = check_counts_file(counts_file, expected)
+            failures += not ok
+            print(f"{os.path.basename(filename)}: {counter.terms:,} terms, "
+                  f"{len(counter.runs)} runs at {COLLECTION_MEMORY_LIMIT >> 10} KB  "
+                  f"{'OK' if ok else 'MISMATCH'}")
+
+        corpus = os.path.join(directory, 'synthetic.txt')
+        random_term_corpus(corpus, scale * memory_limit)
+        print(f"\nSynthetic corpus: {os.path.getsize(corpus) / (1 << 20):.1f} MB, "
+              f"memory limit {memory_limit / (1 << 20):g} MB")
+
+        expected, elapsed, peak = traced(
+            lambda: Counter(token for tokens in map(ByteTokenizer().tokenize,
+                                                    iter_chunks(corpus, EXTERNAL_CHUNK))
+                            for token in tokens))
+        print(f"{'Counter':<24} {elapsed:>7.2f}s {peak / (1 << 20):>8.1f} MB  "
+              f"{len(expected):,} terms")
+
+        _, elapsed, input_peak = traced(feed_counter, corpus)
+        print(f"{'Tokenizing only':<24} {elapsed:>7.2f}s {input_peak / (1 << 20):>8.1f} MB")
+
+        counter = ExternalCounter(memory_limit, directory)
+        _, elapsed, peak = traced(feed_counter, corpus, counter)
+        ok = peak <= memory_limit + input_peak and counter.peak_table_bytes <= memory_limit
+        failures += not ok
+        print(f"{'External counting':<24} {elapsed:>7.2f}s {peak / (1 << 20):>8.1f} MB  "
+              f"{len(counter.runs)} runs, table peak {counter.peak_table_bytes / (1 << 20):.2f} MB  "
+              f"{'OK' if ok else 'OVER LIMIT'}")
+
+        terms, elapsed, peak = traced(counter.finish, counts_file)
+        ok = peak <= memory_limit
+        failures += not ok
+        print(f"{'External merge':<24} {elapsed:>7.2f}s {peak / (1 << 20):>8.1f} MB  "
+              f"{counter.merge_passes} passes, {terms:,} terms  {'OK' if ok else 'OVER LIMIT'}")
+
+        ok = check_counts_file(counts_file, expected)
+        failures += not ok
+        print(f"Counts and streamed Zipf/Benford analyses  {'OK' if ok else 'MISMATCH'}")
+    return failures
+
+CLI_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lab1_cli.py')
+# Modules whose import dominates start-up time
+HEAVY_MODULES = ('numpy', 'scipy', 'matplotlib')
+# Each subcommand runs on the first lines of the suite corpus, so start-up dominates
+STARTUP_LINES = 100
+# (name, arguments, files removed before each run so it does the full work)
+STARTUP_COMMANDS = [
+    ('count', ['count', 'startup.txt', '--workers', '1'], []),
+    ('preprocess', ['preprocess', 'startup.txt', '--workers', '1'], []),
+    ('index', ['index', 'startup.txt'], []),
+    ('query', ['query', 'startup', 'god AND mercy'], []),
+    ('rank', ['rank', 'startup', 'mercy of god'], []),
+    ('analyze', ['analyze', 'startup.txt', '--jobs', '1'], []),
+    ('plot', ['plot', 'startup.txt', '--jobs', '1'], ['plot_cache.json'])
+]
+
+def parse_importtime(stderr):
+    """Total import time in seconds and top-level packages imported, from -X importtime."""
+    total = 0
+    packages = set()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        packages.add(name.strip().split('.')[0])
+        # Nested imports are indented; top-level ones already include them
+        if not name[1:].startswith(' '):
+            total += int(cumulative)
+    return total / 1e6, packages
+
+def time_command(args, directory, uncached=(), repeat=3):
+    """Best wall time of running a Python command, and its (import time, packages)."""
+    env = dict(os.environ, MPLBACKEND='Agg')
+
+    def clear():
+        for filename in uncached:
+            path = os.path.join(directory, filename)
+            if os.path.exists(path):
+                os.remove(path)
+
+    best = float('inf')
+    for _ in range(repeat):
+        clear()
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, cwd=directory, env=env, check=True,
+                       stdout=subprocess.DEVNULL)
+        best = min(best, time.perf_counter() - start)
+    clear()
+    traced = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=directory,
+                            env=env, check=True, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, text=True)
+    return best, parse_importtime(traced.stderr)
+
+def benchmark_startup(commands=STARTUP_COMMANDS):
+    """Time each lab1_cli subcommand from a cold interpreter on a tiny collection.
+
+    Returns the number of light subcommands that loaded a heavy module.
+    """
+    failures = 0
+    with tempfile.TemporaryDirectory() as directory:
+        with open(SUITE_CORPUS, 'r', encoding='utf-8') as src, \
+                open(os.path.join(directory, 'startup.txt'), 'w', encoding='utf-8') as dst:
+            for _, line in zip(range(STARTUP_LINES), src):
+                dst.write(line)
+
+        baseline, _ = time_command(['-c', 'pass'], directory)
+        print(f"Interpreter start-up: {1000 * baseline:.0f}ms")
+        print(f"{'Command':<12} {'Wall':>8} {'Imports':>8}  Heavy modules")
+        print("-" * 50)
+
+        for name, args, uncached in commands:
+            elapsed, (import_time, packages) = time_command([CLI_SCRIPT] + args, directory,
+                                                            uncached)
+            heavy = sorted(set(HEAVY_MODULES) & packages)
+            status = ''
+            if name in LIGHT_COMMANDS and heavy:
+                failures += 1
+                status = '  SHOULD BE NONE'
+            print(f"{name:<12} {1000 * elapsed:>6.0f}ms {1000 * import_time:>6.0f}ms  "
+                  f"{', '.join(heavy) or '-'}{status}")
+    return failures
+
+def synthetic_corpus(source, scale, filename, seed=0):
+    """Write a corpus about scale times the size of source.
+
+    Lines of source are sampled at random and one word in ten gets a random
+    two-letter suffix, so new terms keep appearing as the corpus grows
+    instead of the vocabulary saturating.
+    """
+    rng = random.Random(seed)
+    with open(source, 'r', encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+
+    with open(filename, 'w', encoding='utf-8') as f:
+        for _ in range(len(lines) * scale):
+            words = rng.choice(lines).split(' ')
+            for i in range(len(words)):
+                if rng.random() < 0.1:
+                    words[i] += rng.choice(letters) + rng.choice(letters)
+            f.write(' '.join(words) + '\n')
+
+def stem_all(stemmer, tokens):
+    stem = stemmer.stem
+    return [stem(token) for token in tokens]
+
+def suite_stages(text):
+    """(stage, function, items processed) for each hot path on one corpus."""
+    preprocessor = TextPreprocessor()
+    raw = preprocessor.tokenize(text)
+    stopped = preprocessor.remove_stop_words(raw)
+    counts = Counter(preprocessor.stem_tokens(stopped))
+
+    return [
+        ('tokenize', lambda: preprocessor.tokenize(text), len(raw)),
+        ('remove_stop_words', lambda: preprocessor.remove_stop_words(raw), len(raw)),
+        ('porter_stem', lambda: stem_all(PorterStemmer(), stopped), len(stopped)),
+        ('fast_porter_stem', lambda: stem_all(FastPorterStemmer(), stopped), len(stopped)),
+        ('simple_stem', lambda: [simple_stem(token) for token in stopped], len(stopped)),
+        ('preprocess_text', lambda: TextPreprocessor().preprocess_text(text), len(raw)),
+        ('zipf', lambda: analyze_zipf_law(counts), len(counts)),
+        ('benford', lambda: analyze_benford_law(list(counts.values())), len(counts)),
+        ('heaps', lambda: analyze_vocabulary_growth(raw), len(raw))
+    ]
+
+def measure(function, repeat):
+    """Best wall time over at least repeat runs, then peak traced memory of one more."""
+    best = float('inf')
+    runs = 0
+    total = 0.0
+    while runs < repeat or (total < MIN_MEASURE_TIME and runs < 100):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = min(best, elapsed)
+        total += elapsed
+        runs += 1
+
+    # Tracing slows Python code down, so memory gets its own run
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+def run_suite(scales=SUITE_SCALES):
+    """Time every stage on each corpus scale; returns the results document."""
+    results = {}
+    print(f"{'Corpus':<12} {'Stage':<18} {'Items':>11} {'Time':>10} "
+          f"{'Items/sec':>12} {'Peak MB':>9}")
+    print("-" * 77)
+
+    with tempfile.TemporaryDirectory() as directory:
+        for scale in scales:
+            corpus = f'quran x{scale}'
+            filename = SUITE_CORPUS
+            if scale != 1:
+                filename = os.path.join(directory, f'synthetic{scale}.txt')
+                synthetic_corpus(SUITE_CORPUS, scale, filename)
+            with open(filename, 'r', encoding='utf-8') as f:
+                text = f.read()
+
+            for stage, function, items in suite_stages(text):
+                seconds, peak = measure(function, repeat=3 if scale == 1 else 1)
+                results[f'{corpus}/{stage}'] = {
+                    'corpus': corpus,
+                    'stage': stage,
+                    'items': items,
+                    'seconds': seconds,
+                    'items_per_sec': items / seconds if seconds else 0.0,
+                    'peak_bytes': peak
+                }
+                print(f"{corpus:<12} {stage:<18} {items:>11,} {seconds:>9.3f}s "
+                      f"{items / seconds if seconds else 0:>12,.0f} {peak / (1 << 20):>9.1f}")
+
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'scales': list(scales),
+        'results': results
+    }
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """Print time and memory ratios per stage; returns the number of regressions."""
+    print(f"{'Stage':<32} {'Time':>9} {'Ratio':>7} {'Peak MB':>9} {'Ratio':>7}")
+    print("-" * 70)
+
+    regressions = 0
+    for key, result in current['results'].items():
+        base = baseline['results'].get(key)
+        if base is None:
+            print(f"{key:<32} {result['seconds']:>8.3f}s {'new':>7}")
+            continue
+
+        time_ratio = result['seconds'] / base['seconds'] if base['seconds'] else 1.0
+        memory_ratio = result['peak_bytes'] / base['peak_bytes'] if base['peak_bytes'] else 1.0
+        flags = []
+        if (time_ratio > 1 + threshold
+                and result['seconds'] - base['seconds'] > MIN_TIME_DIFFERENCE):
+            flags.append('SLOWER')
+        if memory_ratio > 1 + threshold:
+            flags.append('BIGGER')
+        regressions += bool(flags)
+        print(f"{key:<32} {result['seconds']:>8.3f}s {time_ratio:>6.2f}x "
+              f"{result['peak_bytes'] / (1 << 20):>9.1f} {memory_ratio:>6.2f}x  {' '.join(flags)}")
+
+    print(f"\n{regressions} regressions beyond {threshold:.0%}")
+    return regressions
+
+def load_results(filename):
+    with open(filename, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_results(results, filename):
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved results to {filename}")
+
+def suite_main(args):
+    """Handle the suite and compare commands."""
+    if sys.argv[1] == 'suite':
+        scales = SUITE_SCALES
+        if len(args) > 1:
+            scales = [int(scale) for scale in args[1].split(',')]
+        save_results(run_suite(scales), args[0] if args else 'benchmark_results.json')
+        return 0
+
+    if len(args) < 2:
+        print(__doc__.strip())
+        return 2
+    threshold = float(args[2]) if len(args) > 2 else DEFAULT_THRESHOLD
+    return 1 if compare_results(load_results(args[0]), load_results(args[1]), threshold) else 0
+
+def main():
+    """Run the requested benchmark or check."""
+    commands = ('verify', 'bench', 'compressed', 'parallel', 'queries', 'ranked',
+                'sketches', 'tokenizer', 'ngrams', 'external', 'startup', 'suite', 'compare')
+    if len(sys.argv) < 2 or sys.argv[1] not in commands:
+        print(__doc__.strip())
+        return 2
+
+    if sys.argv[1] in ('suite', 'compare'):
+        return suite_main(sys.argv[2:])
+    if sys.argv[1] == 'startup':
+        return 1 if benchmark_startup() else 0
+
+    filenames = existing(sys.argv[2:] or DEFAULT_COLLECTIONS)
+
+    if sys.argv[1] == 'verify':
+        failures = verify_stemmer(filenames)
+        failures += verify_streaming(filenames)
+        return 1 if failures else 0
+    if sys.argv[1] == 'tokenizer':
+        return 1 if verify_tokenizer(filenames) else 0
+    if sys.argv[1] == 'ngrams':
+        return 1 if verify_ngrams(filenames) else 0
+    if sys.argv[1] == 'external':
+        return 1 if verify_external(filenames) else 0
+
+    if sys.argv[1] == 'compressed':
+        benchmark_compressed(filenames)
+    elif sys.argv[1] == 'parallel':
+        benchmark_parallel(filenames)
+    elif sys.argv[1] == 'queries':
+        failures = verify_queries(filenames)
+        benchmark_queries(filenames)
+        return 1 if failures else 0
+    elif sys.argv[1] == 'ranked':
+        benchmark_ranked(filenames)
+    elif sys.argv[1] == 'sketches':
+        benchmark_sketches(filenames)
+        benchmark_growth_sketches(filenames)
+    else:
+        benchmark_stemmer(filenames)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Lab 1: Preprocessing Cache
+Stores the results of preprocessing a collection (term counts, vocabulary
+growth data and the token stream as a binary token file) under a key
+derived from a hash of the input file's contents and a fingerprint of the
+pipeline (tokenizer pattern, stop words, stemmer and its version). A
+later run over the same file with the same pipeline loads the results
+instead of re-tokenizing and re-stemming.
+
+Entries live in subdirectories of the cache directory; an index records
+their sizes and last use, and the least recently used entries are evicted
+once the total exceeds max_bytes.
+
+Usage:
+    python lab1_cache.py list [cache_dir]
+    python lab1_cache.py invalidate collection [cache_dir]
+    python lab1_cache.py clear [cache_dir]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+from array import array
+from collections import Counter
+
+from lab1_tokenfile import TokenFileReader
+
+DEFAULT_CACHE_DIR = '.lab1_cache'
+DEFAULT_MAX_BYTES = 2 << 30
+
+INDEX_FILE = 'index.json'
+TOKEN_FILE = 'tokens.tok'
+COUNTS_FILE = 'counts.bin'
+META_FILE = 'meta.json'
+
+def file_digest(filename, chunk_size=1 << 20):
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def pipeline_digest(preprocessor):
+    """SHA-256 of a preprocessor's fingerprint."""
+    config = json.dumps(preprocessor.fingerprint(), sort_keys=True)
+    return hashlib.sha256(config.encode('utf-8')).hexdigest()
+
+class PreprocessingCache:
+    """Size-bounded LRU cache of preprocessing results on disk."""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _read_index(self):
+        try:
+            with open(os.path.join(self.directory, INDEX_FILE), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _load_index(self):
+        index = self._read_index()
+        self.entries = index.get('entries', {})
+        # Digests of input files by path, reused while size and mtime match
+        self.digests = index.get('digests', {})
+        # Removed here, so not to be merged back in from the file
+        self._removed = set()
+        self._forgotten = set()
+
+    def _save_index(self):
+        # Several processes may share a cache: keep what others added since
+        # the index was loaded, unless it has been removed in the meantime
+        index = self._read_index()
+        for key, entry in index.get('entries', {}).items():
+            if (key not in self.entries and key not in self._removed
+                    and os.path.isdir(self._entry_dir(key))):
+                self.entries[key] = entry
+        for path, digest in index.get('digests', {}).items():
+            if path not in self._forgotten:
+                self.digests.setdefault(path, digest)
+
+        path = os.path.join(self.directory, INDEX_FILE)
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump({'entries': self.entries, 'digests': self.digests}, f, indent=1)
+        os.replace(temporary, path)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.directory, key)
+
+    def key(self, filename, preprocessor):
+        """Cache key for a collection processed by preprocessor."""
+        path = os.path.abspath(filename)
+        stat = os.stat(path)
+        known = self.digests.get(path)
+        if known and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+            digest = known[2]
+        else:
+            digest = file_digest(path)
+            self.digests[path] = [stat.st_size, stat.st_mtime_ns, digest]
+            self._save_index()
+        return hashlib.sha256(f'{digest}:{pipeline_digest(preprocessor)}'.encode()).hexdigest()[:32]
+
+    def get(self, key):
+        """Cached results for key, or None.
+
+        Returns a dict with token_counts (a Counter in first-occurrence
+        order), raw_growth, processed_growth and token_file (the path of the
+        cached token file).
+        """
+        entry = self.entries.get(key)
+        directory = self._entry_dir(key)
+        if entry is None or not os.path.isdir(directory):
+            return None
+
+        try:
+            with open(os.path.join(directory, META_FILE), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            counts = array('Q')
+            with open(os.path.join(directory, COUNTS_FILE), 'rb') as f:
+                counts.frombytes(f.read())
+            token_file = os.path.join(directory, TOKEN_FILE)
+            with TokenFileReader(token_file) as reader:
+                token_counts = Counter(dict(zip(reader.vocabulary, counts)))
+        except (OSError, ValueError):
+            # A damaged entry is a miss
+            self.invalidate_key(key)
+            return None
+
+        entry['last_used'] = time.time()
+        self._save_index()
+        return {
+            'token_counts': token_counts,
+            'raw_growth': [tuple(point) for point in meta['raw_growth']],
+            'processed_growth': [tuple(point) for point in meta['processed_growth']],
+            'token_file': token_file
+        }
+
+    def put(self, key, source, token_counts, raw_growth, processed_growth, token_file):
+        """Store results for key, taking ownership of token_file (which is moved)."""
+        directory = self._entry_dir(key)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        shutil.move(token_file, os.path.join(directory, TOKEN_FILE))
+
+        # Counts in vocabulary order, which is also the Counter's order
+        with TokenFileReader(os.path.join(directory, TOKEN_FILE)) as reader:
+            counts = array('Q', map(token_counts.__getitem__, reader.vocabulary))
+        with open(os.path.join(directory, COUNTS_FILE), 'wb') as f:
+            counts.tofile(f)
+
+        with open(os.path.join(directory, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump({'source': os.path.abspath(source),
+                       'raw_growth': raw_growth,
+                       'processed_growth': processed_growth}, f)
+
+        size = sum(os.path.getsize(os.path.join(directory, name))
+                   for name in os.listdir(directory))
+        self.entries[key] = {'source': os.path.abspath(source), 'size': size,
+                             'last_used': time.time()}
+        self._evict()
+        self._save_index()
+
+    def new_token_file(self):
+        """A fresh path in the cache directory for writing a token file."""
+        return os.path.join(self.directory, f'pending-{os.getpid()}-{time.time_ns()}.tok')
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        total = sum(entry['size'] for entry in self.entries.values())
+        for key in sorted(self.entries, key=lambda key: self.entries[key]['last_used']):
+            if total <= self.max_bytes:
+                break
+            total -= self.entries[key]['size']
+            self._remove(key)
+
+    def _remove(self, key):
+        self.entries.pop(key, None)
+        self._removed.add(key)
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def invalidate_key(self, key):
+        """Remove one entry."""
+        self._remove(key)
+        self._save_index()
+
+    def invalidate(self, filename):
+        """Remove every entry for a collection, whatever pipeline produced it."""
+        path = os.path.abspath(filename)
+        keys = [key for key, entry in self.entries.items() if entry['source'] == path]
+        for key in keys:
+            self._remove(key)
+        self.digests.pop(path, None)
+        self._forgotten.add(path)
+        self._save_index()
+        return len(keys)
+
+    def clear(self):
+        """Remove every entry."""
+        for key in list(self.entries):
+            self._remove(key)
+        self._forgotten.update(self.digests)
+        self.digests = {}
+        self._save_index()
+
+    @property
+    def size(self):
+        """Total bytes used by cached entries."""
+        return sum(entry['size'] for entry in self.entries.values())
+
+def main():
+    """List, invalidate or clear cache entries."""
+    commands = ('list', 'invalidate', 'clear')
+    if len(sys.argv) < 2 or sys.argv[1] not in commands:
+        print(__doc__.strip())
+        return 2
+
+    args = sys.argv[2:]
+    if sys.argv[1] == 'invalidate':
+        if not args:
+            print(__doc__.strip())
+            return 2
+        filename = args.pop(0)
+    cache = PreprocessingCache(args[0] if args else DEFAULT_CACHE_DIR)
+
+    if sys.argv[1] == 'list':
+        for key, entry in sorted(cache.entries.items(), key=lambda item: -item[1]['last_used']):
+            used = time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['last_used']))
+            print(f"{key}  {entry['size']:>14,}  {used}  {entry['source']}")
+        print(f"{len(cache.entries)} entries, {cache.size:,} of {cache.max_bytes:,} bytes")
+    elif sys.argv[1] == 'invalidate':
+        print(f"Removed {cache.invalidate(filename)} entries for {filename}")
+    else:
+        cache.clear()
+        print("Cache cleared")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Lab 1: Command-Line Interface
+One entry point for the Lab 1 tools, taking collections and options as
+arguments instead of the lists fixed in each script's main().
+
+Usage:
+    python lab1_cli.py count FILE... [--workers N] [--top N]
+    python lab1_cli.py preprocess FILE... [--output-dir DIR] [--workers N] [--no-token-file]
+    python lab1_cli.py analyze FILE... [--name NAME]... [--jobs N]
+                       [--streaming | --external [--memory-mb MB]] [--max-lines N]
+    python lab1_cli.py aggregate FILE... [--output-dir DIR] [--memory-mb MB] [--top N]
+    python lab1_cli.py plot FILE... [--name NAME]... [--jobs N]
+    python lab1_cli.py ngrams FILE... [-n N] [--min-count N] [--measure llr|pmi]
+                       [--top K] [--memory-mb MB] [--max-lines N]
+    python lab1_cli.py index FILE [--prefix PREFIX] [--memory-mb MB]
+    python lab1_cli.py query PREFIX [QUERY...]
+    python lab1_cli.py rank PREFIX [QUERY...] [--scorer tfidf|bm25] [-k K]
+
+Compressed collections (.gz, .bz2, .xz) are found when the plain file is
+missing. Queries are read from stdin when none are given.
+
+Each subcommand imports the modules it needs when it runs. count,
+preprocess, index, query and rank never load numpy or matplotlib.
+analyze, aggregate and ngrams load numpy, and plot also loads matplotlib.
+'lab1_benchmark.py startup' measures the cold start of every subcommand.
+"""
+
+import os
+import sys
+import time
+import argparse
+
+# Subcommands that must start without numpy, scipy or matplotlib
+LIGHT_COMMANDS = ('count', 'preprocess', 'index', 'query', 'rank')
+
+def collection_name(filename):
+    """Name a collection after its file, e.g. 'quran' for quran.txt.gz."""
+    from lab1_corpus import COMPRESSED_EXTENSIONS
+
+    name = os.path.basename(filename)
+    for ext in COMPRESSED_EXTENSIONS:
+        if name.endswith(ext):
+            name = name[:-len(ext)]
+            break
+    return os.path.splitext(name)[0]
+
+def resolve_collections(filenames):
+    """Existing paths for the given collections, reporting missing ones.
+
+    Returns (paths, status), status being 1 if any file was not found.
+    """
+    from lab1_corpus import find_collection
+
+    paths = []
+    status = 0
+    for filename in filenames:
+        path = find_collection(filename)
+        if path is None:
+            print(f"File not found: {filename}")
+            status = 1
+        else:
+            paths.append(path)
+    return paths, status
+
+def named_collections(args):
+    """(filename, name) pairs for analyze and plot; names default to the file names."""
+    names = args.name or []
+    names += [collection_name(filename) for filename in args.files[len(names):]]
+    return list(zip(args.files, names))
+
+def count_command(args):
+    """Print token and term counts of each collection after preprocessing."""
+    from lab1_preprocessing import STEM_CACHE_FILE, TextPreprocessor, preprocess_collection
+
+    paths, status = resolve_collections(args.files)
+    for path in paths:
+        start = time.perf_counter()
+        preprocessor = TextPreprocessor(stem_cache_file=STEM_CACHE_FILE)
+        token_counts, _, _ = preprocess_collection(path, preprocessor, workers=args.workers)
+        elapsed = time.perf_counter() - start
+
+        print(f"{path}: {sum(token_counts.values()):,} tokens, "
+              f"{len(token_counts):,} terms ({elapsed:.2f}s)")
+        for term, count in token_counts.most_common(args.top):
+            print(f"  {term:<20} {count:>10,}")
+    return status
+
+def preprocess_command(args):
+    """Write the preprocessed text (and token file) of each collection."""
+    from lab1_preprocessing import STEM_CACHE_FILE, TextPreprocessor, preprocess_collection
+
+    paths, status = resolve_collections(args.files)
+    for path in paths:
+        base = os.path.join(args.output_dir, f'{collection_name(path)}_preprocessed')
+        token_filename = None if args.no_token_file else base + '.tok'
+        preprocessor = TextPreprocessor(stem_cache_file=STEM_CACHE_FILE)
+        token_counts, _, _ = preprocess_collection(
+            path, preprocessor, base + '.txt', args.workers, token_filename)
+
+        outputs = base + '.txt' + ('' if token_filename is None else f' and {token_filename}')
+        print(f"{path}: {sum(token_counts.values()):,} tokens written to {outputs}")
+    return status
+
+def memory_limit_from(args, default):
+    return default if args.memory_mb is None else int(args.memory_mb * (1 << 20))
+
+def analyze_command(args, plots=False):
+    """Run the full laws analysis, with or without figures."""
+    collections = named_collections(args)
+    if args.streaming or args.external:
+        from lab1_analysis import (EXTERNAL_MEMORY_LIMIT, analyze_collection_external,
+                                   analyze_collection_streaming, print_comparison)
+
+        memory_limit = memory_limit_from(args, EXTERNAL_MEMORY_LIMIT)
+        status = 0
+        results = []
+        for filename, name in collections:
+            paths, missing = resolve_collections([filename])
+            status |= missing
+            for path in paths:
+                if args.streaming:
+                    result = analyze_collection_streaming(path, name, args.max_lines)
+                else:
+                    result = analyze_collection_external(path, name, args.max_lines,
+                                                         memory_limit)
+                if result:
+                    results.append(result)
+        if results:
+            print_comparison(results)
+        return status
+
+    from lab1_preprocessing import analyze_collections
+
+    results = analyze_collections(collections, plots, args.jobs)
+    return 0 if len(results) == len(collections) else 1
+
+def plot_command(args):
+    return analyze_command(args, plots=True)
+
+def aggregate_command(args):
+    """Count each collection's terms out of core into NAME_counts.tsv and analyze the counts."""
+    from lab1_external import DEFAULT_MEMORY_LIMIT, analyze_counts_file, count_collection
+    from lab1_preprocessing import STEM_CACHE_FILE, TextPreprocessor
+
+    memory_limit = memory_limit_from(args, DEFAULT_MEMORY_LIMIT)
+    paths, status = resolve_collections(args.files)
+    for path in paths:
+        counts_file = os.path.join(args.output_dir, f'{collection_name(path)}_counts.tsv')
+        start = time.perf_counter()
+        preprocessor = TextPreprocessor(stem_cache_file=STEM_CACHE_FILE)
+        counter = count_collection(path, counts_file, preprocessor, memory_limit)
+        statistics = analyze_counts_file(counts_file, args.top)
+        elapsed = time.perf_counter() - start
+
+        print(f"{path}: {counter.tokens:,} tokens, {counter.terms:,} terms "
+              f"written to {counts_file} ({elapsed:.2f}s)")
+        if counter.runs:
+            print(f"Spilled {len(counter.runs):,} run(s) to fit {memory_limit / (1 << 20):.3g} MB, "
+                  f"merged in {counter.merge_passes} pass(es)")
+        for term, count in statistics['top_terms']:
+            print(f"  {term:<20} {count:>10,}")
+
+        zipf = statistics['zipf']
+        if zipf:
+            print(f"Zipf fit over {zipf['ranks']:,} ranks: "
+                  f"alpha = {zipf['alpha']:.3f}, k = {zipf['k']:.1f}")
+        digits = statistics['benford']['all_digits']
+        total = sum(digits.values())
+        if total:
+            print("First digits: " + ' '.join(
+                f"{digit}:{digits.get(digit, 0) / total:.1%}" for digit in range(1, 10)))
+    return status
+
+def ngrams_command(args):
+    """Print the most frequent n-grams and the strongest collocations of each collection."""
+    from lab1_ngrams import DEFAULT_MEMORY_LIMIT, count_ngrams
+
+    memory_limit = memory_limit_from(args, DEFAULT_MEMORY_LIMIT)
+    measure = args.measure or ('llr' if args.n == 2 else 'pmi')
+    paths, status = resolve_collections(args.files)
+    for path in paths:
+        start = time.perf_counter()
+        try:
+            counter = count_ngrams(path, args.n, memory_limit=memory_limit,
+                                   max_lines=args.max_lines)
+        except ValueError as e:
+            print(f"{path}: {e}")
+            status = 1
+            continue
+        statistics = counter.statistics(args.min_count)
+        elapsed = time.perf_counter() - start
+
+        print(f"{path}: {counter.total:,} {args.n}-grams, {len(statistics):,} distinct "
+              f"with at least {args.min_count} occurrences ({elapsed:.2f}s)")
+        if counter.max_error:
+            print(f"Table pruned to fit {memory_limit / (1 << 20):g} MB: "
+                  f"counts may be up to {counter.max_error:,} too low")
+        print("Most frequent:")
+        for ngram, count in statistics.most_common(args.top):
+            print(f"  {' '.join(ngram):<32} {count:>10,}")
+        print(f"Collocations by {measure.upper()}:")
+        for ngram, count, score in statistics.collocations(args.top, measure):
+            print(f"  {' '.join(ngram):<32} {count:>10,} {score:>10.2f}")
+    return status
+
+def index_command(args):
+    from lab1_index import DEFAULT_MEMORY_LIMIT, build_index
+
+    paths, status = resolve_collections([args.file])
+    if status:
+        return status
+    memory_limit = memory_limit_from(args, DEFAULT_MEMORY_LIMIT)
+    build_index(paths[0], args.prefix, memory_limit)
+    return 0
+
+def queries_from(args):
+    return args.queries or (line.strip() for line in sys.stdin)
+
+def query_command(args):
+    from lab1_query import run_queries
+
+    run_queries(args.prefix, queries_from(args))
+    return 0
+
+def rank_command(args):
+    from lab1_ranking import run_ranked_queries
+
+    run_ranked_queries(args.prefix, queries_from(args), args.scorer, args.k)
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='lab1_cli.py', description='Lab 1 text processing, analysis and search.')
+    commands = parser.add_subparsers(dest='command', required=True, metavar='command')
+    cpus = os.cpu_count() or 1
+
+    count = commands.add_parser('count', help='count tokens and terms after preprocessing')
+    count.add_argument('files', nargs='+', metavar='FILE')
+    count.add_argument('--workers', type=int, default=cpus,
+                       help='processes for sharding large files (default: %(default)s)')
+    count.add_argument('--top', type=int, default=10,
+                       help='most frequent terms to list (default: %(default)s)')
+    count.set_defaults(handler=count_command)
+
+    preprocess = commands.add_parser('preprocess', help='write preprocessed text')
+    preprocess.add_argument('files', nargs='+', metavar='FILE')
+    preprocess.add_argument('--output-dir', default='.',
+                            help='directory for NAME_preprocessed.txt/.tok (default: .)')
+    preprocess.add_argument('--workers', type=int, default=cpus,
+                            help='processes for sharding large files (default: %(default)s)')
+    preprocess.add_argument('--no-token-file', action='store_true',
+                            help='only write the text output')
+    preprocess.set_defaults(handler=preprocess_command)
+
+    for name, handler, help_text in [
+            ('analyze', analyze_command, "Zipf's, Benford's and Heap's law analysis"),
+            ('plot', plot_command, 'analysis with figures')]:
+        analyze = commands.add_parser(name, help=help_text)
+        analyze.add_argument('files', nargs='+', metavar='FILE')
+        analyze.add_argument('--name', action='append',
+                             help='collection name, once per file in order (default: file name)')
+        analyze.add_argument('--jobs', type=int,
+                             help='collections analyzed at once (default: one per core)')
+        if name == 'analyze':
+            modes = analyze.add_mutually_exclusive_group()
+            modes.add_argument('--streaming', action='store_true',
+                               help='estimate top terms and growth in fixed memory')
+            modes.add_argument('--external', action='store_true',
+                               help='count terms exactly, spilling counts to disk')
+            analyze.add_argument('--memory-mb', type=float,
+                                 help='with --external, term table memory limit in MB')
+            analyze.add_argument('--max-lines', type=int,
+                                 help='with --streaming or --external, only read this many lines')
+        analyze.set_defaults(handler=handler, streaming=False, external=False,
+                             memory_mb=None, max_lines=None)
+
+    aggregate = commands.add_parser('aggregate',
+                                    help='term counts of collections larger than memory')
+    aggregate.add_argument('files', nargs='+', metavar='FILE')
+    aggregate.add_argument('--output-dir', default='.',
+                           help='directory for NAME_counts.tsv (default: .)')
+    aggregate.add_argument('--memory-mb', type=float, help='term table memory limit in MB')
+    aggregate.add_argument('--top', type=int, default=10,
+                           help='most frequent terms to list (default: %(default)s)')
+    aggregate.set_defaults(handler=aggregate_command)
+
+    ngrams = commands.add_parser('ngrams', help='n-gram counts and collocations')
+    ngrams.add_argument('files', nargs='+', metavar='FILE',
+                        help='collections or token files (.tok)')
+    ngrams.add_argument('-n', type=int, choices=(2, 3, 4), default=2,
+                        help='n-gram length (default: 2)')
+    ngrams.add_argument('--min-count', type=int, default=5,
+                        help='drop rarer n-grams (default: %(default)s)')
+    ngrams.add_argument('--measure', choices=('llr', 'pmi'),
+                        help='collocation score (default: llr for bigrams, else pmi)')
+    ngrams.add_argument('--top', type=int, default=10,
+                        help='n-grams to list (default: %(default)s)')
+    ngrams.add_argument('--memory-mb', type=float,
+                        help='memory limit in MB for the n-gram table and the batch being added')
+    ngrams.add_argument('--max-lines', type=int, help='only read this many lines')
+    ngrams.set_defaults(handler=ngrams_command)
+
+    index = commands.add_parser('index', help='build a positional inverted index')
+    index.add_argument('file', metavar='FILE')
+    index.add_argument('--prefix', help='index file prefix (default: FILE without extension)')
+    index.add_argument('--memory-mb', type=float, help='SPIMI block memory limit in MB')
+    index.set_defaults(handler=index_command)
+
+    query = commands.add_parser('query', help='Boolean, phrase and proximity search')
+    query.add_argument('prefix', metavar='PREFIX')
+    query.add_argument('queries', nargs='*', metavar='QUERY')
+    query.set_defaults(handler=query_command)
+
+    rank = commands.add_parser('rank', help='ranked retrieval')
+    rank.add_argument('prefix', metavar='PREFIX')
+    rank.add_argument('queries', nargs='*', metavar='QUERY')
+    rank.add_argument('--scorer', choices=('tfidf', 'bm25'), default='bm25')
+    rank.add_argument('-k', type=int, default=10, help='results per query (default: 10)')
+    rank.set_defaults(handler=rank_command)
+
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command in ('analyze', 'plot'):
+        if args.name and len(args.name) > len(args.files):
+            parser.error("more --name options than files")
+        if args.max_lines is not None and not (args.streaming or args.external):
+            parser.error("--max-lines requires --streaming or --external")
+        if args.memory_mb is not None and not args.external:
+            parser.error("--memory-mb requires --external")
+    if args.command == 'ngrams' and args.measure == 'llr' and args.n != 2:
+        parser.error("llr scores are only defined for bigrams")
+    return args.handler(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""
+Lab 1: Corpus Input
+Opens plain or compressed (gzip, bz2, xz) collection files as text streams,
+decompressing on the fly so no temporary copy is written to disk.
+"""
+
+import io
+import os
+import bz2
+import gzip
+import lzma
+
+# Leading bytes of each supported compression format
+COMPRESSION_FORMATS = [
+    ('gzip', b'\x1f\x8b', gzip.open),
+    ('bz2', b'BZh', bz2.open),
+    ('xz', b'\xfd7zXZ\x00', lzma.open)
+]
+
+COMPRESSED_EXTENSIONS = ['.gz', '.bz2', '.xz']
+
+# Decompress in large blocks rather than the default 8 KiB
+READ_BUFFER_SIZE = 1 << 20
+
+def detect_compression(filename):
+    """Return 'gzip', 'bz2' or 'xz' from the file's magic bytes, or None."""
+    with open(filename, 'rb') as f:
+        header = f.read(6)
+    for name, magic, _ in COMPRESSION_FORMATS:
+        if header.startswith(magic):
+            return name
+    return None
+
+def open_binary(filename):
+    """Open a collection for buffered binary reading, decompressing if needed."""
+    compression = detect_compression(filename)
+    for name, _, opener in COMPRESSION_FORMATS:
+        if name == compression:
+            return io.BufferedReader(opener(filename, 'rb'), READ_BUFFER_SIZE)
+    return open(filename, 'rb', buffering=READ_BUFFER_SIZE)
+
+def open_text(filename, encoding='utf-8'):
+    """Open a plain or compressed collection as a text stream."""
+    return io.TextIOWrapper(open_binary(filename), encoding=encoding)
+
+def read_collection(filename, consume):
+    """Stream a collection file into consume(f), falling back to Latin-1.
+
+    consume is restarted from the beginning if the file turns out not to be
+    valid UTF-8, so it must not keep state between calls.
+    """
+    try:
+        with open_text(filename, 'utf-8') as f:
+            return consume(f)
+    except UnicodeDecodeError:
+        with open_text(filename, 'latin1') as f:
+            return consume(f)
+
+def find_collection(filename):
+    """Return filename, or a compressed sibling such as filename.gz, if it exists."""
+    for candidate in [filename] + [filename + ext for ext in COMPRESSED_EXTENSIONS]:
+        if os.path.exists(candidate):
+            return candidate
+    return None
@@ -0,0 +1,356 @@
+"""
+Lab 1: Out-of-Core Term Counts
+Counts term frequencies of collections whose vocabulary does not fit in
+memory. Counts accumulate in a bounded in-memory table; when its estimated
+size reaches memory_limit, the table is written to disk as a run sorted by
+term and cleared. The runs are then k-way merged (in several passes if
+there are more than fit in memory at once) into one counts file, the same way
+lab1_index merges SPIMI blocks.
+
+Counts file format: one line per term, 'term<TAB>count', sorted by term in
+code point order, UTF-8. Tokens never contain whitespace, so no escaping
+is needed.
+
+The Zipf and Benford analyses read a counts file as a stream. Both only
+depend on the frequency of each frequency (how many terms occur f times),
+which has a few thousand entries even for millions of terms: ranks are
+assigned to each frequency in decreasing order, and Zipf's least-squares
+fit is accumulated over them in chunks without listing every term.
+"""
+
+import os
+import sys
+import math
+import heapq
+import shutil
+import tempfile
+from collections import Counter
+
+DEFAULT_MEMORY_LIMIT = 64 << 20
+
+# Estimated bytes per table entry besides its str: the count's int object,
+# and the list slot used when the table is sorted for a spill
+ENTRY_OVERHEAD = 28 + 8
+
+# Runs merged at once; more are merged in several passes
+MAX_FAN_IN = 64
+# Smallest read buffer per run during a merge, and smallest write buffer
+MIN_MERGE_BUFFER = 16 << 10
+
+# Ranks per step of the streaming Zipf fit
+RANK_CHUNK = 1 << 20
+
+def write_counts(f, items):
+    """Write (term, count) pairs, already sorted by term, to an open counts file."""
+    f.writelines(f'{term}\t{count}\n' for term, count in items)
+
+def read_counts(filename, buffer_size=1 << 20):
+    """Yield (term, count) pairs from a counts file, in term order."""
+    with open(filename, 'r', encoding='utf-8', buffering=buffer_size) as f:
+        for line in f:
+            term, count = line.split('\t')
+            yield term, int(count)
+
+def merge_counts(streams):
+    """Merge term-sorted (term, count) streams, adding the counts of equal terms."""
+    current = None
+    total = 0
+    for term, count in heapq.merge(*streams):
+        if term != current:
+            if current is not None:
+                yield current, total
+            current = term
+            total = 0
+        total += count
+    if current is not None:
+        yield current, total
+
+class ExternalCounter:
+    """Term frequencies counted within a memory limit, spilling sorted runs to disk.
+
+    The table's size is estimated from the dict itself, the str of every
+    term and ENTRY_OVERHEAD per entry, and kept under memory_limit less the
+    buffer a spill writes through. Batches passed to update() are counted
+    on top of it, so they should be small next to memory_limit.
+    """
+
+    def __init__(self, memory_limit=DEFAULT_MEMORY_LIMIT, directory=None):
+        self.memory_limit = memory_limit
+        self.write_buffer = max(MIN_MERGE_BUFFER, min(memory_limit // 16, 1 << 20))
+        self.table_limit = memory_limit - self.write_buffer
+        self.run_dir = tempfile.mkdtemp(prefix='counts-', dir=directory)
+        self.runs = []
+        self.counts = {}
+        self.term_bytes = 0
+        self.tokens = 0
+        self.terms = None
+        self.peak_table_bytes = 0
+        self.merge_passes = 0
+
+    @property
+    def table_bytes(self):
+        """Estimated memory used by the in-memory table."""
+        return (sys.getsizeof(self.counts) + self.term_bytes
+                + ENTRY_OVERHEAD * len(self.counts))
+
+    def update(self, tokens):
+        """Count a batch of tokens, spilling the table first if they would not fit."""
+        batch = Counter(tokens)
+        if not batch:
+            return
+        self.tokens += len(tokens)
+
+        new_terms = batch.keys() - self.counts.keys()
+        new_bytes = sum(map(sys.getsizeof, new_terms))
+        # The table grows by about the batch's own dict share for each new term
+        growth = (new_bytes + ENTRY_OVERHEAD * len(new_terms)
+                  + sys.getsizeof(batch) * len(new_terms) // len(batch))
+        if self.counts and self.table_bytes + growth >= self.table_limit:
+            self._spill()
+            new_terms = batch.keys()
+            new_bytes = sum(map(sys.getsizeof, new_terms))
+
+        counts = self.counts
+        self.term_bytes += new_bytes
+        for term, count in batch.items():
+            counts[term] = counts.get(term, 0) + count
+        table_bytes = self.table_bytes
+        self.peak_table_bytes = max(self.peak_table_bytes, table_bytes)
+        if table_bytes >= self.table_limit:
+            # The dict resized by more than estimated
+            self._spill()
+
+    def _spill(self):
+        """Write the table to disk as a run sorted by term and clear it."""
+        if not self.counts:
+            return
+        counts = self.counts
+        filename = os.path.join(self.run_dir, f'run{len(self.runs):05d}')
+        with open(filename, 'w', encoding='utf-8', buffering=self.write_buffer) as f:
+            write_counts(f, ((term, counts[term]) for term in sorted(counts)))
+        self.runs.append(filename)
+        self.counts = {}
+        self.term_bytes = 0
+
+    @property
+    def fan_in(self):
+        """Runs merged at once, so that their read buffers fit in half the limit."""
+        return max(2, min(MAX_FAN_IN, self.memory_limit // (2 * MIN_MERGE_BUFFER) - 1))
+
+    def _buffer_size(self, runs):
+        # Split the memory budget between the input buffers and the output
+        buffer_size = self.memory_limit // (2 * (runs + 1))
+        return max(MIN_MERGE_BUFFER, min(buffer_size, 1 << 20))
+
+    def _merge(self, runs, filename):
+        """Merge runs into one counts file; returns the number of terms written."""
+        buffer_size = self._buffer_size(len(runs))
+        terms = 0
+        with open(filename, 'w', encoding='utf-8', buffering=buffer_size) as f:
+            write = f.write
+            for term, count in merge_counts([read_counts(run, buffer_size) for run in runs]):
+                write(f'{term}\t{count}\n')
+                terms += 1
+        return terms
+
+    def finish(self, filename):
+        """Write the final counts file and remove the runs; returns the number of terms."""
+        try:
+            if not self.runs:
+                # Everything fit in memory
+                counts = self.counts
+                with open(filename, 'w', encoding='utf-8', buffering=self.write_buffer) as f:
+                    write_counts(f, ((term, counts[term]) for term in sorted(counts)))
+                self.counts = {}
+                self.terms = len(counts)
+                return self.terms
+
+            self._spill()
+            runs = self.runs
+            fan_in = self.fan_in
+            while len(runs) > fan_in:
+                # Merge groups of runs into longer runs until one pass is enough
+                merged = []
+                for start in range(0, len(runs), fan_in):
+                    group = runs[start:start + fan_in]
+                    output = os.path.join(self.run_dir, f'pass{self.merge_passes}-{len(merged):05d}')
+                    self._merge(group, output)
+                    for run in group:
+                        os.remove(run)
+                    merged.append(output)
+                runs = merged
+                self.merge_passes += 1
+            self.merge_passes += 1
+            self.terms = self._merge(runs, filename)
+            return self.terms
+        finally:
+            self.close()
+
+    def close(self):
+        """Remove the temporary runs."""
+        shutil.rmtree(self.run_dir, ignore_errors=True)
+
+class _Reversed:
+    """Orders terms backwards, so ties in a min-heap of counts keep the earliest term."""
+
+    __slots__ = ('term',)
+
+    def __init__(self, term):
+        self.term = term
+
+    def __lt__(self, other):
+        return self.term > other.term
+
+    def __gt__(self, other):
+        return self.term < other.term
+
+    def __eq__(self, other):
+        return self.term == other.term
+
+def frequency_statistics(counts, top=10):
+    """One pass over (term, count) pairs: totals, top terms and frequencies of frequencies.
+
+    Returns a dict with total_tokens, terms, top_terms (the top most
+    frequent (term, count) pairs, ties by term) and frequency_counts
+    (a Counter of how many terms occur each number of times).
+    """
+    frequency_counts = Counter()
+    heap = []
+    total = 0
+    terms = 0
+    for term, count in counts:
+        frequency_counts[count] += 1
+        total += count
+        terms += 1
+        # Smallest kept entry first: lowest count, then last term in order
+        entry = (count, _Reversed(term))
+        if len(heap) < top:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+
+    top_terms = [(entry[1].term, entry[0]) for entry in sorted(heap, reverse=True)]
+    return {
+        'total_tokens': total,
+        'terms': terms,
+        'top_terms': top_terms,
+        'frequency_counts': frequency_counts
+    }
+
+def rank_frequencies(frequency_counts):
+    """Frequency at each rank as (first rank, last rank, frequency) blocks, most frequent first."""
+    rank = 1
+    for frequency in sorted(frequency_counts, reverse=True):
+        if frequency > 0:
+            last = rank + frequency_counts[frequency] - 1
+            yield rank, last, frequency
+            rank = last + 1
+
+def zipf_from_frequencies(frequency_counts):
+    """Fit Zipf's law to the rank-frequency curve given by frequencies of frequencies.
+
+    Gives the least-squares fit of TermStatistics.zipf() over every rank,
+    accumulating the sums of the regression chunk by chunk. Returns a dict
+    with alpha, k and the number of ranks, or None if there are none.
+    """
+    import numpy as np
+
+    n = 0
+    sum_x = sum_y = sum_xx = sum_xy = 0.0
+    for first, last, frequency in rank_frequencies(frequency_counts):
+        log_frequency = math.log10(frequency)
+        for start in range(first, last + 1, RANK_CHUNK):
+            log_ranks = np.log10(np.arange(start, min(start + RANK_CHUNK, last + 1),
+                                           dtype=np.float64))
+            n += len(log_ranks)
+            chunk_x = float(log_ranks.sum())
+            sum_x += chunk_x
+            sum_xx += float(np.dot(log_ranks, log_ranks))
+            sum_y += log_frequency * len(log_ranks)
+            sum_xy += log_frequency * chunk_x
+
+    if n == 0:
+        return None
+    variance = n * sum_xx - sum_x * sum_x
+    if n < 2 or variance <= 0:
+        return {'ranks': n, 'alpha': 0.0, 'k': 10 ** (sum_y / n)}
+    slope = (n * sum_xy - sum_x * sum_y) / variance
+    intercept = (sum_y - slope * sum_x) / n
+    return {'ranks': n, 'alpha': -slope, 'k': 10 ** intercept}
+
+def benford_from_frequencies(frequency_counts):
+    """Benford's law digit counts from frequencies of frequencies.
+
+    Returns the same dict as lab1_preprocessing.analyze_benford_law.
+    """
+    from lab1_termstats import benford_expected
+
+    all_digits = Counter()
+    filtered_digits = Counter()
+    for frequency, terms in frequency_counts.items():
+        if frequency <= 0:
+            continue
+        digit = int(str(frequency)[0])
+        all_digits[digit] += terms
+        if frequency >= 10:
+            filtered_digits[digit] += terms
+
+    return {
+        'all_digits': Counter(dict(sorted(all_digits.items()))),
+        'filtered_digits': Counter(dict(sorted(filtered_digits.items()))),
+        'benford_expected': benford_expected()
+    }
+
+def analyze_counts_file(filename, top=10):
+    """Stream a counts file once and analyze Zipf's and Benford's laws.
+
+    Returns frequency_statistics' dict plus 'zipf' and 'benford' results.
+    """
+    results = frequency_statistics(read_counts(filename), top)
+    results['zipf'] = zipf_from_frequencies(results['frequency_counts'])
+    results['benford'] = benford_from_frequencies(results['frequency_counts'])
+    return results
+
+def count_collection(filename, counts_filename, preprocessor=None,
+                     memory_limit=DEFAULT_MEMORY_LIMIT, batch_size=16384):
+    """Count a collection's preprocessed terms out of core into a counts file.
+
+    Returns the ExternalCounter, finished. Tokens are counted in batches of
+    batch_size so that the input stays small next to memory_limit.
+    """
+    from lab1_corpus import read_collection
+    from lab1_tokenizer import read_collection_bytes
+
+    if preprocessor is None:
+        from lab1_preprocessing import TextPreprocessor
+        preprocessor = TextPreprocessor()
+    directory = os.path.dirname(os.path.abspath(counts_filename))
+
+    def count(tokens):
+        counter = ExternalCounter(memory_limit, directory)
+        try:
+            batch = []
+            for token in tokens:
+                batch.append(token)
+                if len(batch) == batch_size:
+                    counter.update(batch)
+                    batch = []
+            counter.update(batch)
+        except BaseException:
+            counter.close()
+            raise
+        return counter
+
+    def count_chunks(chunks, tokenizer):
+        preprocess_tokens = preprocessor.preprocess_tokens
+        return count(token for chunk in chunks
+                     for token in preprocess_tokens(tokenizer.tokenize(chunk)))
+
+    if preprocessor.tokenizes_bytes:
+        # Small chunks keep the tokens of one chunk well under the limit
+        chunk_size = max(MIN_MERGE_BUFFER, min(memory_limit // 16, 1 << 20))
+        counter = read_collection_bytes(filename, count_chunks, chunk_size)
+    else:
+        counter = read_collection(filename, lambda f: count(preprocessor.iter_tokens(f)))
+    counter.finish(counts_filename)
+    return counter
@@ -0,0 +1,120 @@
+"""
+Lab 1: Vocabulary Growth
+Tracks vocabulary size V against the number of tokens read N in a single
+pass over a token stream, sampling at linear, log-spaced or explicit
+checkpoints, and fits Heap's law V = k * N^b to the samples.
+"""
+
+from bisect import bisect_left
+from itertools import count, islice
+
+def linear_checkpoints(interval=1000):
+    """Checkpoints every interval tokens: interval, 2 * interval, ..."""
+    return count(interval, interval)
+
+def log_checkpoints(points_per_decade=10):
+    """Log-spaced checkpoints 1, ..., 10, ..., 100, ... (points_per_decade per decade)."""
+    last = 0
+    for i in count():
+        point = round(10 ** (i / points_per_decade))
+        if point > last:
+            last = point
+            yield point
+
+def explicit_checkpoints(points):
+    """Checkpoints at the given token counts, in increasing order."""
+    return iter(sorted({point for point in points if point > 0}))
+
+def checkpoints_upto(checkpoints, total):
+    """List the checkpoints of a schedule that do not exceed total."""
+    points = []
+    for point in checkpoints:
+        if point > total:
+            break
+        points.append(point)
+    return points
+
+class VocabularyGrowthTracker:
+    """Records (N, V) at checkpoints while consuming a token stream once.
+
+    Tokens are added to the vocabulary in slices between checkpoints, so the
+    work per token is a single set (or Counter) insertion done in C, plus
+    O(1) per checkpoint. Any container with update() and len() can serve as
+    the vocabulary; passing a Counter tracks term frequencies at the same
+    time.
+    """
+
+    def __init__(self, checkpoints=None, vocabulary=None):
+        if checkpoints is None:
+            checkpoints = linear_checkpoints()
+        self._checkpoints = iter(checkpoints)
+        self._next = next(self._checkpoints, None)
+        self.vocabulary = set() if vocabulary is None else vocabulary
+        self.total_tokens = 0
+        self.samples = []
+
+    @property
+    def vocabulary_size(self):
+        """Number of distinct terms seen so far."""
+        return len(self.vocabulary)
+
+    def update(self, tokens):
+        """Add a list of tokens, sampling V at every checkpoint passed."""
+        add = self.vocabulary.update
+        n = self.total_tokens
+        start = 0
+
+        while self._next is not None and self._next - n <= len(tokens) - start:
+            end = start + self._next - n
+            add(tokens[start:end])
+            n = self._next
+            self.samples.append((n, len(self.vocabulary)))
+            start = end
+            self._advance(n)
+
+        add(tokens if start == 0 else tokens[start:])
+        self.total_tokens = n + len(tokens) - start
+
+    def consume(self, tokens, batch_size=65536):
+        """Add tokens from any iterable, in batches."""
+        tokens = iter(tokens)
+        while True:
+            batch = list(islice(tokens, batch_size))
+            if not batch:
+                return self
+            self.update(batch)
+
+    def _advance(self, n):
+        """Move to the first checkpoint after n."""
+        self._next = next(self._checkpoints, None)
+        while self._next is not None and self._next <= n:
+            self._next = next(self._checkpoints, None)
+
+    def growth_data(self, include_final=True):
+        """Sampled (N, V) points, optionally ending with the current totals."""
+        data = list(self.samples)
+        if include_final and self.total_tokens and (
+                not data or data[-1][0] != self.total_tokens):
+            data.append((self.total_tokens, len(self.vocabulary)))
+        return data
+
+def growth_from_positions(new_term_positions, total_tokens, points, include_final=True):
+    """Growth data from the sorted positions at which new terms first appear.
+
+    Gives the same (N, V) samples a tracker would record at points, for
+    streams that were processed in pieces (see lab1_parallel).
+    """
+    points = [point for point in points if 0 < point <= total_tokens]
+    if include_final and total_tokens and (not points or points[-1] != total_tokens):
+        points.append(total_tokens)
+    return [(n, bisect_left(new_term_positions, n)) for n in points]
+
+def fit_heaps_law(growth_data):
+    """Least-squares fit of log V = log k + b log N; returns (k, b).
+
+    A wrapper over lab1_termstats.fit_power_law, imported here on first use
+    so that tracking growth does not load numpy.
+    """
+    from lab1_termstats import fit_power_law
+
+    return fit_power_law([n for n, _ in growth_data], [v for _, v in growth_data])
@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+"""
+Lab 1: Positional Inverted Index
+Builds a positional inverted index over a collection, treating each line
+as a document (Quran verses, Wikipedia abstracts). Uses single-pass
+in-memory indexing (SPIMI): postings are collected in memory-bounded
+blocks that are written to disk when full, then k-way merged into the
+final index (in several passes if there are too many blocks to give each
+a read buffer within the memory limit).
+
+Index files, for an index prefix P:
+    P.lexicon   - one line per term: term, df, postings byte offset and
+                  length (ints), skips byte offset and count (pairs),
+                  highest tf and shortest document length (for score bounds)
+    P.postings  - per term: doc id, tf, tf positions, ... as uint32
+    P.skips     - per term: (doc id, int offset into its postings) for
+                  every SKIP_INTERVAL-th document, as uint32 pairs
+    P.doclens   - preprocessed length of each document, as uint32
+    P.meta      - JSON build statistics
+
+Doc ids are 1-based line numbers; positions are 0-based offsets into a
+document's preprocessed tokens.
+
+Usage:
+    python lab1_index.py collection [index_prefix] [memory_limit_mb]
+"""
+
+import os
+import sys
+import json
+import mmap
+import time
+import heapq
+import shutil
+import struct
+import tempfile
+from array import array
+from collections import defaultdict
+from contextlib import contextmanager
+
+from lab1_corpus import read_collection
+from lab1_preprocessing import TextPreprocessor
+from lab1_profiling import peak_rss_bytes
+
+DEFAULT_MEMORY_LIMIT = 64 << 20
+
+# Estimated bytes for a new term in a block: dict entry, str and array objects
+TERM_OVERHEAD = 240
+# Bytes per stored integer (doc id, tf or position) in an array('I')
+INT_SIZE = array('I').itemsize
+
+# Smallest read buffer per block during the merge
+MIN_MERGE_BUFFER = 64 << 10
+
+# Documents between skip pointers
+SKIP_INTERVAL = 32
+
+# Block record header: term length in bytes, number of ints
+RECORD_HEADER = struct.Struct('<II')
+
+def write_record(f, term, postings):
+    """Write one term's postings (an array('I') or its bytes) to a block file."""
+    encoded = term.encode('utf-8')
+    data = memoryview(postings).cast('B')
+    f.write(RECORD_HEADER.pack(len(encoded), len(data) // INT_SIZE))
+    f.write(encoded)
+    f.write(data)
+
+def read_records(filename, buffer_size=1 << 20):
+    """Yield (term, postings bytes) from a block file in term order."""
+    with open(filename, 'rb', buffering=buffer_size) as f:
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if not header:
+                return
+            term_length, count = RECORD_HEADER.unpack(header)
+            term = f.read(term_length).decode('utf-8')
+            yield term, f.read(count * INT_SIZE)
+
+@contextmanager
+def mapped_lengths(f):
+    """Memory-map an open .doclens file as a sequence of uint32 lengths."""
+    try:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:  # Empty files cannot be mapped
+        yield array('I')
+        return
+    lengths = memoryview(data).cast('I')
+    try:
+        yield lengths
+    finally:
+        lengths.release()
+        data.close()
+
+class SPIMIIndexer:
+    """Builds a positional inverted index in memory-bounded blocks.
+
+    A block is flushed to disk, sorted by term, whenever its estimated size
+    reaches memory_limit; flushes happen between documents, so a document's
+    postings never span two blocks and merged postings stay in doc order.
+    Document lengths count towards the block too and are written out with
+    it; the merge reads them back memory-mapped.
+    """
+
+    def __init__(self, preprocessor=None, memory_limit=DEFAULT_MEMORY_LIMIT):
+        self.preprocessor = preprocessor or TextPreprocessor()
+        self.memory_limit = memory_limit
+
+    def build(self, filename, index_prefix):
+        """Index a collection file and return build statistics."""
+        start = time.perf_counter()
+        directory = os.path.dirname(os.path.abspath(index_prefix))
+        self.block_dir = tempfile.mkdtemp(prefix='spimi-', dir=directory)
+        self.blocks = []
+        self.merge_passes = 0
+        self.lengths_file = None
+        lengths_path = os.path.join(self.block_dir, 'doclens')
+
+        try:
+            # Restarts from scratch if the file has to be re-read as Latin-1
+            read_collection(filename, self._index_documents)
+            with open(lengths_path, 'rb') as f, mapped_lengths(f) as document_lengths:
+                terms = self._merge_blocks(index_prefix, document_lengths)
+            os.replace(lengths_path, index_prefix + '.doclens')
+        finally:
+            if self.lengths_file is not None:
+                self.lengths_file.close()
+            shutil.rmtree(self.block_dir, ignore_errors=True)
+
+        elapsed = time.perf_counter() - start
+        stats = {
+            'collection': filename,
+            'documents': self.documents,
+            'tokens': self.tokens,
+            'average_document_length': self.tokens / self.documents if self.documents else 0.0,
+            'terms': terms,
+            'blocks': len(self.blocks),
+            'merge_passes': self.merge_passes,
+            'memory_limit': self.memory_limit,
+            'peak_block_bytes': self.peak_block_bytes,
+            'peak_rss': peak_rss_bytes(),
+            'elapsed': elapsed,
+            'documents_per_sec': self.documents / elapsed if elapsed else 0.0,
+            'tokens_per_sec': self.tokens / elapsed if elapsed else 0.0
+        }
+
+        with open(index_prefix + '.meta', 'w', encoding='utf-8') as f:
+            json.dump(stats, f, indent=2)
+
+        return stats
+
+    def _reset(self):
+        """Start a new build with no blocks."""
+        for block in self.blocks:
+            os.remove(block)
+        self.blocks = []
+        self.postings = {}
+        self.block_bytes = 0
+        self.peak_block_bytes = 0
+        self.documents = 0
+        self.tokens = 0
+        # Lengths of the documents in the current block; earlier ones are
+        # written out with each block and mapped back for the merge
+        self.document_lengths = array('I')
+        if self.lengths_file is not None:
+            self.lengths_file.close()
+        self.lengths_file = open(os.path.join(self.block_dir, 'doclens'), 'wb')
+
+    def _index_documents(self, f):
+        """Index every line of an open collection as one document."""
+        self._reset()
+        tokenize = self.preprocessor.tokenize
+        preprocess_tokens = self.preprocessor.preprocess_tokens
+
+        for doc_id, line in enumerate(f, 1):
+            tokens = preprocess_tokens(tokenize(line))
+            self._add_document(doc_id, tokens)
+            if self.block_bytes >= self.memory_limit:
+                self._flush_block()
+
+        if self.postings:
+            self._flush_block()
+        self._flush_lengths()
+        self.lengths_file.close()
+
+    def _add_document(self, doc_id, tokens):
+        """Append one document's positional postings to the current block."""
+        self.documents = doc_id
+        self.tokens += len(tokens)
+        self.document_lengths.append(len(tokens))
+
+        positions = defaultdict(list)
+        for position, term in enumerate(tokens):
+            positions[term].append(position)
+
+        postings = self.postings
+        added = INT_SIZE  # The document's length
+        for term, term_positions in positions.items():
+            term_postings = postings.get(term)
+            if term_postings is None:
+                term_postings = postings[term] = array('I')
+                added += TERM_OVERHEAD + len(term)
+            term_postings.append(doc_id)
+            term_postings.append(len(term_positions))
+            term_postings.extend(term_positions)
+            added += INT_SIZE * (2 + len(term_positions))
+
+        self.block_bytes += added
+        self.peak_block_bytes = max(self.peak_block_bytes, self.block_bytes)
+
+    def _flush_block(self):
+        """Write the current block to disk sorted by term and clear it."""
+        filename = os.path.join(self.block_dir, f'block{len(self.blocks):05d}')
+        with open(filename, 'wb', buffering=1 << 20) as f:
+            for term in sorted(self.postings):
+                write_record(f, term, self.postings[term])
+
+        self.blocks.append(filename)
+        self.postings = {}
+        self.block_bytes = 0
+        self._flush_lengths()
+
+    def _flush_lengths(self):
+        """Append the current block's document lengths to the lengths file."""
+        self.document_lengths.tofile(self.lengths_file)
+        self.document_lengths = array('I')
+
+    @property
+    def fan_in(self):
+        """Blocks merged at once, so that their read buffers fit in half the limit."""
+        return max(2, self.memory_limit // (2 * MIN_MERGE_BUFFER) - 1)
+
+    def _buffer_size(self, blocks):
+        # Split the memory budget between the input buffers and the output
+        buffer_size = self.memory_limit // (2 * (blocks + 1))
+        return max(MIN_MERGE_BUFFER, min(buffer_size, 1 << 20))
+
+    def _merge_records(self, blocks, buffer_size):
+        """A term-ordered stream of the blocks' records.
+
+        heapq.merge is stable, so a term's records arrive in block (and
+        therefore document) order.
+        """
+        streams = [read_records(block, buffer_size) for block in blocks]
+        return heapq.merge(*streams, key=lambda record: record[0])
+
+    def _reduce_blocks(self):
+        """Merge groups of blocks into longer blocks until one pass is enough.
+
+        Records are copied as they are, so a term may have several records
+        in a merged block, still in document order. Returns the blocks left.
+        """
+        blocks = self.blocks
+        fan_in = self.fan_in
+        while len(blocks) > fan_in:
+            merged = []
+            for start in range(0, len(blocks), fan_in):
+                group = blocks[start:start + fan_in]
+                if len(group) == 1:
+                    merged.append(group[0])
+                    continue
+                output = os.path.join(self.block_dir,
+                                      f'pass{self.merge_passes}-{len(merged):05d}')
+                buffer_size = self._buffer_size(len(group))
+                with open(output, 'wb', buffering=buffer_size) as f:
+                    for term, payload in self._merge_records(group, buffer_size):
+                        write_record(f, term, payload)
+                for block in group:
+                    os.remove(block)
+                merged.append(output)
+            blocks = merged
+            self.merge_passes += 1
+        self.merge_passes += 1
+        return blocks
+
+    def _merge_blocks(self, index_prefix, document_lengths):
+        """K-way merge the sorted blocks into the final index; returns term count."""
+        blocks = self._reduce_blocks()
+        buffer_size = self._buffer_size(len(blocks))
+        merged = self._merge_records(blocks, buffer_size)
+
+        terms = 0
+        offset = 0
+        skip_offset = 0
+        with open(index_prefix + '.postings', 'wb', buffering=buffer_size) as postings, \
+                open(index_prefix + '.skips', 'wb', buffering=buffer_size) as skips_file, \
+                open(index_prefix + '.lexicon', 'w', encoding='utf-8') as lexicon:
+            current = None
+            df = 0
+            length = 0
+            skips = array('I')
+            max_tf = 0
+            min_length = None
+
+            def finish_term():
+                lexicon.write(f"{current}\t{df}\t{offset}\t{length}\t"
+                              f"{skip_offset}\t{len(skips) // 2}\t{max_tf}\t{min_length}\n")
+                skips.tofile(skips_file)
+
+            for term, payload in merged:
+                if term != current:
+                    if current is not None:
+                        finish_term()
+                        offset += length * INT_SIZE
+                        skip_offset += len(skips) * INT_SIZE
+                        terms += 1
+                    current = term
+                    df = 0
+                    length = 0
+                    skips = array('I')
+                    max_tf = 0
+                    min_length = None
+
+                block = array('I')
+                block.frombytes(payload)
+                i = 0
+                while i < len(block):
+                    if df % SKIP_INTERVAL == 0:
+                        skips.append(block[i])
+                        skips.append(length + i)
+                    df += 1
+                    tf = block[i + 1]
+                    doc_length = document_lengths[block[i] - 1]
+                    max_tf = max(max_tf, tf)
+                    min_length = doc_length if min_length is None else min(min_length, doc_length)
+                    i += 2 + tf
+
+                postings.write(payload)
+                length += len(block)
+
+            if current is not None:
+                finish_term()
+                terms += 1
+
+        return terms
+
+class InvertedIndex:
+    """Read access to an index written by SPIMIIndexer."""
+
+    def __init__(self, index_prefix):
+        self.index_prefix = index_prefix
+        self.lexicon = {}
+        with open(index_prefix + '.lexicon', 'r', encoding='utf-8') as f:
+            for line in f:
+                term, *fields = line.rstrip('\n').split('\t')
+                self.lexicon[term] = tuple(int(field) for field in fields)
+
+        with open(index_prefix + '.meta', 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+
+        self.document_lengths = array('I')
+        with open(index_prefix + '.doclens', 'rb') as f:
+            self.document_lengths.frombytes(f.read())
+
+        self._postings_file = open(index_prefix + '.postings', 'rb')
+        self._skips_file = open(index_prefix + '.skips', 'rb')
+
+    @property
+    def documents(self):
+        """Number of documents (lines) in the collection."""
+        return self.meta['documents']
+
+    @property
+    def average_document_length(self):
+        """Mean preprocessed document length in tokens."""
+        return self.meta['average_document_length']
+
+    def close(self):
+        self._postings_file.close()
+        self._skips_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __contains__(self, term):
+        return term in self.lexicon
+
+    def document_frequency(self, term):
+        """Number of documents containing term."""
+        entry = self.lexicon.get(term)
+        return entry[0] if entry else 0
+
+    def score_bounds(self, term):
+        """(highest tf, shortest document length) over term's postings."""
+        return self.lexicon[term][5:7]
+
+    def raw_postings(self, term):
+        """Flat [doc, tf, positions..., doc, tf, ...] array for term."""
+        postings = array('I')
+        entry = self.lexicon.get(term)
+        if entry:
+            offset, length = entry[1:3]
+            self._postings_file.seek(offset)
+            postings.frombytes(self._postings_file.read(length * INT_SIZE))
+        return postings
+
+    def skips(self, term):
+        """Flat [doc, offset, doc, offset, ...] skip pointers for term."""
+        skips = array('I')
+        entry = self.lexicon.get(term)
+        if entry:
+            offset, count = entry[3:5]
+            self._skips_file.seek(offset)
+            skips.frombytes(self._skips_file.read(2 * count * INT_SIZE))
+        return skips
+
+    def postings(self, term):
+        """List of (doc id, positions) for term, in doc id order."""
+        flat = self.raw_postings(term)
+        result = []
+        i = 0
+        while i < len(flat):
+            tf = flat[i + 1]
+            result.append((flat[i], flat[i + 2:i + 2 + tf].tolist()))
+            i += 2 + tf
+        return result
+
+def build_index(filename, index_prefix=None, memory_limit=DEFAULT_MEMORY_LIMIT):
+    """Index a collection, printing its build statistics; returns them."""
+    if index_prefix is None:
+        index_prefix = os.path.splitext(filename)[0]
+
+    print(f"Indexing {filename} into {index_prefix}.* "
+          f"(block limit {memory_limit / (1 << 20):.1f} MB)...")
+    stats = SPIMIIndexer(memory_limit=memory_limit).build(filename, index_prefix)
+
+    print(f"Documents: {stats['documents']:,}")
+    print(f"Tokens: {stats['tokens']:,}")
+    print(f"Terms: {stats['terms']:,}")
+    print(f"Blocks merged: {stats['blocks']} in {stats['merge_passes']} pass(es)")
+    print(f"Time: {stats['elapsed']:.2f}s "
+          f"({stats['documents_per_sec']:,.0f} docs/s, {stats['tokens_per_sec']:,.0f} tokens/s)")
+    print(f"Peak block size: {stats['peak_block_bytes'] / (1 << 20):.1f} MB (estimated)")
+    if stats['peak_rss']:
+        print(f"Peak RSS: {stats['peak_rss'] / (1 << 20):.1f} MB")
+    return stats
+
+def main():
+    """Build an index for the collection given on the command line."""
+    if len(sys.argv) < 2:
+        print(__doc__.strip())
+        return 2
+
+    index_prefix = sys.argv[2] if len(sys.argv) > 2 else None
+    memory_limit = int(float(sys.argv[3]) * (1 << 20)) if len(sys.argv) > 3 else DEFAULT_MEMORY_LIMIT
+    build_index(sys.argv[1], index_prefix, memory_limit)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
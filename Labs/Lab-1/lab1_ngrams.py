@@ -0,0 +1,409 @@
+"""
+Lab 1: N-gram and Collocation Statistics
+Counts bigrams, trigrams (or any n up to 4) of preprocessed terms in one
+streaming pass and scores bigram collocations by pointwise mutual
+information and Dunning's log-likelihood ratio. Each line of a collection
+is one document; n-grams do not cross documents.
+
+Terms are interned as ids (see lab1_tokens) and an n-gram is packed into a
+single uint64 key, 64 // n bits per id, so the counts are two numpy arrays
+(sorted keys and their counts, 16 bytes per distinct n-gram) rather than a
+Counter of string tuples (around 200 bytes each). Each batch of documents
+is reduced to sorted unique keys with vectorized operations, and batches
+are merged into the table with searchsorted. The id width limits the
+vocabulary to 2**32 terms for bigrams, 2**21 for trigrams and 65,536 for
+4-grams; counting more distinct terms raises ValueError.
+
+A quarter of memory_limit, at most 16 MB, goes to the batch being added
+(its input text, tokens, ids and keys): batches are sized to fit it. The
+table gets the rest, including the copies made while merging (40 bytes per
+entry, see TABLE_ENTRY_BYTES), so the default 256 MB holds 6.3 million
+distinct n-grams exactly. For comparison, the 1.5 million distinct bigrams
+of a 29 MB corpus take 206 MB as a Counter of tuples and 25 MB as arrays.
+If the distinct n-grams do not fit, the least frequent ones are pruned
+from the table as in lossy counting: every count is then at most max_error
+below the true count. Pruning by min_count, which is exact, happens once
+at the end. The term dictionaries and per-position term counts (8 bytes
+per term and position) grow with the vocabulary and are kept besides.
+"""
+
+import math
+from array import array
+from itertools import chain
+
+import numpy as np
+
+from lab1_corpus import read_collection
+from lab1_tokenfile import TokenFileReader
+from lab1_tokenizer import CHUNK_SIZE, read_collection_bytes
+from lab1_tokens import TermDictionary
+
+DEFAULT_MEMORY_LIMIT = 256 << 20
+# Table keys and counts (16 bytes) plus the merged copy and headroom for pending batches
+TABLE_ENTRY_BYTES = 40
+# Pending batch entries kept before they are merged, as a fraction of the table capacity
+PENDING_FRACTION = 8
+# After pruning, the table is filled to this fraction of its capacity
+PRUNE_TARGET = 0.75
+# Share of memory_limit for the batch being added; the table gets the rest
+BATCH_FRACTION = 4
+# Peak working memory of a batch (token lists, ids, keys and their copies)
+# per byte of input text, and per token of a token file
+BATCH_BYTES_PER_INPUT_BYTE = 16
+BATCH_BYTES_PER_TOKEN = 64
+
+MEASURES = ('llr', 'pmi')
+
+def unique_counts(keys, counts=None):
+    """Sorted unique keys with their total counts (each key counting 1 if counts is None)."""
+    if counts is None:
+        keys = np.sort(keys)
+    else:
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        counts = counts[order]
+    if not len(keys):
+        return keys, np.zeros(0, dtype=np.int64)
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    if counts is None:
+        totals = np.diff(np.append(starts, len(keys)))
+    else:
+        totals = np.add.reduceat(counts, starts)
+    return keys[starts], totals.astype(np.int64)
+
+def batch_bytes(memory_limit):
+    """Working memory for the batch being added, at most one chunk of the byte reader."""
+    return min(memory_limit // BATCH_FRACTION, CHUNK_SIZE * BATCH_BYTES_PER_INPUT_BYTE)
+
+def _xlogx(values):
+    values = np.asarray(values, dtype=np.float64)
+    return np.where(values > 0, values * np.log(np.where(values > 0, values, 1)), 0.0)
+
+class NgramCounter:
+    """Streaming n-gram counts over term ids, within a memory limit."""
+
+    def __init__(self, n=2, memory_limit=DEFAULT_MEMORY_LIMIT, dictionary=None):
+        if not 2 <= n <= 4:
+            raise ValueError("n must be between 2 and 4")
+        self.n = n
+        self.bits = 64 // n
+        self.dictionary = dictionary or TermDictionary()
+        self.memory_limit = memory_limit
+        self.batch_bytes = batch_bytes(memory_limit)
+        self.batch_tokens = max(self.batch_bytes // BATCH_BYTES_PER_TOKEN, 1)
+        self.capacity = max((memory_limit - self.batch_bytes) // TABLE_ENTRY_BYTES, 16)
+
+        self.keys = np.zeros(0, dtype=np.uint64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self._pending = []
+        self._pending_entries = 0
+        # Count of each term at each position of an n-gram, for the scores
+        self.position_counts = [np.zeros(0, dtype=np.int64) for _ in range(n)]
+        self.total = 0
+        self.documents = 0
+        self.tokens = 0
+        self.max_error = 0
+        self.peak_entries = 0
+
+    def add_documents(self, documents):
+        """Add a batch of documents, each a list of terms."""
+        lengths = np.fromiter(map(len, documents), dtype=np.int64, count=len(documents))
+        ids = self.dictionary.encode(list(chain.from_iterable(documents)))
+        self.add_ids(np.frombuffer(ids, dtype=np.uint32) if len(ids) else
+                     np.zeros(0, dtype=np.uint32), lengths)
+
+    def add_ids(self, ids, lengths):
+        """Add documents given as one id array and the length of each document."""
+        n = self.n
+        if len(self.dictionary) > 1 << self.bits:
+            raise ValueError(f"{len(self.dictionary):,} distinct terms exceed the "
+                             f"{1 << self.bits:,} ids that fit {self.bits}-bit fields of "
+                             f"packed {n}-gram keys; count fewer lines or a smaller n")
+        self.documents += len(lengths)
+        self.tokens += len(ids)
+        if len(ids) < n:
+            return
+
+        # An n-gram starting at i is valid if it ends inside the same document
+        ends = np.repeat(np.cumsum(lengths), lengths)
+        starts = len(ids) - n + 1
+        valid = np.arange(starts) + n <= ends[:starts]
+
+        ids = ids.astype(np.uint64)
+        keys = np.zeros(starts, dtype=np.uint64)
+        for position in range(n):
+            keys <<= np.uint64(self.bits)
+            keys |= ids[position:position + starts]
+        keys = keys[valid]
+        self.total += len(keys)
+
+        # Only the batch's own terms are counted; the totals grow with the vocabulary
+        vocabulary = len(self.dictionary)
+        for position in range(n):
+            terms, counts = np.unique(ids[position:position + starts][valid].astype(np.intp),
+                                      return_counts=True)
+            totals = self.position_counts[position]
+            if len(totals) < vocabulary:
+                grown = np.zeros(max(vocabulary, 2 * len(totals)), dtype=np.int64)
+                grown[:len(totals)] = totals
+                totals = self.position_counts[position] = grown
+            totals[terms] += counts
+
+        keys, counts = unique_counts(keys)
+        self._pending.append((keys, counts))
+        self._pending_entries += len(keys)
+        if self._pending_entries > self.capacity // PENDING_FRACTION:
+            self._merge_pending()
+
+    def _merge_pending(self):
+        """Merge the pending batches into the table, pruning it if it is full."""
+        if not self._pending:
+            return
+        if len(self._pending) == 1:
+            keys, counts = self._pending[0]
+        else:
+            keys, counts = unique_counts(np.concatenate([k for k, _ in self._pending]),
+                                         np.concatenate([c for _, c in self._pending]))
+        self._pending = []
+        self._pending_entries = 0
+
+        positions = np.searchsorted(self.keys, keys)
+        found = positions < len(self.keys)
+        found[found] = self.keys[positions[found]] == keys[found]
+        # Keys are unique, so each table entry is updated at most once
+        self.counts[positions[found]] += counts[found]
+
+        new = ~found
+        self.keys = np.insert(self.keys, positions[new], keys[new])
+        self.counts = np.insert(self.counts, positions[new], counts[new])
+        self.peak_entries = max(self.peak_entries, len(self.keys))
+
+        if len(self.keys) > self.capacity:
+            self._prune(int(self.capacity * PRUNE_TARGET))
+
+    def _prune(self, keep):
+        """Drop the least frequent entries so that at most keep remain."""
+        threshold = int(np.partition(self.counts, len(self.counts) - keep - 1)
+                        [len(self.counts) - keep - 1])
+        kept = self.counts > threshold
+        self.keys = self.keys[kept]
+        self.counts = self.counts[kept]
+        # A pruned n-gram may come back, having lost at most threshold occurrences
+        self.max_error += threshold
+
+    def add_token_file(self, filename):
+        """Add every document of a binary token file (see lab1_tokenfile)."""
+        with TokenFileReader(filename) as reader:
+            # The file's ids, as ids of this counter's dictionary
+            mapping = np.frombuffer(self.dictionary.encode(reader.vocabulary), dtype=np.uint32)
+            if np.array_equal(mapping, np.arange(len(mapping))):
+                mapping = None
+            offsets = np.frombuffer(reader.offsets, dtype=np.uint64).astype(np.int64)
+            ids = np.frombuffer(reader.ids, dtype=np.uint32)
+
+            # Whole documents in batches of about batch_tokens tokens
+            batch_start = 0
+            while batch_start < reader.documents:
+                batch_end = int(np.searchsorted(offsets, offsets[batch_start] + self.batch_tokens,
+                                                side='right')) - 1
+                batch_end = min(max(batch_end, batch_start + 1), reader.documents)
+                batch = ids[offsets[batch_start]:offsets[batch_end]]
+                self.add_ids(batch if mapping is None else mapping[batch],
+                             np.diff(offsets[batch_start:batch_end + 1]))
+                batch_start = batch_end
+            # The mapping cannot be closed while arrays still point into it
+            del ids, batch
+
+    def statistics(self, min_count=1):
+        """The counts as an NgramStatistics table, without n-grams seen fewer than min_count times."""
+        self._merge_pending()
+        kept = self.counts >= min_count
+        return NgramStatistics(self.n, self.dictionary.terms, self.keys[kept],
+                               self.counts[kept], self.total, self.position_counts,
+                               self.max_error)
+
+class NgramStatistics:
+    """Counts of distinct n-grams as packed keys, with association scores.
+
+    position_counts[i][t] is how often term id t is the (i+1)-th term of an
+    n-gram, and total the number of n-grams counted; both include pruned
+    n-grams.
+    """
+
+    def __init__(self, n, terms, keys, counts, total, position_counts, max_error=0):
+        self.n = n
+        self.bits = 64 // n
+        self.terms = terms
+        self.keys = keys
+        self.counts = counts
+        self.total = total
+        self.position_counts = position_counts
+        self.max_error = max_error
+
+    def __len__(self):
+        return len(self.keys)
+
+    def ids(self, position, keys=None):
+        """Term ids at a position (0-based) of each n-gram's key."""
+        keys = self.keys if keys is None else keys
+        shift = np.uint64(self.bits * (self.n - 1 - position))
+        return ((keys >> shift) & np.uint64((1 << self.bits) - 1)).astype(np.intp)
+
+    def decode(self, keys):
+        """Term tuples of packed keys."""
+        columns = [[self.terms[i] for i in self.ids(position, keys).tolist()]
+                   for position in range(self.n)]
+        return list(zip(*columns))
+
+    def count(self, ngram, dictionary):
+        """Count of a tuple of terms, looked up through the counter's TermDictionary."""
+        key = 0
+        for term in ngram:
+            if term not in dictionary:
+                return 0
+            key = (key << self.bits) | dictionary.ids[term]
+        index = np.searchsorted(self.keys, np.uint64(key))
+        if index < len(self.keys) and self.keys[index] == key:
+            return int(self.counts[index])
+        return 0
+
+    def most_common(self, k=10):
+        """The k most frequent (ngram, count) pairs; ties in key order."""
+        order = np.argsort(-self.counts, kind='stable')[:k]
+        return list(zip(self.decode(self.keys[order]), self.counts[order].tolist()))
+
+    def _marginals(self):
+        return [self.position_counts[position][self.ids(position)].astype(np.float64)
+                for position in range(self.n)]
+
+    def pmi(self):
+        """Pointwise mutual information (bits) of each n-gram.
+
+        log2 P(w1..wn) / (P(w1) ... P(wn)), each term's probability taken
+        over its position in the counted n-grams.
+        """
+        score = np.log2(self.counts.astype(np.float64)) + (self.n - 1) * math.log2(self.total)
+        for marginal in self._marginals():
+            score -= np.log2(marginal)
+        return score
+
+    def log_likelihood(self):
+        """Dunning's log-likelihood ratio G^2 of each bigram (Dunning, 1993).
+
+        Compares the 2x2 table of w1 and w2 occurring together or apart with
+        the table expected if they were independent.
+        """
+        if self.n != 2:
+            raise ValueError("log-likelihood scores are defined for bigrams")
+        first, second = self._marginals()
+        together = self.counts.astype(np.float64)
+        only_first = first - together
+        only_second = second - together
+        neither = self.total - first - second + together
+        return 2 * (_xlogx(together) + _xlogx(only_first) + _xlogx(only_second)
+                    + _xlogx(neither) - _xlogx(first) - _xlogx(self.total - first)
+                    - _xlogx(second) - _xlogx(self.total - second)
+                    + _xlogx(self.total))
+
+    def collocations(self, k=20, measure='llr', min_count=1):
+        """The k highest scoring (ngram, count, score) entries with at least min_count occurrences."""
+        if measure not in MEASURES:
+            raise ValueError(f"measure must be one of {', '.join(MEASURES)}")
+        scores = self.log_likelihood() if measure == 'llr' else self.pmi()
+        candidates = np.flatnonzero(self.counts >= min_count)
+        if len(candidates) > k:
+            top = np.argpartition(-scores[candidates], k)[:k]
+            candidates = candidates[top]
+        # Highest score first, then most frequent, then key order
+        order = np.lexsort((self.keys[candidates], -self.counts[candidates],
+                            -scores[candidates]))
+        candidates = candidates[order]
+        return list(zip(self.decode(self.keys[candidates]), self.counts[candidates].tolist(),
+                        scores[candidates].tolist()))
+
+class TermMapper:
+    """Preprocesses raw tokens into term ids, running the pipeline once per distinct raw term.
+
+    preprocess_tokens([term]) decides each raw term's fate (dropped as a
+    stop word, or its stem), so the preprocessor must map each token to at
+    most one term independently of its neighbours, as TextPreprocessor does.
+    """
+
+    def __init__(self, preprocessor, dictionary):
+        self.preprocess_tokens = preprocessor.preprocess_tokens
+        self.dictionary = dictionary
+        self.raw = TermDictionary()
+        # Term id of each raw id, or -1 for dropped terms
+        self.term_ids = array('q')
+
+    def map(self, documents):
+        """(ids, lengths) arrays of documents given as lists of raw tokens."""
+        raw_ids = self.raw.encode(list(chain.from_iterable(documents)))
+        processed = [self.preprocess_tokens([term])
+                     for term in self.raw.terms[len(self.term_ids):]]
+        term_ids = iter(self.dictionary.encode([terms[0] for terms in processed if terms]))
+        self.term_ids.extend(next(term_ids) if terms else -1 for terms in processed)
+
+        lengths = np.fromiter(map(len, documents), dtype=np.int64, count=len(documents))
+        if not len(raw_ids):
+            return np.zeros(0, dtype=np.uint32), np.zeros(len(documents), dtype=np.int64)
+        ids = np.frombuffer(self.term_ids, dtype=np.int64)[np.frombuffer(raw_ids, dtype=np.uint32)]
+        kept = ids >= 0
+        document_of = np.repeat(np.arange(len(documents)), lengths)
+        lengths = np.bincount(document_of[kept], minlength=len(documents))
+        return ids[kept].astype(np.uint32), lengths
+
+def count_ngrams(filename, n=2, preprocessor=None, memory_limit=DEFAULT_MEMORY_LIMIT,
+                 max_lines=None):
+    """Count the n-grams of a collection's preprocessed lines in one pass.
+
+    Returns the NgramCounter. Collections are read as bytes (see
+    lab1_tokenizer) when the preprocessor's tokenizer allows it; token
+    files (.tok) are read directly.
+    """
+    if filename.endswith('.tok'):
+        counter = NgramCounter(n, memory_limit)
+        counter.add_token_file(filename)
+        return counter
+
+    if preprocessor is None:
+        from lab1_preprocessing import TextPreprocessor
+        preprocessor = TextPreprocessor()
+    # Input text per batch
+    chunk_size = max(batch_bytes(memory_limit) // BATCH_BYTES_PER_INPUT_BYTE, 1)
+
+    def count_chunks(chunks, tokenizer):
+        counter = NgramCounter(n, memory_limit)
+        mapper = TermMapper(preprocessor, counter.dictionary)
+        lines = 0
+        for chunk in chunks:
+            documents = tokenizer.tokenize_lines(chunk)
+            if max_lines is not None:
+                documents = documents[:max_lines - lines]
+            lines += len(documents)
+            counter.add_ids(*mapper.map(documents))
+            if max_lines is not None and lines >= max_lines:
+                break
+        return counter
+
+    def count_lines(f):
+        counter = NgramCounter(n, memory_limit)
+        mapper = TermMapper(preprocessor, counter.dictionary)
+        tokenize = preprocessor.tokenize
+        batch = []
+        batch_size = 0
+        for number, line in enumerate(f, 1):
+            if max_lines is not None and number > max_lines:
+                break
+            batch.append(tokenize(line))
+            batch_size += len(line)
+            if batch_size >= chunk_size:
+                counter.add_ids(*mapper.map(batch))
+                batch = []
+                batch_size = 0
+        counter.add_ids(*mapper.map(batch))
+        return counter
+
+    if preprocessor.tokenizes_bytes:
+        return read_collection_bytes(filename, count_chunks, chunk_size)
+    return read_collection(filename, count_lines)
@@ -0,0 +1,236 @@
+"""
+Lab 1: Parallel Preprocessing
+Splits a collection into byte ranges aligned to line boundaries, runs the
+tokenize/stop/stem pipeline on each range in a process pool, and merges
+the per-shard results so they match a serial pass exactly.
+"""
+
+import io
+import os
+from collections import Counter
+from itertools import chain
+from multiprocessing import Pool
+
+from lab1_corpus import detect_compression
+from lab1_tokenizer import ByteTokenizer, normalize_newlines
+
+# Shards are much smaller than a core's share of a big corpus, which keeps
+# per-worker memory bounded and balances the load
+DEFAULT_SHARD_SIZE = 16 << 20
+
+_worker_config = {}
+
+def shard_offsets(filename, shard_size=DEFAULT_SHARD_SIZE, max_lines=None):
+    """Return (start, end) byte ranges of filename, each ending after a newline.
+
+    If max_lines is given, only the first max_lines lines are covered.
+    """
+    size = os.path.getsize(filename)
+
+    with open(filename, 'rb') as f:
+        if max_lines:
+            size = _line_limit_offset(f, max_lines, size)
+
+        shards = []
+        start = 0
+        while start < size:
+            end = min(start + shard_size, size)
+            if end < size:
+                # Extend the shard to the end of the line it cuts through
+                f.seek(end)
+                rest = f.readline()
+                end = min(end + len(rest), size)
+            shards.append((start, end))
+            start = end
+
+    return shards
+
+def _line_limit_offset(f, max_lines, size):
+    """Byte offset just past line number max_lines, or size if the file is shorter."""
+    f.seek(0)
+    for _ in range(max_lines):
+        if not f.readline():
+            break
+    return min(f.tell(), size)
+
+def can_shard(filename):
+    """Byte ranges only make sense for uncompressed files."""
+    return detect_compression(filename) is None
+
+def first_occurrences(tokens):
+    """Return (position, term) for the first occurrence of each distinct term."""
+    seen = set()
+    firsts = []
+    for position, token in enumerate(tokens):
+        if token not in seen:
+            seen.add(token)
+            firsts.append((position, token))
+    return firsts
+
+def _init_worker(config):
+    """Receive the pipeline once per worker instead of once per shard."""
+    _worker_config.update(config)
+
+def _process_shard(shard):
+    """Run the pipeline on one byte range and summarise it for merging."""
+    config = _worker_config
+    start, end = shard
+
+    with open(config['filename'], 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    if config['tokenize_bytes']:
+        # The callables take the byte tokenizer's raw tokens instead of text
+        data = normalize_newlines(data)
+        tokenizer = ByteTokenizer(config['encoding'])
+        if config['split_documents']:
+            pieces = tokenizer.tokenize_lines(data)
+            text = list(chain.from_iterable(pieces))
+        else:
+            text = pieces = tokenizer.tokenize(data)
+        lines = data.count(b'\n') + (not data.endswith(b'\n'))
+    else:
+        # Decode through TextIOWrapper to get the same newline handling as open()
+        text = io.TextIOWrapper(io.BytesIO(data), encoding=config['encoding']).read()
+        if config['split_documents']:
+            # Tokenize line by line to keep document boundaries
+            pieces = text.split('\n')
+            if text.endswith('\n'):
+                pieces.pop()
+        else:
+            pieces = text
+        lines = text.count('\n') + (not text.endswith('\n'))
+
+    if config['split_documents']:
+        documents = [list(config['tokenizer'](piece)) for piece in pieces]
+        tokens = list(chain.from_iterable(documents))
+        head = documents
+    else:
+        tokens = list(config['tokenizer'](pieces))
+        head = tokens if config['head_size'] is None else tokens[:config['head_size']]
+
+    result = {
+        'counts': Counter(tokens),
+        'tokens': len(tokens),
+        'lines': lines,
+        'head': head
+    }
+
+    if config['track_growth']:
+        result['first_counted'] = first_occurrences(tokens)
+        if config['growth_tokenizer'] is None:
+            result['growth_tokens'] = len(tokens)
+            result['first_seen'] = result['first_counted']
+        else:
+            growth_tokens = list(config['growth_tokenizer'](text))
+            result['growth_tokens'] = len(growth_tokens)
+            result['first_seen'] = first_occurrences(growth_tokens)
+
+    return result
+
+def _run_shards(config, shards, workers):
+    """Yield shard results in file order, using a pool when it pays off."""
+    if workers <= 1 or len(shards) <= 1:
+        _init_worker(config)
+        for shard in shards:
+            yield _process_shard(shard)
+        return
+
+    with Pool(workers, initializer=_init_worker, initargs=(config,)) as pool:
+        yield from pool.imap(_process_shard, shards)
+
+def _merge_shards(results, track_growth, token_sink):
+    """Combine ordered shard results into whole-collection statistics."""
+    token_counts = Counter()
+    total_tokens = 0
+    lines = 0
+    growth_tokens = 0
+    seen = set()
+    new_term_positions = []
+    new_counted_positions = []
+
+    for index, result in enumerate(results):
+        if track_growth:
+            for position, term in result['first_counted']:
+                if term not in token_counts:
+                    new_counted_positions.append(total_tokens + position)
+
+        # Shards arrive in file order, so terms keep their serial insertion
+        # order and most_common() breaks ties the same way
+        token_counts.update(result['counts'])
+        total_tokens += result['tokens']
+        lines += result['lines']
+
+        if token_sink is not None:
+            token_sink(index, result['head'])
+
+        if track_growth:
+            for position, term in result['first_seen']:
+                if term not in seen:
+                    seen.add(term)
+                    new_term_positions.append(growth_tokens + position)
+            growth_tokens += result['growth_tokens']
+
+    return {
+        'token_counts': token_counts,
+        'total_tokens': total_tokens,
+        'lines': lines,
+        'growth_tokens': growth_tokens,
+        'new_term_positions': new_term_positions,
+        'new_counted_positions': new_counted_positions
+    }
+
+def process_shards(filename, tokenizer, growth_tokenizer=None, track_growth=False,
+                   workers=None, shard_size=DEFAULT_SHARD_SIZE, max_lines=None,
+                   head_size=0, token_sink=None, split_documents=False,
+                   tokenize_bytes=False):
+    """Run tokenizer over an uncompressed collection in parallel shards.
+
+    Args:
+        filename (str): Path to an uncompressed collection
+        tokenizer (callable): Maps a chunk of text to the tokens to count;
+            must be picklable (a module-level function or bound method)
+        growth_tokenizer (callable): Tokens to track vocabulary growth on,
+            if different from the counted ones
+        track_growth (bool): Record where each new term first appears
+        workers (int): Number of processes (defaults to all cores)
+        max_lines (int): Only process the first max_lines lines
+        head_size (int): Tokens per shard passed to token_sink (None for all)
+        token_sink (callable): Called as token_sink(index, tokens) for each
+            shard in file order; index 0 means the stream (re)starts, which
+            happens again if the file has to be re-read as Latin-1
+        split_documents (bool): Tokenize each line separately and pass
+            token_sink a list of per-line token lists instead (head_size
+            is then ignored)
+        tokenize_bytes (bool): Tokenize shards with lab1_tokenizer's
+            ByteTokenizer without decoding them; tokenizer and
+            growth_tokenizer then map its raw tokens (a list) rather than
+            text to tokens
+
+    Returns:
+        dict: token_counts, total_tokens, lines, and for growth tracking the
+        growth_tokens total and the sorted positions where new terms first
+        appear in the growth stream (new_term_positions) and in the counted
+        stream (new_counted_positions)
+    """
+    workers = workers or os.cpu_count() or 1
+    shards = shard_offsets(filename, shard_size, max_lines)
+
+    for encoding in ('utf-8', 'latin1'):
+        config = {
+            'filename': filename,
+            'encoding': encoding,
+            'tokenizer': tokenizer,
+            'growth_tokenizer': growth_tokenizer,
+            'track_growth': track_growth,
+            'head_size': head_size,
+            'split_documents': split_documents,
+            'tokenize_bytes': tokenize_bytes
+        }
+        try:
+            return _merge_shards(_run_shards(config, shards, workers),
+                                 track_growth, token_sink)
+        except UnicodeDecodeError:
+            # Like read_collection, decode the whole file as Latin-1 instead
+            continue
@@ -0,0 +1,199 @@
+"""
+Lab 1: Analysis Plots
+Renders the four-panel analysis figure for a collection. Long series
+(Zipf ranks, frequencies of frequencies, vocabulary growth) are decimated
+before drawing: the x range is cut into bins, log-spaced on log axes, and
+each bin keeps only its first, last, lowest and highest points. With at
+least as many bins as the panel is pixels wide, the drawn line covers the
+same pixels as the full series, but a figure for a vocabulary of millions
+draws a few thousand points.
+
+A digest of the plotted data is stored beside each figure, so a figure
+whose statistics have not changed is not rendered again.
+
+matplotlib is imported on first render, so runs with plots turned off
+never load it. Figures are drawn on their own Agg canvas rather than
+through pyplot, whose global figure state is not thread-safe, so render()
+can run on lab1_preprocessing's background thread under any backend.
+"""
+
+import os
+import json
+import hashlib
+
+import numpy as np
+
+# Points kept per series; 4 per bin, about one bin per pixel of a panel at 300 dpi
+DEFAULT_MAX_POINTS = 8000
+DEFAULT_DPI = 300
+PLOT_CACHE_FILE = 'plot_cache.json'
+
+# Bump whenever the figure layout changes, so cached figures are redrawn
+PLOT_VERSION = '1'
+
+def decimate(x, y, max_points=DEFAULT_MAX_POINTS, log=True):
+    """Reduce a series sorted by x to at most max_points points.
+
+    Each of max_points // 4 bins of x (log-spaced if log, which needs x > 0)
+    keeps its first, last, minimum and maximum points, in x order. Series
+    that are already short enough are returned unchanged.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if max_points is None or len(x) <= max_points:
+        return x, y
+
+    bins = max(max_points // 4, 1)
+    if log:
+        edges = np.geomspace(x[0], x[-1], bins + 1)
+    else:
+        edges = np.linspace(x[0], x[-1], bins + 1)
+    bin_of = np.clip(np.searchsorted(edges, x, side='right') - 1, 0, bins - 1)
+
+    # x is sorted, so each bin is a contiguous run
+    starts = np.flatnonzero(np.diff(bin_of, prepend=-1))
+    ends = np.append(starts[1:] - 1, len(x) - 1)
+    # Sorting by (bin, y) puts each bin's minimum at its start and maximum at its end
+    order = np.lexsort((y, bin_of))
+
+    keep = np.unique(np.concatenate((starts, ends, order[starts], order[ends])))
+    return x[keep], y[keep]
+
+def plot_series(results, max_points=DEFAULT_MAX_POINTS):
+    """The data drawn in each panel, decimated, as a dict of arrays and values."""
+    zipf = results['zipf']
+    benford = results['benford']
+    growth = results['growth']
+
+    ranks, frequencies = decimate(zipf['ranks'], zipf['frequencies'], max_points)
+    n_values, v_values = decimate(growth['n_values'], growth['v_values'],
+                                  max_points, log=False)
+    distinct, counts = decimate(*results['term_stats'].frequency_of_frequencies(),
+                                max_points)
+
+    digits = list(range(1, 10))
+    return {
+        'ranks': ranks,
+        'frequencies': frequencies,
+        'alpha': zipf['alpha'],
+        'all_counts': [benford['all_digits'].get(d, 0) for d in digits],
+        'filtered_counts': [benford['filtered_digits'].get(d, 0) for d in digits],
+        'expected': [benford['benford_expected'][d] for d in digits],
+        'n_values': n_values,
+        'v_values': v_values,
+        'k': growth['k'],
+        'b': growth['b'],
+        'distinct_frequencies': distinct,
+        'frequency_counts': counts
+    }
+
+def series_digest(collection_name, series, dpi):
+    """SHA-256 identifying a figure: its title, data, resolution and layout version."""
+    digest = hashlib.sha256(f'{PLOT_VERSION}:{collection_name}:{dpi}'.encode('utf-8'))
+    for key in sorted(series):
+        value = series[key]
+        digest.update(key.encode('utf-8'))
+        if isinstance(value, np.ndarray):
+            digest.update(np.ascontiguousarray(value, dtype=np.float64).tobytes())
+        else:
+            digest.update(repr(value).encode('utf-8'))
+    return digest.hexdigest()
+
+def plot_filename(collection_name):
+    return f'{collection_name.lower().replace(" ", "_")}_analysis.png'
+
+def _load_plot_cache(cache_file):
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_plot_cache(cache_file, filename, digest):
+    # Re-read first: collections may be plotted by several processes
+    cache = _load_plot_cache(cache_file)
+    cache[os.path.abspath(filename)] = digest
+    with open(f'{cache_file}.{os.getpid()}.tmp', 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=1)
+    os.replace(f'{cache_file}.{os.getpid()}.tmp', cache_file)
+
+def render(series, collection_name, filename, dpi=DEFAULT_DPI):
+    """Draw the analysis figure from plot_series output and save it."""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(15, 10))
+    FigureCanvasAgg(fig)
+    ((ax1, ax2), (ax3, ax4)) = fig.subplots(2, 2)
+    fig.suptitle(f'{collection_name} - Text Analysis Results')
+
+    # Zipf's law plot
+    ax1.loglog(series['ranks'], series['frequencies'])
+    ax1.set_xlabel('Rank')
+    ax1.set_ylabel('Frequency')
+    ax1.set_title(f"Zipf's Law (α = {series['alpha']:.3f})")
+    ax1.grid(True)
+
+    # Benford's law plot
+    digits = list(range(1, 10))
+    all_counts = series['all_counts']
+    expected = [p * sum(all_counts) for p in series['expected']]
+
+    x = np.arange(len(digits))
+    width = 0.25
+
+    ax2.bar(x - width, all_counts, width, label='All frequencies')
+    ax2.bar(x, series['filtered_counts'], width, label='Frequencies ≥ 10')
+    ax2.bar(x + width, expected, width, label='Benford expected')
+    ax2.set_xlabel('First Digit')
+    ax2.set_ylabel('Count')
+    ax2.set_title("Benford's Law Distribution")
+    ax2.set_xticks(x)
+    ax2.set_xticklabels(digits)
+    ax2.legend()
+
+    # Vocabulary growth plot
+    n_values = series['n_values']
+    ax3.plot(n_values, series['v_values'], 'b-', label='Observed')
+
+    # Plot fitted curve
+    fitted_v = series['k'] * n_values.astype(np.float64) ** series['b']
+    ax3.plot(n_values, fitted_v, 'r--',
+             label=f"Fitted: V = {series['k']:.1f} × N^{series['b']:.3f}")
+
+    ax3.set_xlabel('Total Terms (N)')
+    ax3.set_ylabel('Unique Terms (V)')
+    ax3.set_title("Vocabulary Growth (Heap's Law)")
+    ax3.legend()
+    ax3.grid(True)
+
+    # Distribution of term frequencies
+    ax4.loglog(series['distinct_frequencies'], series['frequency_counts'])
+    ax4.set_xlabel('Term Frequency')
+    ax4.set_ylabel('Number of Terms')
+    ax4.set_title('Term Frequency Distribution')
+    ax4.grid(True)
+
+    fig.tight_layout()
+    fig.savefig(filename, dpi=dpi, bbox_inches='tight')
+
+def create_plots(results, collection_name, max_points=DEFAULT_MAX_POINTS,
+                 dpi=DEFAULT_DPI, cache_file=PLOT_CACHE_FILE, force=False):
+    """Create visualization plots for analysis results.
+
+    Returns the figure's filename, or None if an identical figure was
+    already saved there. Pass max_points=None to draw every point and
+    cache_file=None to always render.
+    """
+    filename = plot_filename(collection_name)
+    series = plot_series(results, max_points)
+    digest = series_digest(collection_name, series, dpi)
+
+    if (cache_file is not None and not force and os.path.exists(filename)
+            and _load_plot_cache(cache_file).get(os.path.abspath(filename)) == digest):
+        return None
+
+    render(series, collection_name, filename, dpi)
+    if cache_file is not None:
+        _save_plot_cache(cache_file, filename, digest)
+    return filename
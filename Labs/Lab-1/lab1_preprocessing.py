@@ -3,21 +3,110 @@
 Lab 1: Text Preprocessing and Laws Analysis
 Implements tokenization, case folding, stopping, and Porter stemming.
 Analyzes Zipf's Law, Benford's Law, and vocabulary growth.
+
+The analysis and plotting modules (and with them numpy and matplotlib) are
+imported by the functions that need them, so tools that only preprocess
+text start quickly.
 """
 
+import io
 import re
-import math
-import matplotlib.pyplot as plt
-from collections import Counter, defaultdict
-import numpy as np
-from scipy.optimize import curve_fit
+import os
+import sys
+import json
+import shutil
+from collections import Counter, OrderedDict, defaultdict
+from contextlib import redirect_stdout
+from itertools import chain, islice
+from lab1_cache import PreprocessingCache
+from lab1_corpus import find_collection, read_collection
+from lab1_growth import (VocabularyGrowthTracker, checkpoints_upto,
+                         growth_from_positions, linear_checkpoints)
+from lab1_parallel import can_shard, process_shards
+from lab1_profiling import NULL_PROFILER, Profiler, save_reports
+from lab1_tokenfile import TokenFileReader, TokenFileWriter
+from lab1_tokenizer import TOKEN_PATTERN as BYTE_TOKEN_PATTERN, read_collection_bytes
 
 class PorterStemmer:
-    """Implementation of Porter Stemmer algorithm."""
+    """Implementation of Porter Stemmer algorithm.
+
+    Stems are memoized in a bounded LRU cache: token frequencies follow
+    Zipf's law, so a few thousand distinct words account for most calls.
+    Set cache_size to None for an unbounded cache or 0 to disable it.
+    """
+
+    # Bump whenever stemming output changes, so saved caches are discarded
+    VERSION = '1'
 
-    def __init__(self):
+    def __init__(self, cache_size=100000, cache_file=None):
         self.consonant = "[^aeiouAEIOU]"
         self.vowel = "[aeiouAEIOU]"
+        self.cache_size = cache_size
+        self.cache_file = cache_file
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._cache = OrderedDict()
+
+        if cache_file and os.path.exists(cache_file):
+            self.load_cache(cache_file)
+
+    def cache_info(self):
+        """Return hit/miss counters and current size of the stem cache."""
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'size': len(self._cache),
+            'max_size': self.cache_size,
+            'hit_rate': self.cache_hits / lookups if lookups else 0.0
+        }
+
+    def clear_cache(self):
+        """Drop all cached stems and reset the counters."""
+        self._cache.clear()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def save_cache(self, filename=None):
+        """Save the stem dictionary to disk so the next run can preload it."""
+        filename = filename or self.cache_file
+        if not filename:
+            raise ValueError("No cache file given")
+
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.VERSION, 'stems': self._cache}, f)
+
+    def cached_stems(self):
+        """The cached stems, least recently used first."""
+        return OrderedDict(self._cache)
+
+    def merge_cache(self, stems):
+        """Add stems cached elsewhere (e.g. by a worker process), evicting as needed."""
+        if self.cache_size == 0:
+            return
+        self._cache.update(stems)
+        if self.cache_size is not None:
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def load_cache(self, filename):
+        """Preload stems saved by save_cache; stale or corrupt files are ignored."""
+        try:
+            with open(filename, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return 0
+
+        if data.get('version') != self.VERSION or self.cache_size == 0:
+            return 0
+
+        stems = data.get('stems', {})
+        items = list(stems.items())
+        if self.cache_size is not None:
+            # Keep the most recently used entries, which were saved last
+            items = items[-self.cache_size:]
+        self._cache.update(items)
+        return len(items)
 
     def _is_consonant(self, word, i):
         """Check if character at position i is a consonant."""
@@ -62,7 +151,27 @@ class PorterStemmer:
                 word[-1] not in 'wxy')
 
     def stem(self, word):
-        """Apply Porter stemming algorithm."""
+        """Apply Porter stemming algorithm, using the stem cache if enabled."""
+        if self.cache_size == 0:
+            return self._stem(word)
+
+        cache = self._cache
+        stemmed = cache.get(word)
+        if stemmed is not None:
+            self.cache_hits += 1
+            cache.move_to_end(word)
+            return stemmed
+
+        self.cache_misses += 1
+        stemmed = self._stem(word)
+        cache[word] = stemmed
+        if self.cache_size is not None and len(cache) > self.cache_size:
+            # Evict the least recently used stem
+            cache.popitem(last=False)
+        return stemmed
+
+    def _stem(self, word):
+        """Apply Porter stemming algorithm without caching."""
         word = word.lower()
         if len(word) <= 2:
             return word
@@ -205,11 +314,195 @@ class PorterStemmer:
 
         return word
 
+def _cv_pattern(word, cv=''):
+    """Return the consonant/vowel pattern of word as a string of 'c'/'v'.
+
+    cv may hold the already known pattern of a prefix of word, in which case
+    only the remaining letters are classified. A 'y' is a vowel when it
+    follows a consonant, matching PorterStemmer._is_consonant.
+    """
+    prev = cv[-1] if cv else 'v'
+    parts = [cv]
+    for ch in word[len(cv):]:
+        if ch in 'aeiou':
+            prev = 'v'
+        elif ch == 'y':
+            prev = 'c' if prev == 'v' else 'v'
+        else:
+            prev = 'c'
+        parts.append(prev)
+    return ''.join(parts)
+
+def _cv_measure(cv, length):
+    """Measure of the first length letters, as PorterStemmer._measure counts it."""
+    if length <= 0:
+        return 0
+    return cv.count('cv', 0, length) + (cv[0] == 'v')
+
+def _cv_cvc(word, cv):
+    """Check for a consonant-vowel-consonant ending not in w, x or y."""
+    return len(cv) >= 3 and cv[-3:] == 'cvc' and word[-1] not in 'wxy'
+
+def _suffix_table(rules):
+    """Group (suffix, strip, append) rules by their last two letters, keeping order."""
+    table = defaultdict(list)
+    for rule in rules:
+        table[rule[0][-2:]].append(rule)
+    return dict(table)
+
+class FastPorterStemmer(PorterStemmer):
+    """Porter stemmer that classifies each letter once per word.
+
+    Produces exactly the same stems as PorterStemmer, but computes the
+    word's consonant/vowel pattern up front, measures prefixes from it,
+    and picks the suffix rule for steps 2-4 from a table keyed on the
+    final two letters instead of testing every suffix in turn.
+    """
+
+    # Step 2: (suffix, letters to strip, replacement), in PorterStemmer order
+    STEP2 = _suffix_table([
+        ('ational', 7, 'ate'), ('tional', 6, 'tion'), ('enci', 4, 'ence'),
+        ('anci', 4, 'ance'), ('izer', 4, 'ize'), ('abli', 4, 'able'),
+        ('alli', 4, 'al'), ('entli', 6, 'ent'), ('eli', 3, 'e'),
+        ('ousli', 5, 'ous'), ('ization', 7, 'ize'), ('ation', 5, 'ate'),
+        ('ator', 4, 'ate'), ('alism', 6, 'al'), ('iveness', 7, 'ive'),
+        ('fulness', 7, 'ful'), ('ousness', 7, 'ous'), ('aliti', 5, 'al'),
+        ('iviti', 5, 'ive'), ('biliti', 6, 'ble')
+    ])
+
+    # Step 3
+    STEP3 = _suffix_table([
+        ('icate', 3, ''), ('ative', 5, ''), ('alize', 3, ''),
+        ('iciti', 5, 'ic'), ('ical', 2, ''), ('ful', 3, ''), ('ness', 4, '')
+    ])
+
+    # Step 4; 'ion' is only removed after 's' or 't'
+    STEP4 = _suffix_table([
+        ('ement', 6, ''), ('ment', 4, ''), ('able', 4, ''), ('ible', 4, ''),
+        ('ance', 4, ''), ('ence', 4, ''), ('al', 2, ''), ('er', 2, ''),
+        ('ic', 2, ''), ('ant', 2, ''), ('ent', 2, ''), ('ion', 3, ''),
+        ('ou', 2, ''), ('ism', 3, ''), ('ate', 3, ''), ('iti', 3, ''),
+        ('ous', 3, ''), ('ive', 3, ''), ('ize', 3, '')
+    ])
+
+    @staticmethod
+    def _replace_suffix(word, cv, table):
+        """Apply the first matching rule from table; return (word, cv, matched)."""
+        for suffix, strip, append in table.get(word[-2:], ()):
+            if word.endswith(suffix):
+                base = word[:-strip]
+                word = base + append
+                cv = _cv_pattern(word, cv[:len(base)])
+                return word, cv, suffix
+        return word, cv, None
+
+    def _stem(self, word):
+        """Apply Porter stemming algorithm without caching."""
+        word = word.lower()
+        if len(word) <= 2:
+            return word
+
+        # Step 1a
+        if word[-1] == 's':
+            if word.endswith('sses') or word.endswith('ies'):
+                word = word[:-2]
+            elif not word.endswith('ss'):
+                word = word[:-1]
+
+        cv = _cv_pattern(word)
+
+        # Step 1b
+        if word.endswith('eed'):
+            if _cv_measure(cv, len(word) - 3) > 0:
+                word = word[:-1]
+                cv = cv[:-1]
+        else:
+            n = 2 if word.endswith('ed') else 3 if word.endswith('ing') else 0
+            if n and cv.find('v', 0, len(word) - n) != -1:
+                word = word[:-n]
+                cv = cv[:-n]
+                if word.endswith(('at', 'bl', 'iz')):
+                    word += 'e'
+                    cv = _cv_pattern(word, cv)
+                elif (len(word) >= 2 and word[-1] == word[-2] and
+                      cv[-1] == 'c' and word[-1] not in 'lsz'):
+                    word = word[:-1]
+                    cv = cv[:-1]
+                elif _cv_measure(cv, len(word)) == 1 and _cv_cvc(word, cv):
+                    word += 'e'
+                    cv = _cv_pattern(word, cv)
+
+        # Step 2
+        if word[-2:] in self.STEP2 and _cv_measure(cv, len(word) - 1) > 0:
+            word, cv, _ = self._replace_suffix(word, cv, self.STEP2)
+
+        # Step 3
+        if word[-2:] in self.STEP3 and _cv_measure(cv, len(word) - 1) > 0:
+            word, cv, _ = self._replace_suffix(word, cv, self.STEP3)
+
+        # Step 4
+        if word[-2:] in self.STEP4 and _cv_measure(cv, len(word) - 1) > 1:
+            if word.endswith('ion'):
+                if len(word) >= 4 and word[-4] in 'st':
+                    word = word[:-3]
+                    cv = cv[:-3]
+            else:
+                word, cv, _ = self._replace_suffix(word, cv, self.STEP4)
+
+        # Step 5a
+        if word.endswith('e'):
+            m = _cv_measure(cv, len(word) - 1)
+            if m > 1 or (m == 1 and not _cv_cvc(word[:-1], cv[:-1])):
+                word = word[:-1]
+                cv = cv[:-1]
+
+        # Step 5b
+        if (word.endswith('ll') and cv[-1] == 'c' and
+                _cv_measure(cv, len(word)) > 1):
+            word = word[:-1]
+
+        return word
+
+def iter_text_chunks(source, chunk_size=1 << 20):
+    """Yield text from a file object or iterable of lines in newline-aligned chunks.
+
+    Chunks always end on a line break (or at end of input), so no token is
+    split and lowercasing a chunk gives the same result as lowercasing the
+    whole text.
+    """
+    if not hasattr(source, 'read'):
+        # Batch lines so the tokenizer still sees large pieces of text;
+        # lines without a trailing newline must not run into the next one
+        lines = iter(source)
+        while True:
+            batch = list(islice(lines, 4096))
+            if not batch:
+                return
+            yield ''.join(line if line.endswith('\n') else line + '\n' for line in batch)
+
+    carry = ''
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        cut = chunk.rfind('\n') + 1
+        if cut == 0:
+            carry += chunk
+            continue
+        yield carry + chunk[:cut]
+        carry = chunk[cut:]
+
+    if carry:
+        yield carry
+
 class TextPreprocessor:
     """Text preprocessing pipeline for TTDS Lab 1."""
 
-    def __init__(self):
-        self.stemmer = PorterStemmer()
+    TOKEN_PATTERN = r'\w+'
+
+    def __init__(self, stem_cache_size=100000, stem_cache_file=None):
+        self.stemmer = FastPorterStemmer(cache_size=stem_cache_size,
+                                         cache_file=stem_cache_file)
         self.stop_words = {
             'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from',
             'has', 'he', 'in', 'is', 'it', 'its', 'of', 'on', 'that', 'the',
@@ -228,16 +521,57 @@ class TextPreprocessor:
     def tokenize(self, text):
         """Tokenize text into words, removing punctuation."""
         # Use regex to extract word characters only
-        tokens = re.findall(r'\w+', text.lower())
+        tokens = re.findall(self.TOKEN_PATTERN, text.lower())
         return tokens
 
+    @property
+    def tokenizes_bytes(self):
+        """Whether lab1_tokenizer.ByteTokenizer gives exactly the tokens of tokenize."""
+        return (self.TOKEN_PATTERN == BYTE_TOKEN_PATTERN
+                and type(self).tokenize is TextPreprocessor.tokenize)
+
+    def fingerprint(self):
+        """Everything that determines the pipeline's output, for cache keys."""
+        stemmer = type(self.stemmer)
+        return {
+            'tokenizer': self.TOKEN_PATTERN,
+            'stop_words': sorted(self.stop_words),
+            'stemmer': f'{stemmer.__module__}.{stemmer.__qualname__}',
+            'stemmer_version': stemmer.VERSION
+        }
+
     def remove_stop_words(self, tokens):
         """Remove stop words from token list."""
         return [token for token in tokens if token not in self.stop_words]
 
     def stem_tokens(self, tokens):
         """Apply Porter stemming to tokens."""
-        return [self.stemmer.stem(token) for token in tokens]
+        stem = self.stemmer.stem
+        return [stem(token) for token in tokens]
+
+    def iter_raw_tokens(self, source):
+        """Lazily tokenize and case-fold a file object or iterable of lines."""
+        tokenize = self.tokenize
+        for text in iter_text_chunks(source):
+            yield from tokenize(text)
+
+    def iter_tokens(self, source):
+        """Lazily run the full pipeline over a file object or iterable of lines.
+
+        Yields the same tokens as preprocess_text on the whole text, but only
+        holds one chunk of input in memory at a time.
+        """
+        stop_words = self.stop_words
+        stem = self.stemmer.stem
+        for token in self.iter_raw_tokens(source):
+            if token not in stop_words:
+                yield stem(token)
+
+    def preprocess_tokens(self, tokens):
+        """Stop and stem already tokenized text in a single pass."""
+        stop_words = self.stop_words
+        stem = self.stemmer.stem
+        return [stem(token) for token in tokens if token not in stop_words]
 
     def preprocess_text(self, text):
         """Complete preprocessing pipeline."""
@@ -252,83 +586,194 @@ class TextPreprocessor:
 
         return tokens
 
+class CollectionStatistics:
+    """Statistics of a collection, accumulated in a single pass over its text.
+
+    Each chunk is tokenized once: the raw tokens drive the raw vocabulary
+    growth curve, and the stopped and stemmed tokens update the term
+    frequencies, the processed growth curve and the token totals. The
+    Zipf, Benford and Heap's law analyses then run on these statistics
+    without re-reading the collection.
+
+    schedule is called once per growth curve and must return a fresh
+    checkpoint iterable, e.g. lambda: log_checkpoints(20). A Profiler
+    records the read, tokenize, stop, stem, count and write stages; stop
+    words and stems are then removed in two passes so each can be timed.
+
+    With a lab1_tokenizer.ByteTokenizer, chunks are newline-aligned bytes
+    (see lab1_tokenizer.iter_chunks) and are tokenized without decoding.
+    """
+
+    def __init__(self, preprocessor=None, schedule=linear_checkpoints,
+                 profiler=NULL_PROFILER, tokenizer=None):
+        self.preprocessor = preprocessor or TextPreprocessor()
+        self.profiler = profiler
+        self.tokenizer = tokenizer
+        self.token_counts = Counter()
+        self.raw_tracker = VocabularyGrowthTracker(schedule())
+        # The processed tracker counts terms as it tracks them
+        self.processed_tracker = VocabularyGrowthTracker(schedule(), self.token_counts)
+
+    @property
+    def raw_tokens(self):
+        return self.raw_tracker.total_tokens
+
+    @property
+    def total_tokens(self):
+        return self.processed_tracker.total_tokens
+
+    def _stop_and_stem(self, raw):
+        preprocessor = self.preprocessor
+        profiler = self.profiler
+        if not profiler.enabled:
+            return preprocessor.preprocess_tokens(raw)
+
+        with profiler.stage('stop', len(raw)):
+            stopped = preprocessor.remove_stop_words(raw)
+        with profiler.stage('stem', len(stopped)):
+            return preprocessor.stem_tokens(stopped)
+
+    def _count(self, raw, tokens):
+        with self.profiler.stage('count', len(tokens)):
+            self.raw_tracker.update(raw)
+            self.processed_tracker.update(tokens)
+
+    def update(self, text):
+        """Add a chunk of text and return its preprocessed tokens."""
+        with self.profiler.stage('tokenize'):
+            raw = (self.tokenizer or self.preprocessor).tokenize(text)
+        self.profiler.count('tokenize', len(raw))
+
+        tokens = self._stop_and_stem(raw)
+        self._count(raw, tokens)
+        return tokens
+
+    def update_documents(self, text):
+        """Add a chunk of whole lines and return each line's preprocessed tokens."""
+        with self.profiler.stage('tokenize'):
+            if self.tokenizer is not None:
+                raw_lines = self.tokenizer.tokenize_lines(text)
+            else:
+                lines = text.split('\n')
+                if text.endswith('\n'):
+                    lines.pop()
+                tokenize = self.preprocessor.tokenize
+                raw_lines = [tokenize(line) for line in lines]
+        raw = list(chain.from_iterable(raw_lines))
+        self.profiler.count('tokenize', len(raw))
+
+        documents = [self._stop_and_stem(line_raw) for line_raw in raw_lines]
+        self._count(raw, list(chain.from_iterable(documents)))
+        return documents
+
+    def consume(self, source, output=None, token_file=None):
+        """Add a whole file or iterable of lines, optionally writing its tokens.
+
+        output receives the tokens as space-separated text, and token_file
+        (a TokenFileWriter) each line's tokens as one document. With a byte
+        tokenizer, source is an iterable of byte chunks instead.
+        """
+        profiler = self.profiler
+        chunks = iter(source) if self.tokenizer is not None else iter_text_chunks(source)
+        separator = ''
+        while True:
+            with profiler.stage('read'):
+                text = next(chunks, None)
+            if text is None:
+                return self
+            profiler.count('read', len(text))
+
+            if token_file is None:
+                tokens = self.update(text)
+            else:
+                documents = self.update_documents(text)
+                with profiler.stage('write'):
+                    for document in documents:
+                        token_file.add_document(document)
+                tokens = list(chain.from_iterable(documents)) if output is not None else None
+
+            if output is not None and tokens:
+                with profiler.stage('write'):
+                    output.write(separator + ' '.join(tokens))
+                separator = ' '
+
+    def raw_growth_data(self):
+        """(N, V) samples over the tokenized, case-folded text."""
+        return self.raw_tracker.growth_data()
+
+    def processed_growth_data(self):
+        """(N, V) samples over the stopped and stemmed tokens."""
+        return self.processed_tracker.growth_data()
+
 def analyze_zipf_law(token_counts):
-    """Analyze Zipf's law distribution."""
-    # Sort by frequency (descending)
-    sorted_counts = sorted(token_counts.values(), reverse=True)
-    ranks = list(range(1, len(sorted_counts) + 1))
+    """Analyze Zipf's law distribution.
 
-    # Create log-log plot
-    log_ranks = [math.log10(r) for r in ranks]
-    log_freqs = [math.log10(f) for f in sorted_counts if f > 0]
+    token_counts may be a Counter or a TermStatistics table; ranks,
+    frequencies and their logs are returned as arrays.
+    """
+    from lab1_termstats import TermStatistics
 
-    # Fit power law: log(f) = log(k) - alpha * log(r)
-    if len(log_ranks) == len(log_freqs):
-        coeffs = np.polyfit(log_ranks, log_freqs, 1)
-        alpha = -coeffs[0]  # Zipf exponent
-        k = 10**coeffs[1]   # Zipf constant
+    if not isinstance(token_counts, TermStatistics):
+        token_counts = TermStatistics.from_counts(token_counts)
+    if not len(token_counts):
+        return None
 
-        return {
-            'ranks': ranks,
-            'frequencies': sorted_counts,
-            'log_ranks': log_ranks,
-            'log_frequencies': log_freqs,
-            'alpha': alpha,
-            'k': k
-        }
-    return None
+    # Fit power law: log(f) = log(k) - alpha * log(r)
+    return token_counts.zipf()
 
 def analyze_benford_law(frequencies):
     """Analyze first digit distribution (Benford's law)."""
-    first_digits = []
-    filtered_first_digits = []  # For frequencies >= 10
-
-    for freq in frequencies:
-        if freq > 0:
-            first_digit = int(str(freq)[0])
-            first_digits.append(first_digit)
+    import numpy as np
+    from lab1_termstats import benford_expected, first_digits
 
-            if freq >= 10:
-                filtered_first_digits.append(first_digit)
+    frequencies = np.asarray(frequencies, dtype=np.int64)
+    frequencies = frequencies[frequencies > 0]
+    digits = first_digits(frequencies)
 
-    # Count distribution
-    digit_counts = Counter(first_digits)
-    filtered_digit_counts = Counter(filtered_first_digits)
-
-    # Benford's law expected probabilities
-    benford_expected = {d: math.log10(1 + 1/d) for d in range(1, 10)}
+    # Count distribution, over all frequencies and over those >= 10
+    all_counts = np.bincount(digits, minlength=10)
+    filtered_counts = np.bincount(digits[frequencies >= 10], minlength=10)
 
     return {
-        'all_digits': digit_counts,
-        'filtered_digits': filtered_digit_counts,
-        'benford_expected': benford_expected
+        'all_digits': Counter({d: int(c) for d, c in enumerate(all_counts) if c}),
+        'filtered_digits': Counter({d: int(c) for d, c in enumerate(filtered_counts) if c}),
+        'benford_expected': benford_expected()
     }
 
-def analyze_vocabulary_growth(text):
-    """Analyze vocabulary growth following Heap's law."""
-    preprocessor = TextPreprocessor()
-
-    # Process text incrementally
-    tokens = preprocessor.tokenize(text)
-    unique_terms = set()
-    growth_data = []
-
-    for i, token in enumerate(tokens, 1):
-        unique_terms.add(token)
-        if i % 1000 == 0 or i == len(tokens):  # Sample every 1000 tokens
-            growth_data.append((i, len(unique_terms)))
-
-    # Fit Heap's law: V = k * N^b
-    n_values = [point[0] for point in growth_data]
-    v_values = [point[1] for point in growth_data]
-
-    # Fit power law in log space
-    log_n = [math.log(n) for n in n_values]
-    log_v = [math.log(v) for v in v_values]
-
-    coeffs = np.polyfit(log_n, log_v, 1)
-    b = coeffs[0]  # Heap's exponent
-    k = math.exp(coeffs[1])  # Heap's constant
+def analyze_vocabulary_growth(text, checkpoints=None, precision=None):
+    """Analyze vocabulary growth following Heap's law.
+
+    text may be a string or an already tokenized stream of terms. V is
+    sampled every 1000 tokens unless another checkpoint schedule is given
+    (see lab1_growth). With a precision, V is estimated by a HyperLogLog
+    sketch of 2^precision bytes instead of a set of every term (see
+    lab1_sketches).
+    """
+    if isinstance(text, str):
+        tokens = TextPreprocessor().tokenize(text)
+    else:
+        tokens = text
+
+    if precision is None:
+        vocabulary = None
+    else:
+        from lab1_sketches import HyperLogLog
+        vocabulary = HyperLogLog(precision)
+    tracker = VocabularyGrowthTracker(checkpoints, vocabulary)
+    tracker.consume(tokens)
+
+    return fit_vocabulary_growth(tracker.growth_data())
+
+def fit_vocabulary_growth(growth_data):
+    """Fit Heap's law to sampled (N, V) points."""
+    import numpy as np
+    from lab1_termstats import fit_power_law
+
+    points = np.array(growth_data, dtype=np.int64).reshape(-1, 2)
+    n_values, v_values = points[:, 0], points[:, 1]
+
+    # Fit Heap's law: V = k * N^b in log space
+    k, b = fit_power_law(n_values, v_values)
 
     return {
         'growth_data': growth_data,
@@ -338,136 +783,344 @@ def analyze_vocabulary_growth(text):
         'v_values': v_values
     }
 
-def process_collection(filename, collection_name):
-    """Process a single text collection through complete analysis pipeline."""
-    print(f"\nProcessing {collection_name}...")
+def count_tokens(tokens, output=None, batch_size=65536):
+    """Count a token stream in batches, optionally writing it space-separated."""
+    token_counts = Counter()
+    separator = ''
+
+    while True:
+        batch = list(islice(tokens, batch_size))
+        if not batch:
+            break
+        token_counts.update(batch)
+        if output is not None:
+            output.write(separator + ' '.join(batch))
+            separator = ' '
+
+    return token_counts
+
+def process_sharded(filename, preprocessor, output_filename=None, workers=None,
+                    token_filename=None):
+    """Count tokens and vocabulary growth of a collection on several cores.
+
+    Gives exactly the token counts, growth data and output files of the
+    serial path in process_collection. Returns (token_counts,
+    raw_growth_data, processed_growth_data).
+    """
+    output = token_file = None
+
+    def write_shard(index, documents):
+        if index == 0:
+            if output is not None:
+                output.seek(0)
+                output.truncate()
+            if token_file is not None:
+                token_file.reset()
+        if token_file is not None:
+            for document in documents:
+                token_file.add_document(document)
+            tokens = list(chain.from_iterable(documents))
+        else:
+            tokens = documents
+        if output is not None and tokens:
+            output.write((' ' if output.tell() else '') + ' '.join(tokens))
+
+    def run(token_sink):
+        # Counts use the full pipeline; Heap's law uses the raw tokens
+        if preprocessor.tokenizes_bytes:
+            tokenizer, growth_tokenizer = preprocessor.preprocess_tokens, list
+        else:
+            tokenizer, growth_tokenizer = preprocessor.preprocess_text, preprocessor.tokenize
+        return process_shards(filename, tokenizer,
+                              growth_tokenizer=growth_tokenizer,
+                              track_growth=True, workers=workers,
+                              head_size=None, token_sink=token_sink,
+                              split_documents=token_filename is not None,
+                              tokenize_bytes=preprocessor.tokenizes_bytes)
 
-    # Read text
     try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            text = f.read()
-    except UnicodeDecodeError:
-        with open(filename, 'r', encoding='latin1') as f:
-            text = f.read()
-
-    print(f"Loaded {len(text):,} characters")
-
-    # Preprocess text
-    preprocessor = TextPreprocessor()
-    tokens = preprocessor.preprocess_text(text)
+        if output_filename is not None:
+            output = open(output_filename, 'w', encoding='utf-8')
+        if token_filename is not None:
+            token_file = TokenFileWriter(token_filename)
+        writing = output is not None or token_file is not None
+        merged = run(write_shard if writing else None)
+    finally:
+        if output is not None:
+            output.close()
+        if token_file is not None:
+            token_file.close()
+
+    total = merged['growth_tokens']
+    raw_growth = growth_from_positions(
+        merged['new_term_positions'], total,
+        checkpoints_upto(linear_checkpoints(), total))
+
+    total = merged['total_tokens']
+    processed_growth = growth_from_positions(
+        merged['new_counted_positions'], total,
+        checkpoints_upto(linear_checkpoints(), total))
+
+    return merged['token_counts'], raw_growth, processed_growth
+
+def preprocess_collection(filename, preprocessor, output_filename=None, workers=1,
+                          token_filename=None, profiler=NULL_PROFILER):
+    """Preprocess a collection in one pass, writing the requested outputs.
+
+    Returns (token_counts, raw_growth_data, processed_growth_data).
+    """
+    def preprocess(source, tokenizer=None):
+        statistics = CollectionStatistics(preprocessor, profiler=profiler, tokenizer=tokenizer)
+        output = token_file = None
+        try:
+            if output_filename is not None:
+                output = open(output_filename, 'w', encoding='utf-8')
+            if token_filename is not None:
+                token_file = TokenFileWriter(token_filename)
+            return statistics.consume(source, output, token_file)
+        finally:
+            if output is not None:
+                output.close()
+            if token_file is not None:
+                token_file.close()
+
+    if workers > 1 and can_shard(filename):
+        # Stages run inside the workers, so only the total is timed
+        with profiler.stage('preprocess_sharded'):
+            return process_sharded(filename, preprocessor, output_filename, workers,
+                                   token_filename)
+
+    if preprocessor.tokenizes_bytes:
+        # Memory-mapped, and only non-ASCII lines are decoded
+        statistics = read_collection_bytes(filename, preprocess)
+    else:
+        statistics = read_collection(filename, preprocess)
+    return (statistics.token_counts, statistics.raw_growth_data(),
+            statistics.processed_growth_data())
+
+def process_collection(filename, collection_name, preprocessor=None,
+                       output_filename=None, workers=1, token_filename=None,
+                       cache=None, profiler=NULL_PROFILER):
+    """Process a single text collection through complete analysis pipeline.
+
+    The collection is streamed (and decompressed on the fly if it is gzip,
+    bz2 or xz) and read only once, so memory use depends on the vocabulary
+    size rather than the corpus size. If output_filename is given, the preprocessed tokens
+    are written there as they are produced, and if token_filename is given,
+    also to a binary token file (see lab1_tokenfile) with one document per
+    line. With workers > 1, uncompressed
+    collections are split into shards processed in parallel.
+
+    With a PreprocessingCache, results for an unchanged file and pipeline
+    are loaded from the cache (and the outputs written from its token
+    file) instead of being recomputed. A Profiler records per-stage
+    timings and run facts such as stem cache hit rates.
+    """
+    from lab1_termstats import TermStatistics
 
-    print(f"Generated {len(tokens):,} tokens after preprocessing")
+    print(f"\nProcessing {collection_name}...")
 
-    # Count frequencies
-    token_counts = Counter(tokens)
-    print(f"Unique terms: {len(token_counts):,}")
+    if preprocessor is None:
+        preprocessor = TextPreprocessor()
+
+    cached = None
+    if cache is not None:
+        with profiler.stage('cache_lookup'):
+            key = cache.key(filename, preprocessor)
+            cached = cache.get(key)
+        profiler.set('cache_hit', cached is not None)
+
+    if cached is not None:
+        print("Loaded preprocessing results from cache")
+        token_counts = cached['token_counts']
+        raw_growth = cached['raw_growth']
+        processed_growth = cached['processed_growth']
+        with profiler.stage('write'):
+            if output_filename is not None:
+                with TokenFileReader(cached['token_file']) as reader, \
+                        open(output_filename, 'w', encoding='utf-8') as output:
+                    reader.write_text(output)
+            if token_filename is not None:
+                shutil.copyfile(cached['token_file'], token_filename)
+    elif cache is None:
+        # Preprocess, count frequencies and track growth in one pass
+        token_counts, raw_growth, processed_growth = preprocess_collection(
+            filename, preprocessor, output_filename, workers, token_filename, profiler)
+    else:
+        # The token stream is always kept when caching
+        pending = cache.new_token_file()
+        try:
+            token_counts, raw_growth, processed_growth = preprocess_collection(
+                filename, preprocessor, output_filename, workers, pending, profiler)
+            with profiler.stage('cache_store'):
+                if token_filename is not None:
+                    shutil.copyfile(pending, token_filename)
+                cache.put(key, filename, token_counts, raw_growth, processed_growth, pending)
+        finally:
+            if os.path.exists(pending):
+                os.remove(pending)
+
+    # Swap the Counter for a compact table; the analyses below run on its arrays
+    with profiler.stage('term_table', len(token_counts)):
+        term_stats = TermStatistics.from_counts(token_counts)
+        del token_counts
+    total_tokens = term_stats.total
+
+    print(f"Generated {total_tokens:,} tokens after preprocessing")
+    stem_cache = preprocessor.stemmer.cache_info()
+    if stem_cache['hits'] + stem_cache['misses']:
+        print(f"Stem cache: {stem_cache['size']:,} entries, "
+              f"hit rate {stem_cache['hit_rate']:.1%}")
+        profiler.set('stem_cache', stem_cache)
+    print(f"Unique terms: {len(term_stats):,}")
+    profiler.set('tokens', total_tokens)
+    profiler.set('unique_terms', len(term_stats))
 
     # Analyze Zipf's law
-    zipf_results = analyze_zipf_law(token_counts)
+    with profiler.stage('zipf', len(term_stats)):
+        zipf_results = analyze_zipf_law(term_stats)
     print(f"Zipf analysis: alpha = {zipf_results['alpha']:.3f}, k = {zipf_results['k']:.1f}")
 
     # Analyze Benford's law
-    benford_results = analyze_benford_law(list(token_counts.values()))
+    with profiler.stage('benford', len(term_stats)):
+        benford_results = analyze_benford_law(term_stats.counts)
     print(f"Benford analysis: {len(benford_results['all_digits'])} digit categories")
 
     # Analyze vocabulary growth
-    growth_results = analyze_vocabulary_growth(text)
+    with profiler.stage('heaps', len(raw_growth) + len(processed_growth)):
+        growth_results = fit_vocabulary_growth(raw_growth)
+        processed_growth_results = fit_vocabulary_growth(processed_growth)
     print(f"Heap's law: k = {growth_results['k']:.1f}, b = {growth_results['b']:.3f}")
+    print(f"Heap's law (preprocessed): k = {processed_growth_results['k']:.1f}, "
+          f"b = {processed_growth_results['b']:.3f}")
 
     return {
-        'tokens': tokens,
-        'token_counts': token_counts,
+        'total_tokens': total_tokens,
+        'term_stats': term_stats,
         'zipf': zipf_results,
         'benford': benford_results,
-        'growth': growth_results
+        'growth': growth_results,
+        'processed_growth': processed_growth_results
     }
 
-def create_plots(results, collection_name):
-    """Create visualization plots for analysis results."""
-    fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(15, 10))
-    fig.suptitle(f'{collection_name} - Text Analysis Results')
-
-    # Zipf's law plot
-    zipf = results['zipf']
-    ax1.loglog(zipf['ranks'], zipf['frequencies'])
-    ax1.set_xlabel('Rank')
-    ax1.set_ylabel('Frequency')
-    ax1.set_title(f"Zipf's Law (α = {zipf['alpha']:.3f})")
-    ax1.grid(True)
-
-    # Benford's law plot
-    benford = results['benford']
-    digits = list(range(1, 10))
-    all_counts = [benford['all_digits'].get(d, 0) for d in digits]
-    filtered_counts = [benford['filtered_digits'].get(d, 0) for d in digits]
-    expected = [benford['benford_expected'][d] * sum(all_counts) for d in digits]
-
-    x = np.arange(len(digits))
-    width = 0.25
-
-    ax2.bar(x - width, all_counts, width, label='All frequencies')
-    ax2.bar(x, filtered_counts, width, label='Frequencies ≥ 10')
-    ax2.bar(x + width, expected, width, label='Benford expected')
-    ax2.set_xlabel('First Digit')
-    ax2.set_ylabel('Count')
-    ax2.set_title("Benford's Law Distribution")
-    ax2.set_xticks(x)
-    ax2.set_xticklabels(digits)
-    ax2.legend()
-
-    # Vocabulary growth plot
-    growth = results['growth']
-    ax3.plot(growth['n_values'], growth['v_values'], 'b-', label='Observed')
-
-    # Plot fitted curve
-    fitted_v = [growth['k'] * (n ** growth['b']) for n in growth['n_values']]
-    ax3.plot(growth['n_values'], fitted_v, 'r--', label=f"Fitted: V = {growth['k']:.1f} × N^{growth['b']:.3f}")
-
-    ax3.set_xlabel('Total Terms (N)')
-    ax3.set_ylabel('Unique Terms (V)')
-    ax3.set_title("Vocabulary Growth (Heap's Law)")
-    ax3.legend()
-    ax3.grid(True)
-
-    # Distribution of term frequencies
-    freq_dist = Counter(results['token_counts'].values())
-    frequencies = sorted(freq_dist.keys())
-    counts = [freq_dist[f] for f in frequencies]
-
-    ax4.loglog(frequencies, counts)
-    ax4.set_xlabel('Term Frequency')
-    ax4.set_ylabel('Number of Terms')
-    ax4.set_title('Term Frequency Distribution')
-    ax4.grid(True)
-
-    plt.tight_layout()
-    plt.savefig(f'{collection_name.lower().replace(" ", "_")}_analysis.png', dpi=300, bbox_inches='tight')
-    plt.close()
-
-def main():
-    """Main analysis function."""
-    collections = [
-        ('pg10.txt', 'Bible'),
-        ('quran.txt', 'Quran'),
-        ('abstracts.wiki.txt', 'Wikipedia')
-    ]
-
-    all_results = {}
-
-    for filename, name in collections:
+STEM_CACHE_FILE = 'stem_cache.json'
+
+def analyze_collection_job(job):
+    """Preprocess and analyze one collection in a worker process.
+
+    job is (filename, name, token_filename, workers). Output printed along
+    the way is captured so collections running side by side do not
+    interleave. Returns (log, results, profiler, stems), with results None
+    if the collection failed; stems are the worker's cached stems. The
+    profiler keeps running for the rendering stages (see render_collection).
+    """
+    filename, name, token_filename, workers = job
+    log = io.StringIO()
+    with redirect_stdout(log):
+        preprocessor = TextPreprocessor(stem_cache_file=STEM_CACHE_FILE)
+        profiler = Profiler(name)
         try:
-            results = process_collection(filename, name)
-            all_results[name] = results
-            create_plots(results, name)
-
-            # Save preprocessed tokens
-            output_filename = f'{name.lower()}_preprocessed.txt'
-            with open(output_filename, 'w', encoding='utf-8') as f:
-                f.write(' '.join(results['tokens']))
-            print(f"Saved preprocessed text to {output_filename}")
-
+            # The text output is written later from the token file, off the critical path
+            results = process_collection(find_collection(filename) or filename,
+                                         name, preprocessor, workers=workers,
+                                         token_filename=token_filename,
+                                         cache=PreprocessingCache(), profiler=profiler)
         except Exception as e:
             print(f"Error processing {name}: {e}")
+            return log.getvalue(), None, None, {}
+    return log.getvalue(), results, profiler, preprocessor.stemmer.cached_stems()
+
+def render_collection(results, name, token_filename, output_filename, profiler,
+                      plots=True):
+    """Write the preprocessed text and plots of an analyzed collection, then stop the profiler."""
+    try:
+        with profiler.stage('write_text'):
+            with TokenFileReader(token_filename) as reader, \
+                    open(output_filename, 'w', encoding='utf-8') as output:
+                reader.write_text(output)
+        if plots:
+            from lab1_plotting import create_plots
+            with profiler.stage('plot'):
+                profiler.set('plot_rendered', create_plots(results, name) is not None)
+    finally:
+        profiler.finish()
+
+def run_collections(collections, jobs=None, plots=True):
+    """Analyze collections in parallel processes and render them in the background.
+
+    Each collection is preprocessed and analyzed in its own worker, with the
+    cores split between the workers for sharding. As each one finishes, its
+    text output and plots are rendered on a background thread while the
+    others are still being analyzed. Yields (name, log, results, profiler)
+    in collection order; results is None for a collection that failed.
+    plots=False skips the figures, e.g. for batch runs. Stems learned by the workers are added to the saved stem cache.
+    """
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+    cpus = os.cpu_count() or 1
+    jobs = jobs or max(1, min(len(collections), cpus))
+    workers = max(1, cpus // jobs)
+
+    names = [name for _, name in collections]
+    analyses = {}
+    rendering = {}
+    stemmer = FastPorterStemmer(cache_file=STEM_CACHE_FILE)
+
+    with ProcessPoolExecutor(jobs) as pool, ThreadPoolExecutor(1) as background:
+        for filename, name in collections:
+            job = (filename, name, f'{name.lower()}_preprocessed.tok', workers)
+            analyses[pool.submit(analyze_collection_job, job)] = name
+
+        for future in as_completed(analyses):
+            name = analyses[future]
+            try:
+                log, results, profiler, stems = future.result()
+            except Exception as e:
+                # The worker died or its results could not be sent back;
+                # the other collections carry on
+                log, results, profiler, stems = f"Error processing {name}: {e}\n", None, None, {}
+            stemmer.merge_cache(stems)
+            if results is not None:
+                rendering[name] = background.submit(
+                    render_collection, results, name, f'{name.lower()}_preprocessed.tok',
+                    f'{name.lower()}_preprocessed.txt', profiler, plots)
+            analyses[future] = (name, log, results, profiler)
+
+        finished = {entry[0]: entry for entry in analyses.values()}
+        for name in names:
+            name, log, results, profiler = finished[name]
+            if name in rendering:
+                try:
+                    rendering[name].result()
+                except Exception as e:
+                    log += f"Error rendering {name}: {e}\n"
+            yield name, log, results, profiler
+
+    stemmer.save_cache()
+
+def analyze_collections(collections, plots=True, jobs=None, profile_file='lab1_profile.json'):
+    """Analyze (filename, name) collections, print their results and a comparison.
+
+    Returns a dict of results by collection name. Stage timings are saved
+    to profile_file unless it is None.
+    """
+    all_results = {}
+    reports = []
+
+    # Collections run side by side; output is printed in collection order
+    for name, log, results, profiler in run_collections(collections, jobs, plots):
+        print(log, end='')
+        if results is None:
+            continue
+        print(f"Saved preprocessed text to {name.lower()}_preprocessed.txt "
+              f"and {name.lower()}_preprocessed.tok")
+        all_results[name] = results
+        profiler.summary()
+        reports.append(profiler.report())
+
+    if reports and profile_file is not None:
+        save_reports(reports, profile_file)
+        print(f"Saved stage timings to {profile_file}")
 
     # Create comparison summary
     print("\n" + "="*60)
@@ -478,13 +1131,29 @@ def main():
     print("-"*60)
 
     for name, results in all_results.items():
-        tokens = len(results['tokens'])
-        unique = len(results['token_counts'])
+        tokens = results['total_tokens']
+        unique = len(results['term_stats'])
         zipf_alpha = results['zipf']['alpha']
         heap_k = results['growth']['k']
         heap_b = results['growth']['b']
 
         print(f"{name:<12} {tokens:<10,} {unique:<8,} {zipf_alpha:<8.3f} {heap_k:<8.1f} {heap_b:<8.3f}")
 
+    return all_results
+
+def main():
+    """Main analysis function.
+
+    Pass --no-plots to skip rendering the figures. lab1_cli.py runs the
+    same analysis on any collections.
+    """
+    plots = '--no-plots' not in sys.argv[1:]
+    collections = [
+        ('pg10.txt', 'Bible'),
+        ('quran.txt', 'Quran'),
+        ('abstracts.wiki.txt', 'Wikipedia')
+    ]
+    analyze_collections(collections, plots)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
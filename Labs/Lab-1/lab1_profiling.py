@@ -0,0 +1,167 @@
+"""
+Lab 1: Pipeline Profiling
+Records wall time, CPU time and item counts per pipeline stage (read,
+tokenize, stop, stem, count, each law analysis, plotting) for one
+collection, plus peak memory and any extra facts such as stem cache hit
+rates. Reports are plain dicts that serialize to JSON.
+
+Code that is instrumented takes a profiler argument defaulting to
+NULL_PROFILER, whose hooks do nothing, so uninstrumented runs only pay
+for a no-op call per chunk.
+"""
+
+import sys
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+def peak_rss_bytes():
+    """Peak resident set size of this process, or None if unavailable."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+class Profiler:
+    """Per-stage timings for one collection.
+
+    Stages may be entered many times (once per chunk); their times and item
+    counts accumulate. With trace_memory, tracemalloc also records the peak
+    Python heap size, at a noticeable cost in speed.
+
+    A profiler sent to another process (e.g. returned by a worker) keeps
+    its clocks running there: the time spent so far and the peak RSS are
+    carried over, so finish() can be called after later stages.
+    """
+
+    enabled = True
+
+    def __init__(self, name='', trace_memory=False):
+        self.name = name
+        self.stages = {}
+        self.info = {}
+        self.trace_memory = trace_memory and not tracemalloc.is_tracing()
+        if self.trace_memory:
+            tracemalloc.start()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._peak_rss = None
+        self.total = None
+
+    def __getstate__(self):
+        # Clocks are per process, so pickle the time elapsed instead
+        state = dict(self.__dict__)
+        state['_wall'] = time.perf_counter() - self._wall
+        state['_cpu'] = time.process_time() - self._cpu
+        state['_peak_rss'] = self._max_peak_rss()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._wall = time.perf_counter() - self._wall
+        self._cpu = time.process_time() - self._cpu
+
+    def _max_peak_rss(self):
+        peaks = [peak for peak in (self._peak_rss, peak_rss_bytes()) if peak is not None]
+        return max(peaks) if peaks else None
+
+    @contextmanager
+    def stage(self, name, items=0):
+        """Time the enclosed block as (part of) stage name."""
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - wall, time.process_time() - cpu, items)
+
+    def _stage(self, name):
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = {'wall': 0.0, 'cpu': 0.0, 'items': 0, 'calls': 0}
+        return stage
+
+    def record(self, name, wall, cpu, items=0):
+        """Add one measurement to a stage."""
+        stage = self._stage(name)
+        stage['wall'] += wall
+        stage['cpu'] += cpu
+        stage['items'] += items
+        stage['calls'] += 1
+
+    def count(self, name, items):
+        """Add items processed to a stage without timing anything."""
+        self._stage(name)['items'] += items
+
+    def set(self, key, value):
+        """Attach an extra fact (e.g. stem cache statistics) to the report."""
+        self.info[key] = value
+
+    def finish(self):
+        """Stop the clocks (and memory tracing); returns the report."""
+        if self.total is None:
+            self.total = {'wall': time.perf_counter() - self._wall,
+                          'cpu': time.process_time() - self._cpu}
+            self.total['peak_rss'] = self._max_peak_rss()
+            if self.trace_memory:
+                self.total['peak_traced'] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+        return self.report()
+
+    def report(self):
+        """The measurements as a JSON-serializable dict."""
+        stages = {}
+        for name, stage in self.stages.items():
+            stages[name] = dict(stage)
+            stages[name]['items_per_sec'] = (stage['items'] / stage['wall']
+                                             if stage['wall'] else None)
+        return {'collection': self.name, 'total': self.total,
+                'stages': stages, 'info': self.info}
+
+    def to_json(self):
+        return json.dumps(self.report(), indent=2)
+
+    def summary(self):
+        """Print a table of stages."""
+        print(f"{'Stage':<16} {'Wall':>9} {'CPU':>9} {'Items':>12} {'Items/sec':>12}")
+        print("-" * 62)
+        for name, stage in self.report()['stages'].items():
+            rate = f"{stage['items_per_sec']:,.0f}" if stage['items'] and stage['wall'] else ''
+            print(f"{name:<16} {stage['wall']:>8.3f}s {stage['cpu']:>8.3f}s "
+                  f"{stage['items']:>12,} {rate:>12}")
+        if self.total:
+            print(f"{'total':<16} {self.total['wall']:>8.3f}s {self.total['cpu']:>8.3f}s")
+
+class NullProfiler:
+    """Profiler stand-in whose hooks do nothing."""
+
+    enabled = False
+
+    def stage(self, name, items=0):
+        return nullcontext()
+
+    def record(self, name, wall, cpu, items=0):
+        pass
+
+    def count(self, name, items):
+        pass
+
+    def set(self, key, value):
+        pass
+
+    def finish(self):
+        return None
+
+NULL_PROFILER = NullProfiler()
+
+def save_reports(reports, filename):
+    """Write a list of profiler reports as JSON."""
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(reports, f, indent=2)
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+Lab 1: Boolean, Phrase and Proximity Search
+Evaluates queries against an index built by lab1_index. Supports AND, OR,
+NOT, parentheses, quoted phrases and #N(term1, term2) proximity queries,
+whose operands may also be phrases; adjacent operands are ANDed. Query
+terms go through the same tokenize/stop/stem pipeline as the indexed
+documents.
+
+Every operator is a lazy cursor over doc ids that can skip ahead:
+intersections leapfrog between operands using the index's skip pointers,
+and phrase/proximity matches merge position lists of candidate documents
+only, so no intermediate result list is built.
+
+Usage:
+    python lab1_query.py index_prefix [query ...]
+"""
+
+import re
+import sys
+from bisect import bisect_right
+
+from lab1_index import InvertedIndex
+from lab1_preprocessing import TextPreprocessor
+
+QUERY_TOKEN_PATTERN = re.compile(r'"[^"]*"|#\d+\(|[(),]|\w+')
+
+OPERATORS = {'AND', 'OR', 'NOT'}
+
+class EmptyCursor:
+    """Cursor over no documents."""
+
+    doc = None
+
+    def next(self):
+        pass
+
+    def advance(self, target):
+        pass
+
+class PostingsCursor:
+    """Walks one term's postings in doc order.
+
+    advance() gallops over the term's skip pointers with a binary search
+    starting from the last pointer used, then scans at most SKIP_INTERVAL
+    documents.
+    """
+
+    def __init__(self, postings, skips):
+        self.postings = postings
+        self.skip_docs = skips[0::2]
+        self.skip_offsets = skips[1::2]
+        self.skip = 0
+        self.i = 0
+        self.doc = postings[0] if postings else None
+
+    def next(self):
+        postings = self.postings
+        self.i += 2 + postings[self.i + 1]
+        self.doc = postings[self.i] if self.i < len(postings) else None
+
+    def advance(self, target):
+        """Move to the first document >= target."""
+        if self.doc is None or self.doc >= target:
+            return
+
+        k = bisect_right(self.skip_docs, target, self.skip) - 1
+        if k >= self.skip and self.skip_offsets[k] > self.i:
+            self.skip = k
+            self.i = self.skip_offsets[k]
+            self.doc = self.postings[self.i]
+
+        while self.doc is not None and self.doc < target:
+            self.next()
+
+    def tf(self):
+        """Frequency of the term in the current document."""
+        return self.postings[self.i + 1]
+
+    def positions(self):
+        """Positions of the term in the current document."""
+        i = self.i
+        return self.postings[i + 2:i + 2 + self.postings[i + 1]]
+
+class AndCursor:
+    """Documents matched by every operand (leapfrog intersection)."""
+
+    def __init__(self, operands):
+        self.operands = operands
+        self._align()
+
+    def _align(self):
+        operands = self.operands
+        while True:
+            target = 0
+            for operand in operands:
+                if operand.doc is None:
+                    self.doc = None
+                    return
+                target = max(target, operand.doc)
+
+            for operand in operands:
+                operand.advance(target)
+                if operand.doc is None:
+                    self.doc = None
+                    return
+
+            if all(operand.doc == target for operand in operands):
+                self.doc = target
+                return
+
+    def next(self):
+        self.operands[0].next()
+        self._align()
+
+    def advance(self, target):
+        for operand in self.operands:
+            operand.advance(target)
+        self._align()
+
+class OrCursor:
+    """Documents matched by any operand."""
+
+    def __init__(self, operands):
+        self.operands = operands
+        self._update()
+
+    def _update(self):
+        docs = [operand.doc for operand in self.operands if operand.doc is not None]
+        self.doc = min(docs) if docs else None
+
+    def next(self):
+        for operand in self.operands:
+            if operand.doc == self.doc:
+                operand.next()
+        self._update()
+
+    def advance(self, target):
+        for operand in self.operands:
+            operand.advance(target)
+        self._update()
+
+class NotCursor:
+    """Documents 1..documents not matched by the operand."""
+
+    def __init__(self, operand, documents):
+        self.operand = operand
+        self.documents = documents
+        self._seek(1)
+
+    def _seek(self, candidate):
+        operand = self.operand
+        while candidate <= self.documents:
+            operand.advance(candidate)
+            if operand.doc != candidate:
+                self.doc = candidate
+                return
+            candidate += 1
+        self.doc = None
+
+    def next(self):
+        self._seek(self.doc + 1)
+
+    def advance(self, target):
+        if self.doc is not None and self.doc < target:
+            self._seek(target)
+
+class PositionalCursor(AndCursor):
+    """Documents containing all terms, where their positions also match."""
+
+    def __init__(self, cursors):
+        super().__init__(cursors)
+        self._check()
+
+    def _check(self):
+        while self.doc is not None and not self.matches(
+                [cursor.positions() for cursor in self.operands]):
+            AndCursor.next(self)
+
+    def matches(self, positions):
+        raise NotImplementedError
+
+    def next(self):
+        AndCursor.next(self)
+        self._check()
+
+    def advance(self, target):
+        AndCursor.advance(self, target)
+        self._check()
+
+def follows(first, second, offset):
+    """Positions p in first with p + offset in second (both sorted)."""
+    result = []
+    j = 0
+    for p in first:
+        target = p + offset
+        while j < len(second) and second[j] < target:
+            j += 1
+        if j == len(second):
+            break
+        if second[j] == target:
+            result.append(p)
+    return result
+
+def within(first, second, distance, first_length=1, second_length=1):
+    """Whether spans starting at the sorted positions are at most distance apart.
+
+    Spans are first_length and second_length positions long (phrases); the
+    distance is between the closest positions of two spans, so adjacent
+    or overlapping spans are always within it.
+    """
+    j = 0
+    for p in first:
+        # Starts of second spans that end at least p - distance
+        low = p - distance - second_length + 1
+        while j < len(second) and second[j] < low:
+            j += 1
+        if j == len(second):
+            return False
+        # ... and begin at most distance after this span's last position
+        if second[j] <= p + first_length - 1 + distance:
+            return True
+    return False
+
+class PhraseCursor(PositionalCursor):
+    """Documents containing the terms at consecutive positions."""
+
+    def __init__(self, cursors):
+        self.starts = []
+        super().__init__(cursors)
+
+    @property
+    def length(self):
+        return len(self.operands)
+
+    def matches(self, positions):
+        starts = positions[0]
+        for offset, term_positions in enumerate(positions[1:], 1):
+            starts = follows(starts, term_positions, offset)
+            if not starts:
+                return False
+        self.starts = starts
+        return True
+
+    def positions(self):
+        """Positions where the phrase starts in the current document."""
+        return self.starts
+
+class ProximityCursor(PositionalCursor):
+    """Documents containing two terms or phrases at most distance positions apart."""
+
+    def __init__(self, cursors, distance):
+        self.distance = distance
+        self.lengths = [getattr(cursor, 'length', 1) for cursor in cursors]
+        super().__init__(cursors)
+
+    def matches(self, positions):
+        return within(positions[0], positions[1], self.distance, *self.lengths)
+
+class QueryEngine:
+    """Parses and evaluates queries against an InvertedIndex."""
+
+    def __init__(self, index, preprocessor=None):
+        self.index = index
+        self.preprocessor = preprocessor or TextPreprocessor()
+
+    def search(self, query, limit=None):
+        """Return matching doc ids in increasing order."""
+        cursor = self.parse(query)
+        results = []
+        while cursor.doc is not None:
+            results.append(cursor.doc)
+            if limit and len(results) >= limit:
+                break
+            cursor.next()
+        return results
+
+    def parse(self, query):
+        """Build a cursor tree for query; raises ValueError on bad syntax."""
+        self._tokens = QUERY_TOKEN_PATTERN.findall(query)
+        self._position = 0
+
+        cursor = self._parse_or()
+        if self._peek() is not None:
+            raise ValueError(f"Unexpected {self._peek()!r} in query {query!r}")
+        # None means every operand was a stop word
+        return cursor if cursor is not None else EmptyCursor()
+
+    def _peek(self):
+        if self._position < len(self._tokens):
+            return self._tokens[self._position]
+        return None
+
+    def _take(self, expected=None):
+        token = self._peek()
+        if token is None or (expected is not None and token != expected):
+            wanted = repr(expected) if expected else 'an operand'
+            raise ValueError(f"Expected {wanted}, found {token!r}")
+        self._position += 1
+        return token
+
+    def _parse_or(self):
+        operands = [self._parse_and()]
+        while self._peek() == 'OR':
+            self._take()
+            operands.append(self._parse_and())
+        return self._combine(OrCursor, operands)
+
+    def _parse_and(self):
+        operands = [self._parse_not()]
+        while self._peek() not in (None, 'OR', ')'):
+            if self._peek() == 'AND':
+                self._take()
+            operands.append(self._parse_not())
+        return self._combine(AndCursor, operands)
+
+    def _parse_not(self):
+        if self._peek() == 'NOT':
+            self._take()
+            operand = self._parse_not()
+            if operand is None:
+                return None
+            return NotCursor(operand, self.index.documents)
+        return self._parse_primary()
+
+    def _parse_primary(self):
+        token = self._take()
+
+        if token == '(':
+            cursor = self._parse_or()
+            self._take(')')
+            return cursor
+
+        if token.startswith('"'):
+            return self._phrase(self._terms(token[1:-1]))
+
+        if token.startswith('#'):
+            distance = int(token[1:-1])
+            first = self._terms(self._take())
+            self._take(',')
+            second = self._terms(self._take())
+            self._take(')')
+            if not first or not second:
+                return None
+            return ProximityCursor([self._phrase(first), self._phrase(second)], distance)
+
+        if token in OPERATORS or token in (',', ')'):
+            raise ValueError(f"Unexpected {token!r} in query")
+
+        return self._phrase(self._terms(token))
+
+    @staticmethod
+    def _combine(cursor_class, operands):
+        """Join operands, dropping those that were only stop words."""
+        operands = [operand for operand in operands if operand is not None]
+        if not operands:
+            return None
+        if len(operands) == 1:
+            return operands[0]
+        return cursor_class(operands)
+
+    def _terms(self, text):
+        """Run query text through the same pipeline as the documents."""
+        return self.preprocessor.preprocess_tokens(self.preprocessor.tokenize(text))
+
+    def _phrase(self, terms):
+        """Cursor for one term, or for a phrase of several."""
+        if not terms:
+            return None
+        cursors = [self._cursor(term) for term in terms]
+        if len(cursors) == 1:
+            return cursors[0]
+        if any(cursor.doc is None for cursor in cursors):
+            return EmptyCursor()
+        return PhraseCursor(cursors)
+
+    def _cursor(self, term):
+        if term not in self.index:
+            return EmptyCursor()
+        return PostingsCursor(self.index.raw_postings(term), self.index.skips(term))
+
+def run_queries(index_prefix, queries):
+    """Print the documents matching each query in an iterable of query strings."""
+    with InvertedIndex(index_prefix) as index:
+        engine = QueryEngine(index)
+        for query in queries:
+            if not query:
+                continue
+            try:
+                results = engine.search(query)
+            except ValueError as e:
+                print(f"Error: {e}")
+                continue
+            shown = ' '.join(str(doc) for doc in results[:20])
+            more = ' ...' if len(results) > 20 else ''
+            print(f"{query}: {len(results):,} documents: {shown}{more}")
+
+def main():
+    """Run the queries given on the command line, or read them from stdin."""
+    if len(sys.argv) < 2:
+        print(__doc__.strip())
+        return 2
+
+    run_queries(sys.argv[1], sys.argv[2:] or (line.strip() for line in sys.stdin))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
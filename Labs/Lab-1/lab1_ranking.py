@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Lab 1: Ranked Retrieval
+Scores documents in an index built by lab1_index with TF-IDF or BM25 and
+returns the top k (doc id, score) pairs. Document lengths, document
+frequencies and each term's highest tf and shortest document are stored at
+index time, which gives every query term an upper bound on its score
+contribution.
+
+Top-k search uses MaxScore: terms are split into "essential" ones, which
+generate candidate documents, and "non-essential" ones whose bounds
+together cannot lift a document into the current top k. Non-essential
+terms are only looked up (via skip pointers) for candidates that can
+still make it, so long postings of common terms are mostly skipped.
+
+Usage:
+    python lab1_ranking.py index_prefix [tfidf|bm25] [query ...]
+"""
+
+import sys
+import math
+import heapq
+from collections import Counter, defaultdict
+
+from lab1_index import InvertedIndex
+from lab1_preprocessing import TextPreprocessor
+from lab1_query import PostingsCursor
+
+class TFIDFScorer:
+    """Lab TF-IDF weighting: (1 + log10 tf) * log10(N / df)."""
+
+    def __init__(self, index):
+        self.documents = index.documents
+
+    def term_weight(self, df):
+        return math.log10(self.documents / df)
+
+    def score(self, weight, tf, doc_length):
+        return (1 + math.log10(tf)) * weight
+
+class BM25Scorer:
+    """Okapi BM25 with the non-negative idf log(1 + (N - df + 0.5) / (df + 0.5))."""
+
+    def __init__(self, index, k1=1.2, b=0.75):
+        self.documents = index.documents
+        self.average_length = index.average_document_length or 1.0
+        self.k1 = k1
+        self.b = b
+
+    def term_weight(self, df):
+        return math.log(1 + (self.documents - df + 0.5) / (df + 0.5))
+
+    def score(self, weight, tf, doc_length):
+        norm = self.k1 * (1 - self.b + self.b * doc_length / self.average_length)
+        return weight * tf * (self.k1 + 1) / (tf + norm)
+
+SCORERS = {'tfidf': TFIDFScorer, 'bm25': BM25Scorer}
+
+class RankedRetriever:
+    """Top-k ranked retrieval over an InvertedIndex."""
+
+    def __init__(self, index, preprocessor=None, scorer=None):
+        self.index = index
+        self.preprocessor = preprocessor or TextPreprocessor()
+        self.scorer = scorer or BM25Scorer(index)
+
+    def search(self, query, k=10, pruned=True):
+        """Return the k best (doc id, score) pairs, best first.
+
+        Ties are broken by lower doc id, so pruned and exhaustive search
+        return the same ranking.
+        """
+        terms = self._query_terms(query)
+        if not terms or k <= 0:
+            return []
+
+        if pruned:
+            top = self._max_score(terms, k)
+        else:
+            top = self._exhaustive(terms, k)
+        return [(-negative_doc, score) for score, negative_doc in top]
+
+    def _query_terms(self, query):
+        """(cursor, weight, upper bound) per distinct query term, by increasing bound.
+
+        A term repeated in the query has its weight multiplied accordingly.
+        """
+        index = self.index
+        scorer = self.scorer
+        tokens = self.preprocessor.preprocess_tokens(self.preprocessor.tokenize(query))
+
+        terms = []
+        for term, count in Counter(tokens).items():
+            if term not in index:
+                continue
+            weight = count * scorer.term_weight(index.document_frequency(term))
+            max_tf, min_length = index.score_bounds(term)
+            cursor = PostingsCursor(index.raw_postings(term), index.skips(term))
+            terms.append((cursor, weight, scorer.score(weight, max_tf, min_length)))
+
+        terms.sort(key=lambda term: term[2])
+        return terms
+
+    def _exhaustive(self, terms, k):
+        """Score every posting of every term (term at a time), then pick the top k."""
+        score = self.scorer.score
+        lengths = self.index.document_lengths
+        scores = defaultdict(float)
+
+        # Highest bound first, the order _max_score adds contributions in
+        for cursor, weight, _ in reversed(terms):
+            postings = cursor.postings
+            i = 0
+            while i < len(postings):
+                doc, tf = postings[i], postings[i + 1]
+                scores[doc] += score(weight, tf, lengths[doc - 1])
+                i += 2 + tf
+
+        return heapq.nlargest(k, ((total, -doc) for doc, total in scores.items()))
+
+    def _max_score(self, terms, k):
+        """Document-at-a-time top-k with MaxScore pruning.
+
+        The essential cursors are kept in a heap by their next document, so
+        finding the next candidate costs O(log terms) rather than a scan.
+        """
+        score = self.scorer.score
+        lengths = self.index.document_lengths
+        cursors = [cursor for cursor, _, _ in terms]
+        weights = [weight for _, weight, _ in terms]
+
+        # cumulative[i]: the most terms 0..i can add to any document
+        cumulative = []
+        total = 0.0
+        for _, _, bound in terms:
+            total += bound
+            cumulative.append(total)
+
+        # Min-heap of (score, -doc): the weakest of the top k is at heap[0]
+        heap = []
+        threshold = -1.0
+        essential = 0
+        count = len(terms)
+
+        # Min-heap of (next doc, -term) over the essential cursors, so the
+        # terms of a document come out highest bound first. Entries of terms
+        # that have become non-essential are dropped when they surface.
+        upcoming = [(cursor.doc, -i) for i, cursor in enumerate(cursors)
+                    if cursor.doc is not None]
+        heapq.heapify(upcoming)
+
+        while upcoming and essential < count:
+            doc = upcoming[0][0]
+            doc_length = lengths[doc - 1]
+
+            total = 0.0
+            matched = False
+            while upcoming and upcoming[0][0] == doc:
+                i = -upcoming[0][1]
+                if i < essential:
+                    heapq.heappop(upcoming)
+                    continue
+                matched = True
+                cursor = cursors[i]
+                total += score(weights[i], cursor.tf(), doc_length)
+                cursor.next()
+                if cursor.doc is None:
+                    heapq.heappop(upcoming)
+                else:
+                    heapq.heapreplace(upcoming, (cursor.doc, -i))
+            if not matched:
+                continue
+
+            for i in range(essential - 1, -1, -1):
+                if total + cumulative[i] <= threshold:
+                    break
+                cursor = cursors[i]
+                cursor.advance(doc)
+                if cursor.doc == doc:
+                    total += score(weights[i], cursor.tf(), doc_length)
+            else:
+                # Docs arrive in increasing order, so a tie never displaces
+                # an earlier (lower id) document
+                if len(heap) < k:
+                    heapq.heappush(heap, (total, -doc))
+                elif total > threshold:
+                    heapq.heapreplace(heap, (total, -doc))
+
+                if len(heap) == k:
+                    threshold = heap[0][0]
+                    while essential < count and cumulative[essential] <= threshold:
+                        essential += 1
+
+        return sorted(heap, reverse=True)
+
+def run_ranked_queries(index_prefix, queries, scorer='bm25', k=10):
+    """Print the top k documents for each query, scored by SCORERS[scorer]."""
+    with InvertedIndex(index_prefix) as index:
+        retriever = RankedRetriever(index, scorer=SCORERS[scorer](index))
+        for query in queries:
+            if not query:
+                continue
+            print(f"{query}:")
+            for rank, (doc, score) in enumerate(retriever.search(query, k), 1):
+                print(f"  {rank:>2}. doc {doc:<8} {score:.4f}")
+
+def main():
+    """Run the ranked queries given on the command line, or read them from stdin."""
+    if len(sys.argv) < 2:
+        print(__doc__.strip())
+        return 2
+
+    args = sys.argv[2:]
+    scorer = 'bm25'
+    if args and args[0] in SCORERS:
+        scorer = args.pop(0)
+
+    run_ranked_queries(sys.argv[1], args or (line.strip() for line in sys.stdin), scorer)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
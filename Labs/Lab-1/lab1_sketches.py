@@ -0,0 +1,229 @@
+"""
+Lab 1: Streaming Sketches
+Fixed-memory summaries of a token stream, for collections whose
+vocabulary does not fit in memory.
+
+SpaceSaving (Metwally, Agrawal and El Abbadi, 2005) monitors at most
+capacity terms. A term that is not monitored replaces the one with the
+smallest count and inherits that count as its possible overestimate, so
+every reported count c with error e satisfies c - e <= true count <= c,
+and every error is at most total / capacity. Any term with a true count
+above total / capacity is guaranteed to be monitored, which is what Zipf's
+head needs.
+
+HyperLogLog (Flajolet et al., 2007) estimates the number of distinct terms
+from 2^precision one-byte registers, with a relative standard error of
+about 1.04 / sqrt(2^precision): 1.6% in 4 KB at the default precision of
+12. It has update() and len() like a set, so it can stand in for the
+exact vocabulary of a VocabularyGrowthTracker.
+"""
+
+import math
+import heapq
+from collections import Counter
+from hashlib import blake2b
+
+import numpy as np
+
+from lab1_termstats import fit_power_law
+
+class SpaceSaving:
+    """Approximate heavy hitters and their counts with a bounded number of counters.
+
+    Batches are aggregated before they are applied, i.e. each distinct term
+    in a batch is one weighted update; the error bounds are the same as for
+    single tokens.
+    """
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        # One (count, term) entry per monitored term; counts only grow, so
+        # entries may be stale but never overstate a count
+        self._heap = []
+        self.total = 0
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __contains__(self, term):
+        return term in self.counts
+
+    def update(self, tokens):
+        """Add a batch of tokens."""
+        self.update_counts(Counter(tokens))
+
+    def update_counts(self, batch):
+        """Add a term -> count mapping."""
+        counts = self.counts
+        errors = self.errors
+        heap = self._heap
+
+        for term, weight in batch.items():
+            self.total += weight
+            if term in counts:
+                counts[term] += weight
+            elif len(counts) < self.capacity:
+                counts[term] = weight
+                errors[term] = 0
+                heapq.heappush(heap, (weight, term))
+            else:
+                minimum, victim = self._pop_minimum()
+                del counts[victim]
+                del errors[victim]
+                counts[term] = minimum + weight
+                errors[term] = minimum
+                heapq.heappush(heap, (minimum + weight, term))
+
+    def _pop_minimum(self):
+        """Remove and return (count, term) of the monitored term with the lowest count."""
+        heap = self._heap
+        counts = self.counts
+        while True:
+            count, term = heapq.heappop(heap)
+            if counts[term] == count:
+                return count, term
+            heapq.heappush(heap, (counts[term], term))
+
+    @property
+    def minimum(self):
+        """Upper bound on the count of any term that is not monitored."""
+        if len(self.counts) < self.capacity:
+            return 0
+        return min(self.counts.values())
+
+    @property
+    def max_error(self):
+        """Bound on the overestimate of any reported count (total / capacity)."""
+        return self.total / self.capacity
+
+    def estimate(self, term):
+        """(count, error) for a term; unmonitored terms get (0, minimum)."""
+        if term in self.counts:
+            return self.counts[term], self.errors[term]
+        return 0, self.minimum
+
+    def ranked(self):
+        """(term, count) pairs, highest count first (ties by term)."""
+        return sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))
+
+    def top(self, k=10):
+        """The k highest (term, count, error, guaranteed) entries, by count.
+
+        guaranteed is True when the term is certainly among the true top k:
+        its lowest possible count exceeds the (k+1)-th reported count.
+        """
+        entries = self.ranked()
+        threshold = entries[k][1] if len(entries) > k else self.minimum
+        return [(term, count, self.errors[term], count - self.errors[term] >= threshold)
+                for term, count in entries[:k]]
+
+    def rank_frequency(self, n=None):
+        """Estimated frequencies of ranks 1..n, with their error bounds.
+
+        Returns (counts, errors) lists. Only ranks whose counts are above
+        the minimum are reliable; see reliable_ranks.
+        """
+        entries = self.ranked()[:n]
+        return [count for _, count in entries], [self.errors[term] for term, _ in entries]
+
+    def reliable_ranks(self):
+        """Number of leading ranks whose terms certainly outnumber every unmonitored term."""
+        minimum = self.minimum
+        ranks = 0
+        for term, count in self.ranked():
+            if count - self.errors[term] <= minimum:
+                break
+            ranks += 1
+        return ranks
+
+def zipf_head(sketch, n=None):
+    """Fit Zipf's law to the reliable head of a SpaceSaving sketch.
+
+    Returns a dict like TermStatistics.zipf() without the log arrays, or
+    None if fewer than two ranks are reliable.
+    """
+    ranks = sketch.reliable_ranks() if n is None else min(n, sketch.reliable_ranks())
+    if ranks < 2:
+        return None
+    frequencies, errors = sketch.rank_frequency(ranks)
+    k, slope = fit_power_law(range(1, ranks + 1), frequencies)
+    return {
+        'ranks': list(range(1, ranks + 1)),
+        'frequencies': frequencies,
+        'errors': errors,
+        'alpha': -slope,
+        'k': k
+    }
+
+def stable_hashes(terms):
+    """64-bit BLAKE2b hashes of the UTF-8 bytes of each term, as a uint64 array.
+
+    Unlike hash(), which is salted per process, these are the same in every
+    run and every process.
+    """
+    digests = b''.join(blake2b(term.encode('utf-8'), digest_size=8).digest()
+                       for term in terms)
+    return np.frombuffer(digests, dtype='<u8').astype(np.uint64)
+
+class HyperLogLog:
+    """Approximate count of distinct terms in 2^precision bytes.
+
+    Terms (str) are hashed with stable_hashes, so estimates are
+    reproducible and sketches built in different processes, e.g. by shard
+    workers, can be merged.
+    """
+
+    def __init__(self, precision=12):
+        if not 4 <= precision <= 18:
+            raise ValueError("precision must be between 4 and 18")
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    @property
+    def size_bytes(self):
+        return self.registers.nbytes
+
+    @property
+    def relative_error(self):
+        """Standard error of the estimate, relative to the true count."""
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def update(self, terms):
+        """Add an iterable of terms."""
+        distinct = set(terms)
+        if not distinct:
+            return
+        hashes = stable_hashes(distinct)
+
+        precision = self.precision
+        index = (hashes >> np.uint64(64 - precision)).astype(np.intp)
+        # Rank = position of the first 1 bit after the index bits; the top 53
+        # of those bits convert to float exactly, and frexp gives their length
+        rest = hashes << np.uint64(precision)
+        bit_length = np.frexp((rest >> np.uint64(11)).astype(np.float64))[1]
+        rank = np.minimum(54 - bit_length, 65 - precision).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def estimate(self):
+        """Estimated number of distinct terms added."""
+        registers = self.registers
+        m = len(registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.ldexp(1.0, -registers.astype(np.int32)).sum()
+        if raw <= 2.5 * m:
+            # Small range correction: count empty registers instead
+            zeros = m - np.count_nonzero(registers)
+            if zeros:
+                return m * math.log(m / zeros)
+        return float(raw)
+
+    def __len__(self):
+        return int(round(self.estimate()))
+
+    def merge(self, other):
+        """Add the terms counted by another sketch of the same precision."""
+        if other.precision != self.precision:
+            raise ValueError("cannot merge sketches of different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
@@ -0,0 +1,84 @@
+"""
+Lab 1: Term Statistics
+A compact term-frequency table (a vocabulary array plus an int64 count
+array) and vectorized Zipf, Benford, frequency-of-frequencies and Heap's
+law computations over it. Replaces per-term Python objects and loops, so
+vocabularies in the millions take a few arrays and milliseconds.
+"""
+
+import math
+
+import numpy as np
+
+# 10^0 .. 10^18, every power that fits in an int64
+POWERS_OF_TEN = 10 ** np.arange(19, dtype=np.int64)
+
+def fit_power_law(x, y):
+    """Least-squares fit of log10 y = log10 k + slope * log10 x; returns (k, slope)."""
+    log_x = np.log10(np.asarray(x, dtype=np.float64))
+    log_y = np.log10(np.asarray(y, dtype=np.float64))
+    if len(log_x) < 2 or np.ptp(log_x) == 0:
+        return float(10 ** log_y.mean()), 0.0
+    slope, intercept = np.polyfit(log_x, log_y, 1)
+    return float(10 ** intercept), float(slope)
+
+def first_digits(values):
+    """Leading decimal digit of each positive integer, computed exactly."""
+    values = np.asarray(values, dtype=np.int64)
+    exponents = np.searchsorted(POWERS_OF_TEN, values, side='right') - 1
+    return values // POWERS_OF_TEN[exponents]
+
+class TermStatistics:
+    """Vocabulary and term frequencies, sorted by decreasing frequency.
+
+    Terms with equal counts keep their original order, as with
+    Counter.most_common().
+    """
+
+    def __init__(self, terms, counts):
+        counts = np.asarray(counts, dtype=np.int64)
+        order = np.argsort(-counts, kind='stable')
+        self.terms = np.asarray(terms, dtype=object)[order]
+        self.counts = counts[order]
+
+    @classmethod
+    def from_counts(cls, token_counts):
+        """Build the table from a Counter or other term -> count mapping."""
+        terms = np.fromiter(token_counts.keys(), dtype=object, count=len(token_counts))
+        counts = np.fromiter(token_counts.values(), dtype=np.int64, count=len(token_counts))
+        return cls(terms, counts)
+
+    def __len__(self):
+        return len(self.counts)
+
+    @property
+    def total(self):
+        """Total number of tokens counted."""
+        return int(self.counts.sum())
+
+    def most_common(self, n=None):
+        """(term, count) pairs, most frequent first."""
+        n = len(self) if n is None else n
+        return list(zip(self.terms[:n].tolist(), self.counts[:n].tolist()))
+
+    def zipf(self):
+        """Ranks and frequencies with the fitted Zipf exponent and constant."""
+        frequencies = self.counts[self.counts > 0]
+        ranks = np.arange(1, len(frequencies) + 1)
+        k, slope = fit_power_law(ranks, frequencies)
+        return {
+            'ranks': ranks,
+            'frequencies': frequencies,
+            'log_ranks': np.log10(ranks),
+            'log_frequencies': np.log10(frequencies),
+            'alpha': -slope,
+            'k': k
+        }
+
+    def frequency_of_frequencies(self):
+        """Distinct frequencies (ascending) and how many terms have each."""
+        return np.unique(self.counts, return_counts=True)
+
+def benford_expected():
+    """Benford's law probability of each leading digit 1..9."""
+    return {d: math.log10(1 + 1 / d) for d in range(1, 10)}
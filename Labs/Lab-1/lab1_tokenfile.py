@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Lab 1: Binary Token Files
+A compact on-disk format for preprocessed collections, so later stages can
+reload them without re-splitting text or rerunning preprocessing. Each
+line of the collection is one document; its stopped and stemmed tokens are
+stored as fixed-width term ids, which lets the reader memory-map the file
+and slice documents straight out of it.
+
+Layout (little-endian):
+    header      - MAGIC, then documents, tokens, vocabulary size,
+                  offsets start, vocabulary start, vocabulary bytes (uint64)
+    ids         - the token stream as uint32 term ids
+    offsets     - documents + 1 uint64 token offsets of document starts
+    vocabulary  - terms in id order, UTF-8, newline-separated
+
+Usage:
+    python lab1_tokenfile.py file.tok
+"""
+
+import os
+import sys
+import mmap
+import time
+import struct
+from array import array
+from collections import Counter
+
+from lab1_tokens import TermDictionary
+
+MAGIC = b'TTDSTOK1'
+HEADER = struct.Struct('<8s6Q')
+
+class TokenFileWriter:
+    """Writes documents of preprocessed tokens to a binary token file."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.f = open(filename, 'wb', buffering=1 << 20)
+        self.reset()
+
+    def reset(self):
+        """Discard everything written so far (e.g. when a collection is re-read)."""
+        self.f.seek(0)
+        self.f.truncate()
+        self.f.write(bytes(HEADER.size))
+        self.dictionary = TermDictionary()
+        self.offsets = array('Q', [0])
+
+    def add_document(self, tokens):
+        """Append one document's tokens."""
+        ids = self.dictionary.encode(tokens)
+        ids.tofile(self.f)
+        self.offsets.append(self.offsets[-1] + len(ids))
+
+    def close(self):
+        """Write the document offsets, vocabulary and header."""
+        if self.f.closed:
+            return
+        f = self.f
+        # Align the offsets to 8 bytes so they can be cast in place
+        f.write(bytes(-f.tell() % 8))
+        offsets_start = f.tell()
+        self.offsets.tofile(f)
+
+        vocabulary_start = f.tell()
+        vocabulary = '\n'.join(self.dictionary.terms).encode('utf-8')
+        f.write(vocabulary)
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, len(self.offsets) - 1, self.offsets[-1],
+                            len(self.dictionary), offsets_start,
+                            vocabulary_start, len(vocabulary)))
+        f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class TokenFileReader:
+    """Memory-mapped read access to a binary token file.
+
+    Opening a file only reads its header; ids and offsets are views into
+    the mapping and the vocabulary is decoded on first use.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, self.documents, self.tokens, self.vocabulary_size,
+         offsets_start, self._vocabulary_start, self._vocabulary_length) = \
+            HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{filename} is not a token file")
+
+        view = memoryview(self._mmap)
+        self.ids = view[HEADER.size:HEADER.size + 4 * self.tokens].cast('I')
+        self.offsets = view[offsets_start:offsets_start + 8 * (self.documents + 1)].cast('Q')
+        view.release()
+        self._vocabulary = None
+
+    @property
+    def vocabulary(self):
+        """Terms in id order."""
+        if self._vocabulary is None:
+            start = self._vocabulary_start
+            data = self._mmap[start:start + self._vocabulary_length]
+            self._vocabulary = data.decode('utf-8').split('\n') if self.vocabulary_size else []
+        return self._vocabulary
+
+    def __len__(self):
+        return self.documents
+
+    def document_ids(self, index):
+        """Term ids of document index (0-based) as a memoryview."""
+        return self.ids[self.offsets[index]:self.offsets[index + 1]]
+
+    def document(self, index):
+        """Tokens of document index (0-based)."""
+        return list(map(self.vocabulary.__getitem__, self.document_ids(index)))
+
+    def iter_documents(self):
+        """Yield each document's tokens in order."""
+        for index in range(self.documents):
+            yield self.document(index)
+
+    def iter_tokens(self, batch_size=65536):
+        """Yield the whole token stream, decoding it in batches."""
+        vocabulary = self.vocabulary
+        for start in range(0, self.tokens, batch_size):
+            yield from map(vocabulary.__getitem__, self.ids[start:start + batch_size])
+
+    def write_text(self, output, batch_size=65536):
+        """Write the token stream as space-separated text."""
+        vocabulary = self.vocabulary
+        separator = ''
+        for start in range(0, self.tokens, batch_size):
+            batch = ' '.join(map(vocabulary.__getitem__, self.ids[start:start + batch_size]))
+            output.write(separator + batch)
+            separator = ' '
+
+    def term_counts(self):
+        """Counter of term frequencies, in first-occurrence order."""
+        vocabulary = self.vocabulary
+        return Counter({vocabulary[i]: count for i, count in Counter(self.ids).items()})
+
+    def close(self):
+        if self._mmap.closed:
+            return
+        self.ids.release()
+        self.offsets.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def main():
+    """Report the contents of a token file and how long it takes to load."""
+    if len(sys.argv) < 2:
+        print(__doc__.strip())
+        return 2
+
+    filename = sys.argv[1]
+    start = time.perf_counter()
+    with TokenFileReader(filename) as reader:
+        opened = time.perf_counter() - start
+        vocabulary = reader.vocabulary
+        loaded = time.perf_counter() - start
+
+        print(f"{filename}: {os.path.getsize(filename):,} bytes")
+        print(f"Documents: {reader.documents:,}")
+        print(f"Tokens: {reader.tokens:,}")
+        print(f"Vocabulary: {len(vocabulary):,} terms")
+        print(f"Open: {1000 * opened:.2f}ms, with vocabulary: {1000 * loaded:.2f}ms")
+        if reader.documents:
+            print(f"First document: {' '.join(reader.document(0))}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""
+Lab 1: Byte Tokenizer
+Tokenizes collections without decoding them to str first. The input is
+memory-mapped (or streamed, if compressed) and cut into large chunks that
+end on a line break. Lines that are pure ASCII are case-folded and split
+by one bytes.translate call that maps every non-word byte to a space,
+followed by split(). Only lines containing other bytes are decoded and
+run through the regex, so the tokens are exactly those of
+re.findall(r'\\w+', text.lower()), i.e. TextPreprocessor.tokenize, including
+Unicode case mappings that depend on context.
+
+Newlines are normalized as in text mode ('\\r\\n' and '\\r' become '\\n'),
+so lines and documents split where they would after open().
+"""
+
+import re
+import mmap
+
+from lab1_corpus import detect_compression, open_binary
+
+# The str pattern this tokenizer reproduces
+TOKEN_PATTERN = r'\w+'
+WORD_PATTERN = re.compile(TOKEN_PATTERN)
+
+# ASCII word bytes map to their lowercase form, newlines to themselves and
+# every other ASCII byte to a space
+ASCII_WORDS = bytes(
+    byte if chr(byte).isalnum() or byte in b'_\n' else 32 for byte in range(128)
+).lower() + bytes(range(128, 256))
+
+NON_ASCII = re.compile(rb'[\x80-\xff]')
+
+CHUNK_SIZE = 1 << 20
+
+def normalize_newlines(data):
+    """Translate '\\r\\n' and lone '\\r' to '\\n', as text mode does."""
+    if b'\r' in data:
+        data = data.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+    return data
+
+def iter_chunks(filename, chunk_size=CHUNK_SIZE):
+    """Yield a collection's bytes in chunks ending on a line break.
+
+    Plain files are memory-mapped; compressed ones are decompressed on the
+    fly. Newlines are normalized.
+    """
+    if detect_compression(filename) is None:
+        with open(filename, 'rb') as f:
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # Empty files cannot be mapped
+                return
+        with data:
+            start = 0
+            size = len(data)
+            while start < size:
+                end = data.find(b'\n', min(start + chunk_size, size) - 1) + 1 or size
+                yield normalize_newlines(data[start:end])
+                start = end
+        return
+
+    with open_binary(filename) as f:
+        carry = b''
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            cut = chunk.rfind(b'\n') + 1
+            if cut == 0:
+                carry += chunk
+                continue
+            yield normalize_newlines(carry + chunk[:cut])
+            carry = chunk[cut:]
+        if carry:
+            yield normalize_newlines(carry)
+
+def first_lines(data, count):
+    """The first count lines of a chunk (all of it if it has fewer)."""
+    end = 0
+    for _ in range(count):
+        end = data.find(b'\n', end) + 1
+        if end == 0:
+            return data
+    return data[:end]
+
+class ByteTokenizer:
+    """Tokenizes encoded text (UTF-8, Latin-1 or another ASCII-compatible encoding).
+
+    A non-ASCII line that does not decode raises UnicodeDecodeError, as
+    reading the file in text mode would.
+    """
+
+    def __init__(self, encoding='utf-8'):
+        self.encoding = encoding
+
+    def _spans(self, data):
+        """Yield (start, end, ascii) spans of data, each a run of whole lines."""
+        position = 0
+        while position < len(data):
+            match = NON_ASCII.search(data, position)
+            if match is None:
+                yield position, len(data), True
+                return
+            start = max(data.rfind(b'\n', position, match.start()) + 1, position)
+            end = data.find(b'\n', match.end()) + 1 or len(data)
+            if start > position:
+                yield position, start, True
+            yield start, end, False
+            position = end
+
+    def tokenize(self, data):
+        """Lowercased word tokens of a chunk of whole lines."""
+        if data.isascii():
+            return data.translate(ASCII_WORDS).decode('ascii').split()
+
+        tokens = []
+        for start, end, ascii in self._spans(data):
+            if ascii:
+                tokens.extend(data[start:end].translate(ASCII_WORDS).decode('ascii').split())
+            else:
+                text = data[start:end].decode(self.encoding)
+                tokens.extend(WORD_PATTERN.findall(text.lower()))
+        return tokens
+
+    def tokenize_lines(self, data):
+        """Tokens of each line of a chunk, as a list per line.
+
+        A final line without a line break counts as a line; an empty chunk
+        has none.
+        """
+        if not data:
+            return []
+        if data.isascii():
+            lines = data.translate(ASCII_WORDS).decode('ascii').split('\n')
+        else:
+            lines = []
+            for start, end, ascii in self._spans(data):
+                if ascii:
+                    text = data[start:end].translate(ASCII_WORDS).decode('ascii')
+                else:
+                    text = data[start:end].decode(self.encoding).lower()
+                pieces = text.split('\n')
+                if text.endswith('\n'):
+                    pieces.pop()
+                lines.extend(pieces)
+            return [WORD_PATTERN.findall(line) for line in lines]
+
+        if data.endswith(b'\n'):
+            lines.pop()
+        return [line.split() for line in lines]
+
+def read_collection_bytes(filename, consume, chunk_size=CHUNK_SIZE):
+    """Stream a collection into consume(chunks, tokenizer), falling back to Latin-1.
+
+    The byte counterpart of lab1_corpus.read_collection: consume is
+    restarted from the beginning with a Latin-1 tokenizer if the file
+    turns out not to be valid UTF-8.
+    """
+    try:
+        return consume(iter_chunks(filename, chunk_size), ByteTokenizer('utf-8'))
+    except UnicodeDecodeError:
+        return consume(iter_chunks(filename, chunk_size), ByteTokenizer('latin1'))
@@ -0,0 +1,76 @@
+"""
+Lab 1: Interned Token Streams
+Stores a preprocessed corpus as integer term ids in an array('I') instead
+of a list of str. Each distinct term is interned once in a TermDictionary,
+so a token costs 4 bytes rather than an 8-byte list slot plus its own str
+object (around 50 bytes for a short word).
+
+Ids are assigned in order of first occurrence: counting ids visits terms
+in the same order a Counter over the strings would, and vocabulary growth
+can be tracked on the ids directly.
+"""
+
+from array import array
+from collections import Counter
+from itertools import islice
+
+class TermDictionary:
+    """Maps terms to consecutive integer ids and back."""
+
+    def __init__(self):
+        self.ids = {}
+        self.terms = []
+
+    def __len__(self):
+        return len(self.terms)
+
+    def __contains__(self, term):
+        return term in self.ids
+
+    def encode(self, tokens):
+        """Return the ids of a list of tokens as an array('I'), interning new terms."""
+        ids = self.ids
+        # dict.fromkeys keeps first-occurrence order within the batch
+        for term in dict.fromkeys(tokens):
+            if term not in ids:
+                ids[term] = len(self.terms)
+                self.terms.append(term)
+        return array('I', map(ids.__getitem__, tokens))
+
+    def decode(self, ids):
+        """Return the terms for a sequence of ids."""
+        return list(map(self.terms.__getitem__, ids))
+
+class TokenStream:
+    """An append-only token stream held as term ids."""
+
+    def __init__(self, dictionary=None):
+        self.dictionary = dictionary or TermDictionary()
+        self.ids = array('I')
+
+    def __len__(self):
+        return len(self.ids)
+
+    def extend(self, tokens):
+        """Append a list of tokens."""
+        self.ids.extend(self.dictionary.encode(tokens))
+
+    def tokens(self, start=0, stop=None):
+        """Decode a slice of the stream back to terms."""
+        return self.dictionary.decode(self.ids[start:stop])
+
+    def term_counts(self):
+        """Counter of term frequencies, counted on ids, in first-occurrence order."""
+        terms = self.dictionary.terms
+        return Counter({terms[i]: count for i, count in Counter(self.ids).items()})
+
+    def write(self, output, batch_size=65536):
+        """Write the stream to a text file as space-separated terms."""
+        ids = iter(self.ids)
+        separator = ''
+        while True:
+            batch = self.dictionary.decode(islice(ids, batch_size))
+            if not batch:
+                return
+            output.write(separator + ' '.join(batch))
+            separator = ' '